@@ -0,0 +1,1079 @@
+"""
+Benchmarks de rendimiento del sistema
+Uso: python benchmark.py [escenario ...]   (sin argumentos ejecuta todos)
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import tempfile
+import tracemalloc
+import io
+import multiprocessing
+from contextlib import contextmanager, redirect_stdout
+from datetime import date, datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from modules import auditoria
+from modules import almacen
+from modules import almacen_sqlite
+from modules import movimientos
+from modules import indices
+from modules import columnar
+from modules import fechas
+from modules import paginacion
+from modules import modelo
+from modules import productos
+from modules import pedidos
+from modules import inventario
+from modules import usuarios
+from modules import bloqueos
+from modules import cliente
+from modules import servicio
+from modules import seguridad
+
+@contextmanager
+def directorio_temporal():
+    """Ejecuta el bloque dentro de un directorio temporal (data/ y logs/ aislados)"""
+    original = os.getcwd()
+    ruta = tempfile.mkdtemp(prefix="abp3_bench_")
+    os.chdir(ruta)
+    try:
+        yield ruta
+    finally:
+        auditoria.detener_escritor()
+        movimientos._cache_indices.clear()
+        os.chdir(original)
+        shutil.rmtree(ruta, ignore_errors=True)
+
+def _entrada_ejemplo(i):
+    """Genera una entrada de auditoría sintética"""
+    return {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "usuario": f"user_{i % 50:03d}",
+        "accion": ("INICIO_SESION", "PROCESAR_PEDIDO", "CIERRE_SESION")[i % 3],
+        "descripcion": f"Evento sintético número {i}"
+    }
+
+def _prellenar_log(ruta, cantidad, fecha=None):
+    """Escribe `cantidad` entradas directamente en el archivo de log"""
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with open(ruta, 'w', encoding='utf-8') as f:
+        for i in range(cantidad):
+            entrada = _entrada_ejemplo(i)
+            if fecha:
+                # Repartir las entradas a lo largo del día indicado
+                segundo = i * 86400 // cantidad
+                entrada["timestamp"] = f"{fecha} {segundo // 3600:02d}:{segundo // 60 % 60:02d}:{segundo % 60:02d}"
+            f.write(json.dumps(entrada, ensure_ascii=False) + '\n')
+
+def _registrar_log_legado(usuario, accion, descripcion):
+    """Implementación anterior: lee, parsea y reescribe todo el archivo del día"""
+    entrada = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "usuario": usuario,
+        "accion": accion,
+        "descripcion": descripcion
+    }
+    archivo_log = auditoria.obtener_archivo_log()
+    logs = []
+    if os.path.exists(archivo_log):
+        with open(archivo_log, 'r', encoding='utf-8') as f:
+            for linea in f:
+                linea = linea.strip()
+                if linea:
+                    logs.append(json.loads(linea))
+    logs.append(entrada)
+    with open(archivo_log, 'w', encoding='utf-8') as f:
+        for log in logs:
+            f.write(json.dumps(log, ensure_ascii=False) + '\n')
+
+def bench_auditoria(tamanos=(10, 1_000, 100_000, 1_000_000), muestras=1000, limite_legado=10_000):
+    """Latencia por llamada de registrar_log según el tamaño del log del día"""
+    print("\n--- BENCHMARK: ESCRITOR DE AUDITORÍA ---")
+    print(f"{'Entradas/día':>14} {'Cola (µs/llamada)':>20} {'Append (µs/llamada)':>22} {'Legado (µs/llamada)':>22}")
+    print("-" * 82)
+
+    for tamano in tamanos:
+        with directorio_temporal():
+            ruta = auditoria.obtener_archivo_log()
+            _prellenar_log(ruta, tamano)
+
+            auditoria.configurar_escritor(politica="entrada", fsync=False, segundo_plano=True)
+            inicio = time.perf_counter()
+            for i in range(muestras):
+                auditoria.registrar_log("bench", "BENCHMARK", f"Muestra {i}")
+            cola_us = (time.perf_counter() - inicio) / muestras * 1e6
+            auditoria.detener_escritor()
+
+            auditoria.configurar_escritor(segundo_plano=False)
+            inicio = time.perf_counter()
+            for i in range(muestras):
+                auditoria.registrar_log("bench", "BENCHMARK", f"Muestra {i}")
+            append_us = (time.perf_counter() - inicio) / muestras * 1e6
+            auditoria.configurar_escritor(segundo_plano=True)
+
+            legado = "-"
+            if tamano <= limite_legado:
+                _prellenar_log(ruta, tamano)
+                repeticiones = min(muestras, 50)
+                inicio = time.perf_counter()
+                for i in range(repeticiones):
+                    _registrar_log_legado("bench", "BENCHMARK", f"Muestra {i}")
+                legado = f"{(time.perf_counter() - inicio) / repeticiones * 1e6:.1f}"
+
+            print(f"{tamano:>14,} {cola_us:>20.1f} {append_us:>22.1f} {legado:>22}")
+
+def bench_cola_auditoria(entradas=20_000, max_cola=1000):
+    """Escritor en segundo plano: latencia de registrar_log, lotes con fsync y desborde de la cola"""
+    print("\n--- BENCHMARK: COLA DE AUDITORÍA ---")
+    print(f"{'Modo':28} {'p50 (µs)':>10} {'p99 (µs)':>10} {'Total (entradas/s)':>20} {'Descartadas':>12}")
+    print("-" * 84)
+
+    modos = (
+        ("Directo, flush", dict(segundo_plano=False, fsync=False)),
+        ("Directo, fsync", dict(segundo_plano=False, fsync=True)),
+        ("Cola, flush por lote", dict(segundo_plano=True, fsync=False, desborde="bloquear")),
+        ("Cola, fsync por lote", dict(segundo_plano=True, fsync=True, desborde="bloquear")),
+        (f"Cola de {max_cola}, descartar", dict(segundo_plano=True, fsync=True, desborde="descartar",
+                                               max_cola=max_cola)),
+    )
+    for nombre, opciones in modos:
+        with directorio_temporal():
+            auditoria.configurar_escritor(politica="entrada", **opciones)
+            # Con fsync directo cada entrada espera al disco: se mide una muestra menor
+            cantidad = entradas // 10 if opciones["fsync"] and not opciones["segundo_plano"] else entradas
+            descartadas = auditoria.entradas_descartadas()
+            tiempos = []
+            inicio = time.perf_counter()
+            for i in range(cantidad):
+                antes = time.perf_counter()
+                auditoria.registrar_log("bench", "BENCHMARK", f"Muestra {i}")
+                tiempos.append((time.perf_counter() - antes) * 1e6)
+            auditoria.vaciar_cola()
+            segundos = time.perf_counter() - inicio
+            descartadas = auditoria.entradas_descartadas() - descartadas
+            tiempos.sort()
+            print(f"{nombre:28} {tiempos[len(tiempos) // 2]:>10.1f} {tiempos[len(tiempos) * 99 // 100]:>10.1f} "
+                  f"{cantidad / segundos:>20,.0f} {descartadas:>12,}")
+    auditoria.configurar_escritor(segundo_plano=True, fsync=False, desborde="bloquear", max_cola=10000)
+
+def _bytes_en_disco(prefijo):
+    """Suma el tamaño de los archivos de logs/ que comienzan con `prefijo`"""
+    return sum(os.path.getsize(os.path.join(auditoria.DIR_LOGS, n))
+               for n in os.listdir(auditoria.DIR_LOGS) if n.startswith(prefijo))
+
+def _medir_consultas(entradas, repeticiones=20):
+    """Latencia (ms) de consultas típicas sobre el log de ayer: caché fría y caliente"""
+    ayer = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    consultas = {
+        "usuario+acción, pág. 1": dict(usuario="user_007", accion="PROCESAR_PEDIDO"),
+        "rango 1 hora, pág. 50": dict(desde=f"{ayer} 12:00", hasta=f"{ayer} 12:59", pagina=50),
+        "sin filtro, pág. final": dict(pagina=entradas // 20),
+    }
+    resultados = {}
+    for nombre, filtros in consultas.items():
+        auditoria._cache_indices.clear()
+        auditoria._cache_bloques.clear()
+        auditoria._ultimo_bloque["clave"] = None
+        inicio = time.perf_counter()
+        auditoria.consultar_logs(**filtros)
+        fria = (time.perf_counter() - inicio) * 1000
+
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            auditoria._ultimo_bloque["clave"] = None
+            auditoria.consultar_logs(**filtros)
+        caliente = (time.perf_counter() - inicio) / repeticiones * 1000
+        resultados[nombre] = (fria, caliente)
+    return resultados
+
+def bench_rotacion(entradas=200_000):
+    """Bytes en disco y latencia de consulta: log plano vs segmento comprimido"""
+    print("\n--- BENCHMARK: ROTACIÓN Y SEGMENTOS COMPRIMIDOS ---")
+
+    with directorio_temporal():
+        ayer = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+        ruta = os.path.join(auditoria.DIR_LOGS, f"auditoria_{ayer}.log")
+        prefijo = f"auditoria_{ayer}"
+        _prellenar_log(ruta, entradas, fecha=ayer)
+        auditoria._sincronizar_indice(ruta)
+
+        plano_bytes = _bytes_en_disco(prefijo)
+        plano_ms = _medir_consultas(entradas)
+
+        inicio = time.perf_counter()
+        auditoria.rotar_logs()
+        compresion_s = time.perf_counter() - inicio
+
+        gz_bytes = _bytes_en_disco(prefijo)
+        gz_ms = _medir_consultas(entradas)
+
+    print(f"Entradas: {entradas:,} | compresión: {compresion_s:.2f} s")
+    print(f"{'':36} {'Plano':>16} {'Comprimido':>16}")
+    print("-" * 70)
+    print(f"{'Bytes en disco (con índices)':36} {plano_bytes:>16,} {gz_bytes:>16,}")
+    for nombre in plano_ms:
+        plano = f"{plano_ms[nombre][0]:.1f} / {plano_ms[nombre][1]:.2f}"
+        comprimido = f"{gz_ms[nombre][0]:.1f} / {gz_ms[nombre][1]:.2f}"
+        print(f"{nombre + ' (ms fría/caliente)':36} {plano:>16} {comprimido:>16}")
+
+def _producto_ejemplo(i):
+    """Genera un producto sintético con los campos de ingresar_mercancia"""
+    return {
+        "codigo": f"P{i:07d}",
+        "descripcion": f"Producto de prueba {i % 997} tipo {i % 13}",
+        "unidad": ("unidad", "ml", "gr")[i % 3],
+        "cantidad": float(i % 120),
+        "marca": f"Marca {i % 40}",
+        "fecha_elaboracion": "2026-01-01",
+        "fecha_vencimiento": f"2027-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+        "ubicacion": f"B{i % 20:02d}-{i % 50:02d}",
+        "lote": f"L{i % 9:03d}",
+        "stock_minimo": 10,
+        "proveedor": f"Proveedor {i % 25}",
+        "guia_despacho": f"G{i // 100}",
+        "fecha_ingreso": "2026-01-30 20:41:42",
+        "usuario_ingreso": "digit001",
+        "estado": "Conforme",
+        "observaciones": "",
+        "peligrosidad": "",
+        "temperatura": ""
+    }
+
+def _escribir_productos(ruta, cantidad):
+    """Genera un archivo de productos con `cantidad` registros"""
+    store = almacen.ProductStore(ruta)
+    store.agregar(_producto_ejemplo(i) for i in range(cantidad))
+    store.compactar()
+
+def bench_almacen(cantidad=200_000):
+    """Costo de cargar el inventario con y sin caché en memoria"""
+    print("\n--- BENCHMARK: PRODUCTSTORE CON CACHÉ ---")
+
+    with directorio_temporal():
+        ruta = "data/productos.json"
+        _escribir_productos(ruta, cantidad)
+        store = almacen.ProductStore(ruta)
+
+        inicio = time.perf_counter()
+        store.cargar()
+        primera = (time.perf_counter() - inicio) * 1000
+
+        inicio = time.perf_counter()
+        store.cargar()
+        segunda = (time.perf_counter() - inicio) * 1000
+
+        inicio = time.perf_counter()
+        store.guardar()
+        sin_cambios = (time.perf_counter() - inicio) * 1000
+
+        store.actualizar(store.cargar()[0], {"cantidad": 1.0})
+        inicio = time.perf_counter()
+        store.guardar()
+        con_cambios = (time.perf_counter() - inicio) * 1000
+
+    print(f"SKUs: {cantidad:,}")
+    print(f"Primera carga (parseo):        {primera:10.1f} ms")
+    print(f"Carga siguiente (solo stat):   {segunda:10.3f} ms")
+    print(f"Guardar sin cambios:           {sin_cambios:10.3f} ms")
+    print(f"Guardar con cambios (journal): {con_cambios:10.3f} ms")
+
+def bench_journal(tamanos=(10_000, 100_000, 500_000), egresos=200):
+    """Costo de confirmar un egreso (journal) frente a reescribir el inventario"""
+    print("\n--- BENCHMARK: JOURNAL DE MOVIMIENTOS ---")
+    print(f"{'SKUs':>10} {'Egreso journal (ms)':>22} {'Reescritura total (ms)':>24} {'Recuperación (ms)':>20}")
+    print("-" * 80)
+
+    for tamano in tamanos:
+        with directorio_temporal():
+            ruta = "data/productos.json"
+            _escribir_productos(ruta, tamano)
+            store = almacen.ProductStore(ruta)
+            productos_list = store.cargar()
+
+            inicio = time.perf_counter()
+            for i in range(egresos):
+                store.registrar_movimiento(productos_list[i * 7 % tamano], -1, {"tipo": "Egreso", "cantidad": 1})
+                store.guardar()
+            journal_ms = (time.perf_counter() - inicio) / egresos * 1000
+
+            # Carga desde cero: snapshot + reaplicación del journal
+            _, recuperacion_ms = _cronometrar(almacen.ProductStore(ruta).cargar)
+            _, reescritura_ms = _cronometrar(store.compactar)
+
+        print(f"{tamano:>10,} {journal_ms:>22.3f} {reescritura_ms:>24.1f} {recuperacion_ms:>20.1f}")
+
+def _cronometrar(funcion):
+    """Ejecuta `funcion` y retorna (resultado, milisegundos)"""
+    inicio = time.perf_counter()
+    resultado = funcion()
+    return resultado, (time.perf_counter() - inicio) * 1000
+
+def _operaciones_almacen(store):
+    """Operaciones de lectura y escritura equivalentes a las del menú"""
+    def egreso():
+        producto = store.buscar("codigo", "P0000042")[0]
+        store.registrar_movimiento(producto, -1, {"tipo": "Egreso", "cantidad": 1})
+        store.guardar()
+
+    return {
+        "consultar_producto (código)": lambda: store.buscar("codigo", "P0000042"),
+        "revisar_stock (ubicación)": lambda: store.filtrar_por_ubicacion("B03-07"),
+        "mostrar_stock_critico": store.stock_critico,
+        "productos_por_vencer": lambda: store.por_vencer(date(2027, 1, 15)),
+        "marcar_egreso + guardar": egreso,
+    }
+
+def bench_backends(tamanos=(10_000, 100_000, 1_000_000)):
+    """Compara el backend JSON con el backend SQLite para operaciones del menú"""
+    print("\n--- BENCHMARK: BACKEND JSON VS SQLITE ---")
+
+    for tamano in tamanos:
+        with directorio_temporal():
+            ruta_json = "data/productos.json"
+            ruta_db = "data/productos.db"
+            _escribir_productos(ruta_json, tamano)
+
+            store_json = almacen.ProductStore(ruta_json)
+            _, apertura_json = _cronometrar(store_json.cargar)
+            tiempos_json = {nombre: _cronometrar(op)[1]
+                            for nombre, op in _operaciones_almacen(store_json).items()}
+            del store_json
+
+            _, migracion = _cronometrar(lambda: almacen_sqlite.migrar_desde_json(ruta_json, ruta_db))
+            store_db = almacen_sqlite.SQLiteProductStore(ruta_db)
+            tiempos_db = {nombre: _cronometrar(op)[1]
+                          for nombre, op in _operaciones_almacen(store_db).items()}
+            store_db.cerrar()
+
+        print(f"\nFilas: {tamano:,} | carga JSON: {apertura_json:.0f} ms | migración SQLite: {migracion:.0f} ms")
+        print(f"{'Operación (ms)':32} {'JSON':>12} {'SQLite':>12}")
+        print("-" * 58)
+        for nombre in tiempos_json:
+            print(f"{nombre:32} {tiempos_json[nombre]:>12.2f} {tiempos_db[nombre]:>12.2f}")
+
+def bench_movimientos(cantidad=50_000, por_producto=20):
+    """Fichas con historial embebido frente a fichas fijas más libro de movimientos"""
+    print("\n--- BENCHMARK: LIBRO DE MOVIMIENTOS ---")
+
+    with directorio_temporal():
+        ruta = "data/productos.json"
+        historial = [{"tipo": "Egreso", "fecha": f"2026-{m % 12 + 1:02d}-10 10:00:00",
+                      "cantidad": 1.0, "usuario": "digit001", "motivo": "Venta"}
+                     for m in range(por_producto)]
+        os.makedirs("data", exist_ok=True)
+        with open(ruta, 'w', encoding='utf-8') as f:
+            json.dump([dict(_producto_ejemplo(i), movimientos=historial) for i in range(cantidad)], f)
+        embebido_bytes = os.path.getsize(ruta)
+        _, embebido_ms = _cronometrar(lambda: json.load(open(ruta, encoding='utf-8')))
+
+        # La primera carga traslada el historial al libro y compacta el snapshot
+        _, migracion_ms = _cronometrar(almacen.ProductStore(ruta).cargar)
+        separado_bytes = os.path.getsize(ruta)
+        _, separado_ms = _cronometrar(almacen.ProductStore(ruta).cargar)
+
+        _, lote_fria_ms = _cronometrar(lambda: movimientos.movimientos_de_lote("P0001234", "L001"))
+        _, lote_ms = _cronometrar(lambda: movimientos.movimientos_de_lote("P0001234", "L001"))
+        _, rango_ms = _cronometrar(lambda: movimientos.movimientos_entre("2026-03-01", "2026-03-01"))
+
+    print(f"Productos: {cantidad:,} con {por_producto} movimientos c/u (migración: {migracion_ms:.0f} ms)")
+    print(f"{'':30} {'Bytes snapshot':>16} {'Carga (ms)':>12}")
+    print("-" * 60)
+    print(f"{'Historial en la ficha':30} {embebido_bytes:>16,} {embebido_ms:>12.0f}")
+    print(f"{'Ficha fija + libro':30} {separado_bytes:>16,} {separado_ms:>12.0f}")
+    print(f"Movimientos de un lote: {lote_fria_ms:.1f} ms (índice frío) / {lote_ms:.2f} ms (caliente)")
+    print(f"Movimientos de un día (rango): {rango_ms:.1f} ms")
+
+def bench_busqueda(cantidad=500_000, repeticiones=20):
+    """Búsqueda por subcadena: recorrido completo frente al índice de trigramas"""
+    print("\n--- BENCHMARK: BÚSQUEDA POR SUBCADENA ---")
+
+    with directorio_temporal():
+        ruta = "data/productos.json"
+        _escribir_productos(ruta, cantidad)
+        store = almacen.ProductStore(ruta)
+        productos_list, carga_ms = _cronometrar(store.cargar)
+        # La primera búsqueda construye el índice de trigramas
+        _, construccion_ms = _cronometrar(lambda: store.buscar("codigo", "p0000001"))
+
+        consultas = {
+            "código exacto": (("codigo",), "p0123456"),
+            "código parcial": (("codigo",), "p01234"),
+            "descripción": (("codigo", "descripcion"), "prueba 42 tipo"),
+            "lote": (("lote",), "l00"),
+            "sin resultados": (("codigo", "descripcion"), "tornillo"),
+        }
+
+        def recorrido(campos, texto):
+            return [prod for prod in productos_list
+                    if any(texto in str(prod.get(campo, "")).lower() for campo in campos)]
+
+        filas = []
+        for nombre, (campos, texto) in consultas.items():
+            resultados, _ = _cronometrar(lambda: store.buscar(campos, texto))
+            _, recorrido_ms = _cronometrar(lambda: recorrido(campos, texto))
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                store.buscar(campos, texto)
+            indice_ms = (time.perf_counter() - inicio) / repeticiones * 1000
+            filas.append((nombre, len(resultados), recorrido_ms, indice_ms))
+
+    print(f"Productos: {cantidad:,} | carga: {carga_ms:.0f} ms | construcción del índice: {construccion_ms:.0f} ms")
+    print(f"{'Consulta':20} {'Resultados':>12} {'Recorrido (ms)':>16} {'Índice (ms)':>14}")
+    print("-" * 66)
+    for nombre, total, recorrido_ms, indice_ms in filas:
+        print(f"{nombre:20} {total:>12,} {recorrido_ms:>16.1f} {indice_ms:>14.3f}")
+
+def _vocabulario(cantidad, semilla=7):
+    """Palabras sintéticas pronunciables de 5 a 10 letras"""
+    azar = random.Random(semilla)
+    silabas = [c + v for c in "bcdfglmnprstv" for v in "aeiou"]
+    palabras = set()
+    while len(palabras) < cantidad:
+        palabras.add("".join(azar.choice(silabas) for _ in range(azar.randint(3, 5)))[:10])
+    return sorted(palabras)
+
+def _con_error(palabra, azar):
+    """La palabra con una letra cambiada, borrada o duplicada"""
+    i = azar.randrange(len(palabra))
+    return azar.choice([palabra[:i] + "x" + palabra[i + 1:],
+                        palabra[:i] + palabra[i + 1:],
+                        palabra[:i] + palabra[i] + palabra[i:]])
+
+def bench_difusa(tamanos=(10_000, 100_000, 500_000), consultas=200):
+    """Búsqueda con errores de tipeo: BK-tree frente a comparar todo el vocabulario"""
+    print("\n--- BENCHMARK: BÚSQUEDA APROXIMADA ---")
+    print(f"{'Productos':>10} {'Palabras':>9} {'Construcción (ms)':>18} "
+          f"{'BK-tree (ms)':>13} {'Vocabulario (ms)':>17} {'Aciertos':>9}")
+    print("-" * 82)
+
+    for tamano in tamanos:
+        azar = random.Random(tamano)
+        vocabulario = _vocabulario(tamano // 20)
+        productos_list = [dict(_producto_ejemplo(i),
+                               descripcion=" ".join(azar.sample(vocabulario, 3)),
+                               marca=azar.choice(vocabulario[:200]))
+                          for i in range(tamano)]
+        indice = indices.IndiceDifuso()
+        indice.reconstruir(productos_list)
+        _, construccion_ms = _cronometrar(lambda: indice.buscar("a"))
+
+        objetivos = azar.sample(vocabulario, consultas)
+        errores = [_con_error(palabra, azar) for palabra in objetivos]
+
+        inicio = time.perf_counter()
+        aciertos = 0
+        for objetivo, consulta in zip(objetivos, errores):
+            resultados = indice.buscar(consulta, limite=10)
+            aciertos += any(objetivo in producto["descripcion"].split() for producto in resultados)
+        arbol_ms = (time.perf_counter() - inicio) / consultas * 1000
+
+        # Referencia: distancia contra cada palabra del vocabulario
+        muestra = errores[:20]
+        inicio = time.perf_counter()
+        for consulta in muestra:
+            distancia = indices._comparador(consulta)
+            [palabra for palabra in indice.por_palabra if distancia(palabra) <= 2]
+        lineal_ms = (time.perf_counter() - inicio) / len(muestra) * 1000
+
+        print(f"{tamano:>10,} {len(vocabulario):>9,} {construccion_ms:>18.0f} "
+              f"{arbol_ms:>13.2f} {lineal_ms:>17.1f} {aciertos / consultas:>8.0%}")
+
+def bench_vencimientos(cantidad=1_000_000, repeticiones=20):
+    """Productos por vencer: parseo de cada fecha frente al índice ordenado"""
+    print("\n--- BENCHMARK: PRODUCTOS POR VENCER ---")
+
+    with directorio_temporal():
+        store = almacen.ProductStore("data/productos.json")
+        store.agregar(_producto_ejemplo(i) for i in range(cantidad))
+        productos_list = store.cargar()
+        hoy = datetime(2027, 3, 1)
+
+        def recorrido(dias):
+            # Lo que hacía mostrar_productos_por_vencer antes del índice
+            limite = hoy + timedelta(days=dias)
+            resultado = []
+            for prod in productos_list:
+                fecha = datetime.strptime(prod["fecha_vencimiento"], "%Y-%m-%d")
+                if fecha <= limite:
+                    resultado.append(((fecha - hoy).days, prod))
+            resultado.sort(key=lambda x: x[0])
+            return resultado
+
+        def con_indice(dias):
+            # Lo que hace ahora la vista: total más la primera página
+            limite = (hoy + timedelta(days=dias)).date()
+            store.contar_por_vencer(limite)
+            return [((fecha - hoy.date()).days, prod)
+                    for fecha, prod in store.por_vencer(limite, cantidad=100)]
+
+        _, construccion_ms = _cronometrar(lambda: con_indice(0))
+        filas = []
+        for dias in (0, 7, 30):
+            resultados, recorrido_ms = _cronometrar(lambda: recorrido(dias))
+            _, completo_ms = _cronometrar(lambda: store.por_vencer((hoy + timedelta(days=dias)).date()))
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                con_indice(dias)
+            indice_ms = (time.perf_counter() - inicio) / repeticiones * 1000
+            filas.append((dias, len(resultados), recorrido_ms, completo_ms, indice_ms))
+
+    print(f"Lotes: {cantidad:,} (construcción del índice: {construccion_ms:.0f} ms)")
+    print(f"{'Horizonte (días)':>16} {'Lotes':>10} {'Parseo (ms)':>13} "
+          f"{'Índice, todo (ms)':>18} {'Índice, vista (ms)':>19}")
+    print("-" * 80)
+    for dias, total, recorrido_ms, completo_ms, indice_ms in filas:
+        print(f"{dias:>16} {total:>10,} {recorrido_ms:>13.0f} {completo_ms:>18.0f} {indice_ms:>19.3f}")
+
+def bench_stock(cantidad=1_000_000, egresos=1000):
+    """Stock crítico: recorrido del inventario frente a los conjuntos mantenidos"""
+    print("\n--- BENCHMARK: STOCK CRÍTICO ---")
+
+    with directorio_temporal():
+        store = almacen.ProductStore("data/productos.json")
+        store.agregar(_producto_ejemplo(i) for i in range(cantidad))
+        productos_list = store.cargar()
+
+        criticos, recorrido_ms = _cronometrar(
+            lambda: [p for p in productos_list if p.get("cantidad", 0) <= p.get("stock_minimo", 0)])
+        _, conjunto_ms = _cronometrar(store.stock_critico)
+        _, conteo_ms = _cronometrar(store.contar_criticos)
+
+        inicio = time.perf_counter()
+        for i in range(egresos):
+            store.registrar_movimiento(productos_list[i * 997 % cantidad], -1, {"tipo": "Egreso", "cantidad": 1})
+        egreso_us = (time.perf_counter() - inicio) / egresos * 1_000_000
+
+    print(f"Productos: {cantidad:,} | críticos: {len(criticos):,}")
+    print(f"Recorrido completo:          {recorrido_ms:10.1f} ms")
+    print(f"Conjunto (lista ordenada):   {conjunto_ms:10.1f} ms")
+    print(f"Conjunto (solo conteo):      {conteo_ms:10.3f} ms")
+    print(f"Egreso con reclasificación:  {egreso_us:10.1f} µs")
+
+def bench_reportes(cantidad=500_000):
+    """Apertura de reportes: pasadas completas frente a agregados materializados"""
+    print("\n--- BENCHMARK: AGREGADOS DE REPORTES ---")
+
+    with directorio_temporal():
+        ruta = "data/productos.json"
+        _escribir_productos(ruta, cantidad)
+        store = almacen.ProductStore(ruta)
+        productos_list = store.cargar()
+
+        def pasadas():
+            # Lo que calculaba mostrar_reportes en cada apertura
+            total = sum(p.get("cantidad", 0) for p in productos_list)
+            criticos = [p for p in productos_list if p.get("cantidad", 0) <= p.get("stock_minimo", 0)]
+            por_unidad = {}
+            for p in productos_list:
+                por_unidad[p.get("unidad", "unidad")] = por_unidad.get(p.get("unidad", "unidad"), 0) + p["cantidad"]
+            return total, criticos, por_unidad
+
+        _, pasadas_ms = _cronometrar(pasadas)
+        _, restaurados_ms = _cronometrar(store.agregados)
+        _, mantenidos_ms = _cronometrar(store.agregados)
+        _, verificacion_ms = _cronometrar(store.verificar_agregados)
+
+    print(f"Productos: {cantidad:,}")
+    print(f"Pasadas completas (antes):          {pasadas_ms:10.1f} ms")
+    print(f"Agregados restaurados del archivo:  {restaurados_ms:10.3f} ms")
+    print(f"Agregados mantenidos (siguiente):   {mantenidos_ms:10.3f} ms")
+    print(f"Verificación de consistencia:       {verificacion_ms:10.1f} ms")
+
+def bench_columnar(cantidad=1_000_000):
+    """Análisis de reportes: bucles sobre dicts frente a la instantánea columnar"""
+    print("\n--- BENCHMARK: INSTANTÁNEA COLUMNAR ---")
+
+    productos_list = [_producto_ejemplo(i) for i in range(cantidad)]
+    for producto in productos_list:
+        producto.update(fechas.normalizar_producto(producto))
+    hoy = date(2027, 3, 1).toordinal()
+
+    def por_campo(campo):
+        totales = {}
+        for p in productos_list:
+            totales[p.get(campo, "")] = totales.get(p.get(campo, ""), 0) + p.get("cantidad", 0)
+        return totales
+
+    def por_prefijo():
+        totales = {}
+        for p in productos_list:
+            prefijo = p.get("ubicacion", "").split("-", 1)[0]
+            totales[prefijo] = totales.get(prefijo, 0) + p.get("cantidad", 0)
+        return totales
+
+    def histograma():
+        conteos = [0] * 14
+        for p in productos_list:
+            ordinal = fechas.ordinal_campo(p, "fecha_vencimiento")
+            if ordinal is not None:
+                dias = ordinal - hoy
+                conteos[0 if dias < 0 else min(dias // 30 + 1, 13)] += 1
+        return conteos
+
+    bucles = {
+        "totales por unidad": lambda: por_campo("unidad"),
+        "totales por proveedor": lambda: por_campo("proveedor"),
+        "totales por pasillo": por_prefijo,
+        "stock crítico (conteo)": lambda: sum(1 for p in productos_list
+                                              if p.get("cantidad", 0) <= p.get("stock_minimo", 0)),
+        "histograma de vencimientos": histograma,
+    }
+    motores = {"Python puro": False}
+    if columnar.np is not None:
+        motores["NumPy"] = True
+
+    resultados = {}
+    construccion = {}
+    for nombre_motor, usar_numpy in motores.items():
+        instantanea, construccion[nombre_motor] = _cronometrar(
+            lambda: columnar.InstantaneaColumnar(productos_list, usar_numpy))
+        operaciones = {
+            "totales por unidad": lambda: instantanea.totales_por("unidad"),
+            "totales por proveedor": lambda: instantanea.totales_por("proveedor"),
+            "totales por pasillo": lambda: instantanea.totales_por_prefijo("ubicacion"),
+            "stock crítico (conteo)": instantanea.contar_criticos,
+            "histograma de vencimientos": lambda: instantanea.histograma_vencimientos(hoy, 30, 12),
+        }
+        resultados[nombre_motor] = {nombre: _cronometrar(op)[1] for nombre, op in operaciones.items()}
+
+    print(f"Lotes: {cantidad:,} | NumPy {'disponible' if columnar.np is not None else 'no instalado'}")
+    print("Construcción de la instantánea: " +
+          ", ".join(f"{motor} {ms:.0f} ms" for motor, ms in construccion.items()))
+    print(f"{'Cálculo (ms)':28} {'Bucle dicts':>12}" + "".join(f" {motor:>12}" for motor in motores))
+    print("-" * (42 + 13 * len(motores)))
+    for nombre, op in bucles.items():
+        _, bucle_ms = _cronometrar(op)
+        print(f"{nombre:28} {bucle_ms:>12.1f}" + "".join(f" {resultados[m][nombre]:>12.1f}" for m in motores))
+
+def bench_streaming(cantidad=500_000):
+    """Listado de solo lectura: carga completa frente a lectura en streaming"""
+    print("\n--- BENCHMARK: LECTURA EN STREAMING ---")
+
+    def medir(recorrido):
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        productos_iter = recorrido()
+        next(productos_iter)
+        primera = (time.perf_counter() - inicio) * 1000
+        criticos = sum(1 for p in productos_iter if indices.estado_stock(p) == indices.ESTADO_CRITICO)
+        total = (time.perf_counter() - inicio) * 1000
+        pico = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+        return primera, total, pico, criticos
+
+    with directorio_temporal():
+        ruta = "data/productos.json"
+        _escribir_productos(ruta, cantidad)
+        tamano = os.path.getsize(ruta) / 1024 / 1024
+        # Algunas operaciones en el journal, como en un día normal de trabajo
+        store = almacen.ProductStore(ruta)
+        for i in range(0, cantidad, cantidad // 100):
+            store.registrar_movimiento(store.obtener(f"P{i:07d}", f"L{i % 9:03d}"), -1.0, {"tipo": "egreso"})
+            store.guardar()
+        del store
+
+        resultados = {
+            "Carga completa": medir(lambda: iter(almacen.ProductStore(ruta).cargar())),
+            "Streaming": medir(lambda: almacen.ProductStore(ruta).recorrer()),
+        }
+
+    print(f"SKUs: {cantidad:,} | productos.json {tamano:.0f} MB")
+    print(f"{'Lectura':16} {'Primera fila':>14} {'Recorrido':>12} {'Memoria pico':>14} {'Críticos':>10}")
+    print("-" * 70)
+    for nombre, (primera, total, pico, criticos) in resultados.items():
+        print(f"{nombre:16} {primera:>11.1f} ms {total:>9.0f} ms {pico:>11.1f} MB {criticos:>10,}")
+
+def bench_paginacion(cantidad=100_000, repeticiones=20):
+    """Listado de inventario: ordenar e imprimir todo frente a una página del índice por ubicación"""
+    print("\n--- BENCHMARK: LISTADOS PAGINADOS ---")
+
+    # Sin guardar: el almacén solo se usa en memoria
+    store = almacen.ProductStore("data/productos.json")
+    store.agregar(_producto_ejemplo(i) for i in range(cantidad))
+    salida = io.StringIO()
+
+    def listado_completo():
+        # Como el listado anterior: ordena la lista entera y un print por fila
+        with redirect_stdout(salida):
+            for prod in sorted(store.cargar(), key=lambda x: x.get("ubicacion", "")):
+                print(f"{prod.get('codigo', ''):10} {prod.get('descripcion', '')[:25]:25} "
+                      f"{prod.get('ubicacion', ''):15} {prod.get('lote', '')[:10]:10}")
+
+    def pagina(numero):
+        filas = store.por_ubicacion(numero * paginacion.FILAS_POR_PAGINA, paginacion.FILAS_POR_PAGINA)
+        salida.write(paginacion.renderizar_pagina(
+            inventario.COLUMNAS_INVENTARIO[:5], filas,
+            lambda p: (p["codigo"], p["descripcion"], p["cantidad"], p["ubicacion"], p["lote"])))
+
+    _, completo = _cronometrar(listado_completo)
+    _, construccion = _cronometrar(lambda: pagina(0))
+    ultima = cantidad // paginacion.FILAS_POR_PAGINA - 1
+    resultados = {}
+    for nombre, numero in (("primera", 0), ("intermedia", ultima // 2), ("última", ultima)):
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            pagina(numero)
+        resultados[nombre] = (time.perf_counter() - inicio) * 1000 / repeticiones
+
+    print(f"SKUs: {cantidad:,} | {paginacion.FILAS_POR_PAGINA} filas por página")
+    print(f"Ordenar e imprimir todo:           {completo:10.1f} ms")
+    print(f"Primera página (arma el índice):   {construccion:10.1f} ms")
+    for nombre, ms in resultados.items():
+        print(f"Página {nombre:12} (índice listo): {ms:10.3f} ms")
+
+def bench_modelo(cantidad=100_000):
+    """Memoria del inventario cargado: dicts frente a modelo.Producto"""
+    print("\n--- BENCHMARK: MODELO DE PRODUCTO ---")
+
+    productos_list = []
+    for i in range(cantidad):
+        producto = _producto_ejemplo(i)
+        producto.update(fechas.normalizar_producto(producto))
+        productos_list.append(producto)
+    # Texto JSON como el del snapshot: cada valor leído es un objeto nuevo
+    texto = json.dumps(productos_list, ensure_ascii=False)
+    del productos_list
+
+    def medir(convertir):
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        cargados = convertir(json.loads(texto))
+        ms = (time.perf_counter() - inicio) * 1000
+        memoria = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+        tracemalloc.stop()
+        return cargados, memoria, ms
+
+    dicts, memoria_dicts, ms_dicts = medir(lambda datos: datos)
+    productos_list, memoria_modelo, ms_modelo = medir(lambda datos: [modelo.Producto(d) for d in datos])
+    iguales = all(p.a_dict() == d for p, d in zip(productos_list, dicts))
+
+    print(f"Productos: {cantidad:,} | JSON idéntico al reconvertir: {'sí' if iguales else 'NO'}")
+    print(f"{'Representación':18} {'Memoria (MB)':>13} {'Bytes/producto':>15} {'Carga (ms)':>11}")
+    print("-" * 60)
+    for nombre, memoria, ms in (("dict", memoria_dicts, ms_dicts), ("modelo.Producto", memoria_modelo, ms_modelo)):
+        print(f"{nombre:18} {memoria:>13.1f} {memoria * 1024 * 1024 / cantidad:>15.0f} {ms:>11.0f}")
+
+def bench_importacion(lineas=20_000):
+    """Ingreso masivo de mercancía desde CSV: validación y una sola escritura"""
+    print("\n--- BENCHMARK: IMPORTACIÓN DE MERCANCÍA ---")
+
+    with directorio_temporal():
+        _escribir_productos("data/productos.json", 10_000)
+        almacen._store = None
+        with open("guia.csv", 'w', encoding='utf-8', newline='') as f:
+            f.write(";".join(productos.CAMPOS_LINEA) + "\n")
+            for i in range(lineas):
+                producto = _producto_ejemplo(100_000 + i)
+                f.write(";".join(str(producto.get(campo, "")) for campo in productos.CAMPOS_LINEA) + "\n")
+        encabezado = {"proveedor": "Proveedor 1", "guia_despacho": "G1", "usuario_ingreso": "digit001",
+                      "estado": "Conforme", "observaciones": ""}
+
+        almacen.obtener_store().cargar()
+        with redirect_stdout(io.StringIO()):
+            ingresados, ms = _cronometrar(lambda: productos.importar_mercancia(encabezado, "guia.csv"))
+        almacen._store = None
+
+    print(f"Líneas: {lineas:,} | ingresadas: {ingresados:,} (inventario previo: 10,000)")
+    print(f"Validación + escritura: {ms:10.0f} ms ({lineas / ms * 1000:,.0f} líneas/s)")
+
+def bench_pedidos(cantidad=50_000, lineas=30_000, por_pedido=3):
+    """Procesamiento de un archivo de pedidos: reserva FEFO, una escritura y auditoría"""
+    print("\n--- BENCHMARK: PEDIDOS POR LOTE ---")
+
+    azar = random.Random(3)
+    with directorio_temporal():
+        _escribir_productos("data/productos.json", cantidad)
+        almacen._store = None
+        codigos = [f"P{i:07d}" for i in range(cantidad)]
+        with open("pedidos.csv", 'w', encoding='utf-8') as f:
+            f.write("numero,codigo,cantidad\n")
+            for i in range(lineas):
+                f.write(f"PED-{i // por_pedido},{azar.choice(codigos)},{azar.randint(1, 5)}\n")
+
+        almacen.obtener_store().cargar()
+        (completados, rechazados), ms = _cronometrar(lambda: pedidos.procesar_pedidos("pedidos.csv", "bodega01"))
+        almacen._store = None
+
+    print(f"SKUs: {cantidad:,} | líneas: {lineas:,} en {lineas // por_pedido:,} pedidos")
+    print(f"Completados: {completados:,} | rechazados: {rechazados:,}")
+    print(f"Tiempo total: {ms:10.0f} ms ({lineas / ms * 60_000:,.0f} líneas/minuto)")
+
+def _sesion_egresos(directorio, semilla, skus, egresos):
+    """Proceso de una terminal: egresos de 1 unidad sobre SKUs al azar; retorna (confirmados, conflictos)"""
+    os.chdir(directorio)
+    azar = random.Random(semilla)
+    store = almacen.ProductStore("data/productos.json")
+    confirmados = conflictos = 0
+    while confirmados < egresos:
+        producto = store.obtener(f"P{azar.randrange(skus):07d}", "L000")
+        store.registrar_movimiento(producto, -1, {"tipo": "Egreso", "cantidad": 1, "usuario": f"s{semilla}"})
+        try:
+            store.guardar()
+            confirmados += 1
+        except bloqueos.ConflictoConcurrenciaError:
+            conflictos += 1
+    return confirmados, conflictos
+
+def _sesion_usuarios(directorio, usuario_id, cambios):
+    """Proceso que cambia `cambios` veces el teléfono de su propio usuario; retorna los conflictos"""
+    os.chdir(directorio)
+    conflictos = 0
+    for i in range(cambios):
+        while True:
+            usuarios_dict = usuarios.cargar_usuarios()
+            usuarios_dict[usuario_id]["telefono"] = f"+569{i:08d}"
+            try:
+                usuarios.guardar_usuarios(usuarios_dict)
+                break
+            except bloqueos.ConflictoConcurrenciaError:
+                conflictos += 1
+    return conflictos
+
+def bench_concurrencia(skus=2000, egresos=200, sesiones=(1, 2, 4, 8)):
+    """Varias terminales escribiendo a la vez: sin actualizaciones perdidas y throughput por sesión"""
+    print("\n--- BENCHMARK: SESIONES CONCURRENTES ---")
+    contexto = multiprocessing.get_context("fork")
+
+    for cantidad in sesiones:
+        with directorio_temporal() as directorio:
+            store = almacen.ProductStore("data/productos.json")
+            store.agregar(dict(_producto_ejemplo(i), lote="L000", cantidad=10_000) for i in range(skus))
+            store.compactar()
+            with contexto.Pool(cantidad) as pool:
+                resultados, ms = _cronometrar(lambda: pool.starmap(
+                    _sesion_egresos, [(directorio, semilla, skus, egresos) for semilla in range(cantidad)]))
+
+            total = sum(confirmados for confirmados, _ in resultados)
+            final = sum(p["cantidad"] for p in almacen.ProductStore("data/productos.json").cargar())
+            perdidas = (skus * 10_000 - total) - final
+            print(f"Sesiones: {cantidad} | egresos: {total:6,} en {ms:7.0f} ms ({total / ms * 1000:7,.0f}/s) | "
+                  f"conflictos: {sum(c for _, c in resultados):3} | unidades perdidas: {perdidas:g}")
+
+    with directorio_temporal() as directorio:
+        usuarios.guardar_usuarios({f"user_{i:03d}": {"id": f"user_{i:03d}", "telefono": ""} for i in range(8)})
+        with contexto.Pool(8) as pool:
+            conflictos = pool.starmap(_sesion_usuarios, [(directorio, f"user_{i:03d}", 50) for i in range(8)])
+        versiones = [u["version"] for u in usuarios.cargar_usuarios().values()]
+        print(f"Usuarios: 8 sesiones x 50 cambios | versiones finales: {min(versiones)}-{max(versiones)} "
+              f"(esperado 51) | conflictos: {sum(conflictos)}")
+
+def _proceso_servicio(listo):
+    """Proceso que ejecuta el servicio de inventario hasta que se lo termina"""
+    import asyncio
+    asyncio.run(servicio.servir(cliente.RUTA_SOCKET, listo.set))
+
+def _sesion_cliente(semilla, skus, egresos):
+    """Como _sesion_egresos, pero a través del servicio; retorna (confirmados, conflictos)"""
+    cliente.conectar()
+    store = cliente.StoreRemoto()
+    azar = random.Random(semilla)
+    confirmados = conflictos = 0
+    while confirmados < egresos:
+        producto = store.obtener(f"P{azar.randrange(skus):07d}", "L000")
+        store.registrar_movimiento(producto, -1, {"tipo": "Egreso", "cantidad": 1, "usuario": f"s{semilla}"})
+        try:
+            store.guardar()
+            confirmados += 1
+        except bloqueos.ConflictoConcurrenciaError:
+            conflictos += 1
+    return confirmados, conflictos
+
+def bench_servicio(cantidad=100_000, lecturas=2000, egresos=200, sesiones=(1, 2, 4, 8)):
+    """Servicio en memoria: lecturas de un cliente y escrituras agrupadas frente a sesiones independientes"""
+    print("\n--- BENCHMARK: SERVICIO DE INVENTARIO ---")
+    contexto = multiprocessing.get_context("fork")
+
+    with directorio_temporal():
+        store = almacen.ProductStore("data/productos.json")
+        store.agregar(dict(_producto_ejemplo(i), lote="L000", cantidad=10_000) for i in range(cantidad))
+        store.compactar()
+
+        # Cada sesión sin servicio carga y parsea el inventario antes de su primera lectura
+        _, ms_sesion = _cronometrar(lambda: almacen.ProductStore("data/productos.json").obtener("P0000042", "L000"))
+
+        listo = contexto.Event()
+        proceso = contexto.Process(target=_proceso_servicio, args=(listo,))
+        proceso.start()
+        try:
+            listo.wait(120)
+            conexion = cliente.Conexion()
+            azar = random.Random(1)
+            tiempos = []
+            for _ in range(lecturas):
+                codigo = f"P{azar.randrange(cantidad):07d}"
+                inicio = time.perf_counter()
+                conexion.llamar("obtener", codigo, "L000")
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            conexion.cerrar()
+            tiempos.sort()
+            print(f"SKUs: {cantidad:,} | primera lectura de una sesión sin servicio: {ms_sesion:.0f} ms")
+            print(f"obtener() vía servicio: p50 {tiempos[len(tiempos) // 2]:.3f} ms | "
+                  f"p99 {tiempos[len(tiempos) * 99 // 100]:.3f} ms")
+
+            for cantidad_sesiones in sesiones:
+                with contexto.Pool(cantidad_sesiones) as pool:
+                    resultados, ms = _cronometrar(lambda: pool.starmap(
+                        _sesion_cliente, [(semilla, cantidad, egresos) for semilla in range(cantidad_sesiones)]))
+                total = sum(confirmados for confirmados, _ in resultados)
+                print(f"Clientes: {cantidad_sesiones} | egresos: {total:6,} en {ms:7.0f} ms "
+                      f"({total / ms * 1000:7,.0f}/s) | conflictos: {sum(c for _, c in resultados)}")
+        finally:
+            proceso.terminate()
+            proceso.join()
+
+        final = sum(p["cantidad"] for p in almacen.ProductStore("data/productos.json").cargar())
+        esperado = cantidad * 10_000 - egresos * sum(sesiones)
+        print(f"Unidades en disco: {final:,.0f} (esperado {esperado:,})")
+
+def _usuario_ejemplo(i):
+    """Genera un usuario sintético con email y RUN únicos"""
+    return {
+        "id": f"user_{i:05d}",
+        "nombre": "USUARIO",
+        "apellido_paterno": f"PRUEBA{i}",
+        "apellido_materno": "",
+        "run": f"{10_000_000 + i}",
+        "email": f"usuario{i}@empresa.cl",
+        "telefono": "+56900000000",
+        "rol": "Usuario",
+        "contrasena": f"Clave{i}",
+        "fecha_registro": "2024-01-01 00:00:00",
+        "activo": True
+    }
+
+def _buscar_usuario_legado(usuarios_dict, identificador, contrasena):
+    """Implementación anterior del login: recorre todos los usuarios"""
+    for user_id, user_data in usuarios_dict.items():
+        if (user_id == identificador or user_data.get("email") == identificador) and \
+           user_data["contrasena"] == contrasena and user_data.get("activo", True):
+            return user_id
+    return None
+
+def bench_usuarios(tamanos=(1_000, 10_000, 50_000), consultas=2000, registros=20):
+    """Login y detección de duplicados: directorio indexado frente a recorrer usuarios.json"""
+    print("\n--- BENCHMARK: DIRECTORIO DE USUARIOS ---")
+    print(f"{'Usuarios':>9} {'Login legado (µs)':>18} {'Login índice (µs)':>18} "
+          f"{'Duplicado legado (µs)':>22} {'Duplicado índice (µs)':>22} {'Registro (ms)':>14}")
+    print("-" * 109)
+
+    for tamano in tamanos:
+        with directorio_temporal():
+            usuarios.guardar_usuarios({f"user_{i:05d}": _usuario_ejemplo(i) for i in range(1, tamano + 1)})
+            azar = random.Random(1)
+            muestras = [azar.randrange(1, tamano + 1) for _ in range(consultas)]
+
+            # Antes: cada intento recorría los usuarios recién leídos (y el cambio de clave releía el archivo)
+            usuarios_dict = usuarios.cargar_usuarios()
+            inicio = time.perf_counter()
+            for i in muestras:
+                _buscar_usuario_legado(usuarios_dict, f"usuario{i}@empresa.cl", f"Clave{i}")
+            legado_us = (time.perf_counter() - inicio) / consultas * 1e6
+
+            directorio = usuarios.DirectorioUsuarios()
+            directorio.cargar()
+            inicio = time.perf_counter()
+            for i in muestras:
+                usuarios_dict = directorio.cargar()
+                usuario_id = directorio.resolver(f"usuario{i}@empresa.cl")
+                assert usuarios_dict[usuario_id]["contrasena"] == f"Clave{i}"
+            indice_us = (time.perf_counter() - inicio) / consultas * 1e6
+
+            inicio = time.perf_counter()
+            for i in muestras:
+                any(u.get("run") == f"{10_000_000 + i}" for u in usuarios_dict.values())
+            duplicado_legado_us = (time.perf_counter() - inicio) / consultas * 1e6
+            inicio = time.perf_counter()
+            for i in muestras:
+                directorio.id_por_run(f"{10_000_000 + i}")
+            duplicado_indice_us = (time.perf_counter() - inicio) / consultas * 1e6
+
+            # El registro sigue reescribiendo usuarios.json completo
+            inicio = time.perf_counter()
+            for i in range(tamano + 1, tamano + registros + 1):
+                directorio.registrar(dict(_usuario_ejemplo(i), id=None))
+            registro_ms = (time.perf_counter() - inicio) / registros * 1000
+            assert directorio.nuevo_id() == f"user_{tamano + registros + 1:03d}"
+
+            print(f"{tamano:>9,} {legado_us:>18.1f} {indice_us:>18.1f} "
+                  f"{duplicado_legado_us:>22.1f} {duplicado_indice_us:>22.1f} {registro_ms:>14.1f}")
+
+def bench_sesiones(cantidad_usuarios=10_000, logins=20, operaciones=100, verificaciones=20_000):
+    """Inicio de sesión con hash de contraseña y verificación de sesiones por token"""
+    print("\n--- BENCHMARK: CONTRASEÑAS CON HASH Y SESIONES ---")
+    with directorio_temporal():
+        usuarios.guardar_usuarios({f"user_{i:05d}": _usuario_ejemplo(i) for i in range(1, cantidad_usuarios + 1)})
+        azar = random.Random(1)
+        muestras = [azar.randrange(1, cantidad_usuarios + 1) for _ in range(logins)]
+
+        # Antes: recorrer los usuarios comparando la contraseña en texto plano
+        usuarios_dict = usuarios.cargar_usuarios()
+        _, legado_ms = _cronometrar(lambda: [_buscar_usuario_legado(usuarios_dict, f"usuario{i}@empresa.cl", f"Clave{i}")
+                                            for i in muestras])
+        legado_ms /= logins
+
+        # Primer inicio de sesión: verifica en texto plano y guarda el hash (migración)
+        _, migracion_ms = _cronometrar(lambda: [usuarios.autenticar(f"usuario{i}@empresa.cl", f"Clave{i}")
+                                               for i in muestras])
+        migracion_ms /= logins
+        _, hash_ms = _cronometrar(lambda: [usuarios.autenticar(f"usuario{i}@empresa.cl", f"Clave{i}")
+                                          for i in muestras])
+        hash_ms /= logins
+
+        token = seguridad.crear_sesion(f"user_{muestras[0]:05d}")
+        _, sesion_ms = _cronometrar(lambda: [usuarios.validar_sesion(token) for _ in range(verificaciones)])
+        sesion_us = sesion_ms / verificaciones * 1000
+
+        print(f"Usuarios: {cantidad_usuarios:,} | hash: {seguridad.ALGORITMO_HASH}")
+        print(f"{'Inicio de sesión legado (texto plano)':44} {legado_ms * 1000:10.1f} µs {1000 / legado_ms:12,.0f}/s")
+        print(f"{'Primer inicio con migración a hash':44} {migracion_ms:10.1f} ms {1000 / migracion_ms:12,.0f}/s")
+        print(f"{'Inicio de sesión con hash':44} {hash_ms:10.1f} ms {1000 / hash_ms:12,.0f}/s")
+        print(f"{'Verificación de sesión por token':44} {sesion_us:10.1f} µs {1e6 / sesion_us:12,.0f}/s")
+
+        # Una sesión de trabajo: un inicio y `operaciones` acciones que exigen usuario autenticado
+        por_sesion_hash = hash_ms * (1 + operaciones)
+        por_sesion_token = hash_ms + operaciones * sesion_us / 1000
+        print(f"Sesión de 1 inicio + {operaciones} operaciones: volviendo a verificar la contraseña "
+              f"{por_sesion_hash:,.0f} ms | con token {por_sesion_token:,.1f} ms "
+              f"(legado sin verificar: {legado_ms:,.2f} ms)")
+
+ESCENARIOS = {
+    "auditoria": bench_auditoria,
+    "cola_auditoria": bench_cola_auditoria,
+    "rotacion": bench_rotacion,
+    "almacen": bench_almacen,
+    "backends": bench_backends,
+    "journal": bench_journal,
+    "movimientos": bench_movimientos,
+    "busqueda": bench_busqueda,
+    "difusa": bench_difusa,
+    "vencimientos": bench_vencimientos,
+    "stock": bench_stock,
+    "reportes": bench_reportes,
+    "columnar": bench_columnar,
+    "streaming": bench_streaming,
+    "paginacion": bench_paginacion,
+    "modelo": bench_modelo,
+    "importacion": bench_importacion,
+    "pedidos": bench_pedidos,
+    "concurrencia": bench_concurrencia,
+    "servicio": bench_servicio,
+    "usuarios": bench_usuarios,
+    "sesiones": bench_sesiones,
+}
+
+def main():
+    nombres = sys.argv[1:] or list(ESCENARIOS)
+    for nombre in nombres:
+        if nombre not in ESCENARIOS:
+            print(f"Escenario desconocido: {nombre}. Disponibles: {', '.join(ESCENARIOS)}")
+            sys.exit(1)
+        ESCENARIOS[nombre]()
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,7 @@ Módulo principal que coordina todos los componentes del sistema
 import os
 import sys
 from datetime import datetime
-from modules import usuarios, productos, inventario, auditoria, utils
+from modules import usuarios, productos, inventario, auditoria, utils, cliente, seguridad
 
 def mostrar_menu_principal():
     """Muestra el menú principal del sistema"""
@@ -62,9 +62,13 @@ def mostrar_menu_usuario(rol):
     
     print(f"{'='*40}")
 
-def menu_usuario(usuario, rol):
+def menu_usuario(usuario, rol, sesion):
     """Maneja el menú específico para cada rol de usuario"""
     while True:
+        # Cada operación verifica el token de sesión, sin volver a pedir la contraseña
+        if usuarios.validar_sesion(sesion) is None:
+            print("\nLa sesión expiró o fue cerrada. Inicie sesión nuevamente")
+            break
         mostrar_menu_usuario(rol)
         opcion = input("\nSeleccione una opción: ").strip()
         
@@ -86,6 +90,7 @@ def menu_usuario(usuario, rol):
             elif opcion == "7":
                 print(f"\nCerrando sesión de {usuario}...")
                 auditoria.registrar_log(usuario, "CIERRE_SESION", "Sesión finalizada desde menú")
+                seguridad.cerrar_sesion(sesion)
                 break
             else:
                 print("Opción no válida")
@@ -95,7 +100,8 @@ def menu_usuario(usuario, rol):
             if opcion == "1":
                 inventario.mostrar_stock_critico()
             elif opcion == "2":
-                inventario.mostrar_productos_por_vencer()
+                valido, dias = utils.validar_numero(input("Días de anticipación (Enter = 30): ").strip() or "30")
+                inventario.mostrar_productos_por_vencer(dias if valido and dias >= 0 else 30)
             elif opcion == "3":
                 inventario.mostrar_inventario()
             elif opcion == "4":
@@ -103,6 +109,7 @@ def menu_usuario(usuario, rol):
             elif opcion == "5":
                 print(f"\nCerrando sesión de {usuario}...")
                 auditoria.registrar_log(usuario, "CIERRE_SESION", "Sesión finalizada desde menú")
+                seguridad.cerrar_sesion(sesion)
                 break
             else:
                 print("Opción no válida")
@@ -118,6 +125,7 @@ def menu_usuario(usuario, rol):
             elif opcion == "4":
                 print(f"\nCerrando sesión de {usuario}...")
                 auditoria.registrar_log(usuario, "CIERRE_SESION", "Sesión finalizada desde menú")
+                seguridad.cerrar_sesion(sesion)
                 break
             else:
                 print("Opción no válida")
@@ -135,6 +143,7 @@ def menu_usuario(usuario, rol):
             elif opcion == "5":
                 print(f"\nCerrando sesión de {usuario}...")
                 auditoria.registrar_log(usuario, "CIERRE_SESION", "Sesión finalizada desde menú")
+                seguridad.cerrar_sesion(sesion)
                 break
             else:
                 print("Opción no válida")
@@ -146,6 +155,7 @@ def menu_usuario(usuario, rol):
             elif opcion == "2":
                 print(f"\nCerrando sesión de {usuario}...")
                 auditoria.registrar_log(usuario, "CIERRE_SESION", "Sesión finalizada desde menú")
+                seguridad.cerrar_sesion(sesion)
                 break
             else:
                 print("Opción no válida")
@@ -154,8 +164,23 @@ def menu_usuario(usuario, rol):
             print("Rol no reconocido")
             break
 
+def conectar_cliente(argumentos):
+    """Modo cliente (main.py --cliente [socket]): usa el servicio de inventario ya cargado"""
+    posicion = argumentos.index("--cliente")
+    siguiente = argumentos[posicion + 1] if posicion + 1 < len(argumentos) else ""
+    ruta = siguiente if siguiente and not siguiente.startswith("-") else cliente.RUTA_SOCKET
+    try:
+        cliente.conectar(ruta)
+    except OSError as error:
+        print(f"No se pudo conectar al servicio de inventario en {ruta}: {error}")
+        print("Inícielo con: python modules/servicio.py")
+        sys.exit(1)
+    print(f"Conectado al servicio de inventario en {ruta}")
+
 def main():
     """Función principal del sistema"""
+    if "--cliente" in sys.argv[1:]:
+        conectar_cliente(sys.argv[1:])
     utils.crear_estructura_carpetas()
     utils.mostrar_banner()
     
@@ -164,19 +189,23 @@ def main():
     
     usuario_actual = None
     rol_actual = None
+    sesion_actual = None
     
     while True:
         mostrar_menu_principal()
         opcion = input("\nSeleccione una opción: ").strip()
         
         if opcion == "1":  # Iniciar sesión
-            usuario_actual, rol_actual = usuarios.iniciar_sesion()
+            usuario_actual, rol_actual, sesion_actual = usuarios.iniciar_sesion()
             if usuario_actual:
                 auditoria.registrar_log(usuario_actual, "INICIO_SESION", f"Sesión iniciada como {rol_actual}")
-                menu_usuario(usuario_actual, rol_actual)
+                menu_usuario(usuario_actual, rol_actual, sesion_actual)
+                # El token ya se revocó al cerrar sesión: no queda nada que la terminal pueda reusar
+                usuario_actual, rol_actual, sesion_actual = None, None, None
         
         elif opcion == "2":  # Registrarse
-            if usuario_actual and rol_actual == "Administrador":
+            datos_sesion = usuarios.validar_sesion(sesion_actual)
+            if datos_sesion and datos_sesion["rol"] == "Administrador":
                 usuarios.registrar_usuario()
             else:
                 print("ERROR: Solo los administradores pueden registrar nuevos usuarios")
@@ -185,6 +214,8 @@ def main():
             print("\n¡Gracias por usar el sistema!")
             if usuario_actual:
                 auditoria.registrar_log(usuario_actual, "CIERRE_SESION", "Sesión finalizada desde menú principal")
+            # Escribe lo que quede en la cola de auditoría antes de salir
+            auditoria.detener_escritor()
             sys.exit(0)
         
         else:
@@ -7,5 +7,17 @@ from . import productos
 from . import inventario
 from . import auditoria
 from . import utils
+from . import almacen
+from . import movimientos
+from . import indices
+from . import fechas
+from . import columnar
+from . import paginacion
+from . import modelo
+from . import pedidos
+from . import bloqueos
+from . import cliente
+from . import servicio
+from . import seguridad
 
-__all__ = ['usuarios', 'productos', 'inventario', 'auditoria', 'utils']
\ No newline at end of file
+__all__ = ['usuarios', 'productos', 'inventario', 'auditoria', 'utils', 'almacen', 'movimientos', 'indices', 'fechas', 'columnar', 'paginacion', 'modelo', 'pedidos', 'bloqueos', 'cliente', 'servicio', 'seguridad']
\ No newline at end of file
@@ -0,0 +1,793 @@
+"""
+Módulo de almacenamiento de productos
+Mantiene el inventario en memoria y lo sincroniza con el archivo de datos
+"""
+
+import json
+import os
+from datetime import date
+from itertools import chain
+
+from modules import utils
+from modules import movimientos
+from modules import indices
+from modules import fechas
+from modules import columnar
+from modules import modelo
+from modules import bloqueos
+from modules import cliente
+from modules.indices import ClaveDuplicadaError
+from modules.bloqueos import ConflictoConcurrenciaError
+
+ARCHIVO_PRODUCTOS = "data/productos.json"
+ARCHIVO_PRODUCTOS_DB = "data/productos.db"
+
+# Backend de almacenamiento: "json" (archivo productos.json) o "sqlite" (productos.db)
+BACKEND_PRODUCTOS = os.environ.get("ABP3_BACKEND_PRODUCTOS", "json")
+
+CAMPOS_BUSQUEDA = ("codigo", "descripcion", "lote", "ubicacion", "proveedor")
+
+# Journal de cambios: se compacta en el snapshot cuando supera
+# MIN_BYTES_COMPACTACION y FACTOR_COMPACTACION veces el tamaño del snapshot
+MIN_BYTES_COMPACTACION = 1024 * 1024
+FACTOR_COMPACTACION = 0.5
+FSYNC_JOURNAL = True
+
+# Tamaño de cada lectura de leer_productos
+TAMANO_BLOQUE_LECTURA = 64 * 1024
+
+def leer_productos(ruta=ARCHIVO_PRODUCTOS, tamano_bloque=TAMANO_BLOQUE_LECTURA):
+    """Genera uno a uno los productos del arreglo JSON guardado en `ruta`.
+
+    El archivo se lee por bloques y cada producto se decodifica apenas está
+    completo, así la memoria usada depende del producto más grande y no del
+    tamaño del archivo. `ruta` también puede ser un archivo de texto ya
+    abierto, que se cierra al terminar. Lanza OSError si no se puede abrir,
+    json.JSONDecodeError si el JSON es inválido y ValueError si no es un arreglo.
+    """
+    decodificador = json.JSONDecoder()
+    archivo = open(ruta, 'r', encoding='utf-8') if isinstance(ruta, (str, os.PathLike)) else ruta
+    with archivo as f:
+        buffer = ""
+        posicion = 0
+        fin_archivo = False
+        # Qué se espera a continuación: "[" al inicio, un producto o "]" tras
+        # abrir, un producto tras cada coma, "," o "]" tras cada producto y
+        # solo espacios después del cierre
+        estado = "inicio"
+        while True:
+            while posicion < len(buffer) and buffer[posicion] in " \t\r\n":
+                posicion += 1
+            if posicion < len(buffer):
+                caracter = buffer[posicion]
+                if estado == "inicio":
+                    if caracter != "[":
+                        raise ValueError(f"{getattr(f, 'name', ruta)} no contiene un arreglo JSON")
+                    estado = "primero"
+                    posicion += 1
+                    continue
+                if estado == "final":
+                    raise json.JSONDecodeError("Datos después del cierre del arreglo", buffer, posicion)
+                if estado == "separador":
+                    if caracter not in ",]":
+                        raise json.JSONDecodeError("Se esperaba ',' o ']'", buffer, posicion)
+                    estado = "valor" if caracter == "," else "final"
+                    posicion += 1
+                    continue
+                if caracter == "]" and estado == "primero":
+                    estado = "final"
+                    posicion += 1
+                    continue
+                if caracter in ",]":
+                    raise json.JSONDecodeError("Se esperaba un producto", buffer, posicion)
+                try:
+                    producto, fin = decodificador.raw_decode(buffer, posicion)
+                except ValueError:
+                    if fin_archivo:
+                        raise
+                else:
+                    # Un valor que termina justo al final del bloque podría seguir en el próximo
+                    if fin < len(buffer) or fin_archivo:
+                        yield producto
+                        posicion = fin
+                        estado = "separador"
+                        continue
+            elif fin_archivo:
+                if estado == "final":
+                    return
+                raise json.JSONDecodeError("Arreglo sin cerrar", buffer, posicion)
+
+            # Falta texto: se descarta lo ya leído y se agrega otro bloque
+            # (al menos tan grande como lo pendiente, para productos muy largos)
+            bloque = f.read(max(tamano_bloque, len(buffer) - posicion))
+            buffer = buffer[posicion:] + bloque
+            posicion = 0
+            fin_archivo = not bloque
+
+def _tipos_por_clave(operaciones):
+    """{clave: tipos de operación} de los productos que tocan las operaciones.
+
+    Un cambio de campos que modifica la clave toca la clave anterior y la nueva.
+    """
+    tipos = {}
+    for operacion in operaciones:
+        if operacion["op"] == "alta":
+            claves = [indices.clave(operacion["producto"])]
+        else:
+            claves = [tuple(operacion["clave"])]
+            if operacion["op"] == "campos":
+                claves.append(indices.clave(dict(zip(("codigo", "lote"), claves[0]), **operacion["campos"])))
+        for clave in claves:
+            tipos.setdefault(clave, set()).add(operacion["op"])
+    return tipos
+
+def _aplicar_cambios(producto, cambios, desde):
+    """Aplica a `producto` las operaciones de `cambios` ({clave: [(orden, operación)]})
+    posteriores a `desde`, siguiendo la clave si una operación la modifica"""
+    clave = indices.clave(producto)
+    while True:
+        for orden, operacion in cambios.get(clave, ()):
+            if orden <= desde:
+                continue
+            desde = orden
+            if operacion["op"] == "campos":
+                producto.update(operacion["campos"])
+                nueva = indices.clave(producto)
+                if nueva != clave:
+                    clave = nueva
+                    break
+            else:
+                producto["cantidad"] = producto.get("cantidad", 0) + operacion["delta"]
+        else:
+            return producto
+
+class ProductStore:
+    """Inventario en memoria respaldado por un snapshot JSON y un journal de cambios.
+
+    Cada guardar() agrega una sola línea al journal (productos.journal) con
+    las operaciones pendientes, por lo que el costo de una escritura no
+    depende del tamaño del inventario. Al cargar se lee el snapshot
+    (productos.json) y se reaplican las operaciones del journal posteriores a
+    él. Cuando el journal crece lo suficiente se compacta: se reescribe el
+    snapshot y se vacía el journal.
+
+    Los movimientos no se guardan en la ficha del producto sino en el libro
+    de movimientos (modules.movimientos), así las fichas no crecen.
+
+    Los índices en memoria (modules.indices) se mantienen al día en cada
+    cambio; (codigo, lote) es la clave primaria y no admite duplicados.
+
+    Varias sesiones pueden usar los mismos archivos: las lecturas toman un
+    bloqueo compartido (productos.lock) y guardar() uno exclusivo solo
+    mientras se pone al día con el journal y agrega su línea. Cada producto
+    lleva una versión (cantidad de cambios confirmados); un cambio de
+    campos falla con ConflictoConcurrenciaError si otra sesión confirmó
+    antes un cambio sobre el mismo producto, y las variaciones de cantidad
+    se suman a la cantidad vigente salvo que dejen el stock negativo.
+    """
+
+    def __init__(self, ruta=ARCHIVO_PRODUCTOS):
+        self.ruta = ruta
+        base = os.path.splitext(ruta)[0]
+        self.ruta_journal = base + ".journal"
+        self.ruta_checkpoint = base + ".checkpoint"
+        self.ruta_agregados = base + ".agregados"
+        self._bloqueo = bloqueos.Bloqueo(bloqueos.ruta_bloqueo(ruta))
+        self._productos = []
+        self._indice_clave = indices.IndiceClave()
+        self._indice_texto = indices.IndiceTrigramas()
+        self._indice_difuso = indices.IndiceDifuso()
+        self._indice_vencimiento = indices.IndiceVencimiento()
+        self._indice_ubicacion = indices.IndiceUbicacion()
+        self._indice_stock = indices.IndiceStock()
+        self._indice_agregados = indices.IndiceAgregados()
+        self._indice_columnar = columnar.IndiceColumnar()
+        self._indices = [self._indice_clave, self._indice_texto, self._indice_difuso,
+                         self._indice_vencimiento, self._indice_ubicacion, self._indice_stock,
+                         self._indice_agregados, self._indice_columnar]
+        for indice in self._indices:
+            indice.reconstruir(self._productos)
+        self._cargado = False
+        self._firma = None
+        self._journal_leido = 0
+        self._seq = 0
+        self._pendientes = []
+        self._movimientos_pendientes = []
+
+    def _firma_archivo(self, ruta=None):
+        """Retorna (mtime_ns, tamaño) del archivo o None si no existe"""
+        try:
+            info = os.stat(ruta or self.ruta)
+        except FileNotFoundError:
+            return None
+        return (info.st_mtime_ns, info.st_size)
+
+    def _leer(self):
+        """Lee y parsea el snapshot completo como lista de modelo.Producto"""
+        try:
+            # Se convierte producto por producto: nunca están todos los dicts a la vez
+            return [modelo.Producto(datos) for datos in leer_productos(self.ruta)]
+        except (OSError, ValueError):
+            return []
+
+    def _leer_checkpoint(self, firma):
+        """Último seq incluido en el snapshot con `firma` (0 si no hubo compactación).
+
+        El checkpoint guarda la firma del snapshot que generó: si el snapshot
+        en disco no coincide (caída antes del reemplazo) vale el seq anterior.
+        """
+        try:
+            with open(self.ruta_checkpoint, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if firma and list(firma) == checkpoint.get("firma"):
+            return checkpoint.get("seq", 0)
+        return checkpoint.get("seq_anterior", 0)
+
+    def _recargar(self, firma):
+        """Carga el snapshot y reaplica el journal completo"""
+        self._productos = self._leer() if firma else []
+        for indice in self._indices:
+            indice.reconstruir(self._productos)
+        self._cargado = True
+        self._firma = firma
+        self._restaurar_agregados()
+        self._seq = self._leer_checkpoint(firma)
+        self._journal_leido = 0
+        self._reaplicar_journal()
+        self._migrar()
+
+    def _restaurar_agregados(self):
+        """Usa los agregados persistidos si corresponden al snapshot cargado.
+
+        El journal que se reaplica después los lleva al estado actual.
+        """
+        try:
+            with open(self.ruta_agregados, 'r', encoding='utf-8') as f:
+                persistidos = json.load(f)
+        except (OSError, ValueError):
+            return
+        if self._firma and persistidos.get("firma") == list(self._firma):
+            self._indice_agregados.restaurar(persistidos["agregados"])
+
+    def _migrar(self):
+        """Migra en memoria los formatos antiguos y, si hubo cambios, reescribe el snapshot"""
+        historicos = self._extraer_movimientos()
+        migrados = self._migrar_fechas()
+        if not historicos and not migrados:
+            return
+
+        with self._bloqueo.exclusivo():
+            if self._firma_archivo() != self._firma:
+                # Otra sesión reescribió el snapshot mientras se esperaba el bloqueo
+                self._recargar(self._firma_archivo())
+                return
+            try:
+                if historicos:
+                    # Si una carga anterior se cortó antes de compactar, el libro
+                    # ya los tiene: solo se agregan los que falten
+                    movimientos.registrar_historicos(historicos)
+                self.compactar()
+            except Exception:
+                # Las fichas en memoria ya no tienen sus movimientos: la próxima carga relee el disco
+                self._cargado = False
+                self._firma = None
+                raise
+
+    def _extraer_movimientos(self):
+        """Quita de las fichas los movimientos que aún estén en ellas, para trasladarlos al libro.
+
+        Los que el libro no puede archivar (fecha no reconocida, entrada que
+        no es un objeto) se quedan en la ficha en vez de perderse.
+        """
+        historicos = []
+        for producto in self._productos:
+            if not isinstance(producto.get("movimientos"), list):
+                continue
+            trasladables, retenidos = [], []
+            for movimiento in producto["movimientos"]:
+                if isinstance(movimiento, dict) and movimientos.fecha_valida(movimiento.get("fecha")):
+                    trasladables.append(movimiento)
+                else:
+                    retenidos.append(movimiento)
+            if not trasladables:
+                continue
+            if retenidos:
+                producto["movimientos"] = retenidos
+            else:
+                del producto["movimientos"]
+            codigo, lote = indices.clave(producto)
+            historicos.extend(dict(m, codigo=codigo, lote=lote) for m in trasladables)
+        historicos.sort(key=lambda m: str(m.get("fecha", "")))
+        return historicos
+
+    def _migrar_fechas(self):
+        """Lleva a ISO, con su ordinal, las fechas guardadas en formatos antiguos; retorna cuántos cambió"""
+        migrados = 0
+        for producto in self._productos:
+            cambios = fechas.normalizar_producto(producto)
+            if cambios:
+                self._aplicar({"op": "campos", "clave": list(indices.clave(producto)), "campos": cambios},
+                              producto)
+                migrados += 1
+        return migrados
+
+    def _registros_journal(self, desde=0):
+        """Genera (bytes, registro) por cada línea completa del journal a partir del byte `desde`.
+
+        `registro` es None si la línea no se puede interpretar.
+        """
+        if not os.path.exists(self.ruta_journal):
+            return
+
+        with open(self.ruta_journal, 'rb') as f:
+            f.seek(desde)
+            for linea in f:
+                if not linea.endswith(b'\n'):
+                    # Línea cortada por una caída: la operación nunca se confirmó
+                    break
+                try:
+                    registro = json.loads(linea)
+                except ValueError:
+                    registro = None
+                yield len(linea), registro
+
+    def _registros_nuevos(self):
+        """Registros del journal aún no aplicados, desde el último byte leído (que avanza)"""
+        for leidos, registro in self._registros_journal(self._journal_leido):
+            self._journal_leido += leidos
+            if registro is None or registro.get("seq", 0) <= self._seq:
+                continue
+            yield registro
+
+    def _aplicar_registro(self, registro):
+        """Aplica las operaciones de un registro del journal"""
+        for operacion in registro.get("ops", []):
+            self._aplicar(operacion)
+        self._seq = registro["seq"]
+
+    def _reaplicar_journal(self):
+        """Aplica las líneas del journal desde el último byte leído"""
+        for registro in self._registros_nuevos():
+            self._aplicar_registro(registro)
+
+    def _aplicar(self, operacion, producto=None):
+        """Aplica una operación (del journal o recién creada) al inventario en memoria.
+
+        Los índices afectados se actualizan alrededor del cambio. Cada cambio
+        sobre un producto existente avanza su versión en uno, así todas las
+        sesiones que aplican el mismo journal llegan a las mismas versiones.
+        """
+        tipo = operacion["op"]
+        if tipo == "alta":
+            producto = modelo.como_producto(operacion["producto"])
+            for indice in self._indices:
+                try:
+                    indice.agregar(producto)
+                except ClaveDuplicadaError:
+                    # Solo posible con journals anteriores a la clave única
+                    self._indice_clave.duplicados.append(producto)
+            self._productos.append(producto)
+            return
+
+        if producto is None:
+            producto = self._indice_clave.obtener(*operacion["clave"])
+            if producto is None:
+                return
+
+        if tipo == "campos":
+            cambios = dict(operacion["campos"])
+        else:
+            cambios = {"cantidad": producto.get("cantidad", 0) + operacion["delta"]}
+        cambios["version"] = producto.get("version", 0) + 1
+
+        afectados = [indice for indice in self._indices if indice.campos.intersection(cambios)]
+        for indice in afectados:
+            indice.quitar(producto)
+        producto.update(cambios)
+        for indice in afectados:
+            indice.agregar(producto)
+
+    def cargar(self):
+        """Retorna la lista de productos, releyendo solo lo que cambió en disco.
+
+        La lista es compartida: para modificarla use agregar/actualizar/
+        registrar_movimiento y luego guardar.
+        """
+        if self._pendientes:
+            # Hay cambios locales sin guardar: no se descartan
+            return self._productos
+        if not self._cambio_en_disco():
+            return self._productos
+
+        with self._bloqueo.compartido():
+            firma = self._firma_archivo()
+            if firma != self._firma:
+                self._recargar(firma)
+            else:
+                firma_journal = self._firma_archivo(self.ruta_journal)
+                if firma_journal and firma_journal[1] < self._journal_leido:
+                    self._recargar(firma)
+                else:
+                    self._reaplicar_journal()
+        return self._productos
+
+    def _cambio_en_disco(self):
+        """True si el snapshot o el journal difieren de lo ya cargado (sin tomar bloqueos)"""
+        if not self._cargado or self._firma_archivo() != self._firma:
+            return True
+        firma_journal = self._firma_archivo(self.ruta_journal)
+        return bool(firma_journal) and firma_journal[1] != self._journal_leido
+
+    def en_memoria(self):
+        """True si el inventario ya está cargado en memoria"""
+        return self._cargado
+
+    def recorrer(self):
+        """Genera los productos del inventario uno a uno.
+
+        Si el inventario ya está en memoria recorre la lista cargada. Si no,
+        lee el snapshot en streaming y le aplica el journal sin cargarlo ni
+        armar índices: sirve para listados de solo lectura sobre inventarios
+        que no conviene cargar completos. Los productos generados así son
+        copias; para modificarlos use obtener().
+        """
+        if self._cargado:
+            yield from self.cargar()
+        else:
+            yield from self._recorrer_disco()
+
+    def _recorrer_disco(self):
+        """Productos del snapshot y del journal en disco, leídos en streaming"""
+        # El journal se lee y el snapshot se abre bajo el bloqueo compartido: si
+        # otra sesión compacta después, el archivo abierto sigue siendo el anterior
+        with self._bloqueo.compartido():
+            firma = self._firma_archivo()
+            seq = self._leer_checkpoint(firma)
+            altas = []
+            cambios = {}
+            orden = 0
+            for _, registro in self._registros_journal():
+                if registro is None or registro.get("seq", 0) <= seq:
+                    continue
+                for operacion in registro.get("ops", []):
+                    if operacion["op"] == "alta":
+                        altas.append((orden, operacion["producto"]))
+                    else:
+                        cambios.setdefault(tuple(operacion["clave"]), []).append((orden, operacion))
+                    orden += 1
+                seq = registro["seq"]
+            try:
+                archivo = open(self.ruta, 'r', encoding='utf-8') if firma else None
+            except OSError:
+                archivo = None
+
+        snapshot = ((-1, producto) for producto in self._leer_en_streaming(archivo)) if archivo else ()
+        # Como en memoria, los cambios de una clave repetida van a su primer producto
+        parcheados = set()
+        for desde, producto in chain(snapshot, altas):
+            producto = modelo.como_producto(producto)
+            clave = indices.clave(producto)
+            if clave in cambios and clave not in parcheados:
+                parcheados.add(clave)
+                _aplicar_cambios(producto, cambios, desde)
+            yield producto
+
+    def _leer_en_streaming(self, archivo=None):
+        """Productos del snapshot (o de `archivo` ya abierto) uno a uno; se detiene
+        sin error si el archivo está dañado"""
+        try:
+            yield from leer_productos(archivo or self.ruta)
+        except (OSError, ValueError):
+            return
+
+    def obtener(self, codigo, lote):
+        """Producto con la clave (codigo, lote) o None"""
+        self.cargar()
+        return self._indice_clave.obtener(codigo, lote)
+
+    def lotes_de(self, codigo):
+        """Lotes (productos) registrados con un código"""
+        self.cargar()
+        return self._indice_clave.lotes(codigo)
+
+    def agregar(self, nuevos):
+        """Agrega productos al inventario.
+
+        Lanza ClaveDuplicadaError (sin agregar ninguno) si algún (codigo, lote)
+        ya existe o se repite dentro de `nuevos`.
+        """
+        self.cargar()
+        nuevos = [modelo.como_producto(producto) for producto in nuevos]
+        claves = set()
+        for producto in nuevos:
+            producto.update(fechas.normalizar_producto(producto))
+            clave = indices.clave(producto)
+            if clave in claves or self._indice_clave.obtener(*clave) is not None:
+                raise ClaveDuplicadaError(f"Ya existe el producto {clave[0]} con lote {clave[1]}")
+            claves.add(clave)
+
+        for producto in nuevos:
+            operacion = {"op": "alta", "producto": producto}
+            self._aplicar(operacion)
+            self._pendientes.append(operacion)
+
+    def actualizar(self, producto, cambios):
+        """Modifica campos de un producto del inventario"""
+        clave = indices.clave(producto)
+        nueva = indices.clave(dict(producto, **cambios))
+        if nueva != clave and self._indice_clave.obtener(*nueva) is not None:
+            raise ClaveDuplicadaError(f"Ya existe el producto {nueva[0]} con lote {nueva[1]}")
+
+        cambios = dict(cambios, **fechas.normalizar_producto(cambios))
+        operacion = {"op": "campos", "clave": list(clave), "campos": cambios,
+                     "version": producto.get("version", 0)}
+        self._aplicar(operacion, producto)
+        self._pendientes.append(operacion)
+
+    def registrar_movimiento(self, producto, delta, movimiento):
+        """Aplica una variación de cantidad a un producto y registra el movimiento"""
+        codigo, lote = indices.clave(producto)
+        operacion = {"op": "delta", "clave": [codigo, lote], "delta": delta,
+                     "version": producto.get("version", 0)}
+        self._aplicar(operacion, producto)
+        self._pendientes.append(operacion)
+        self._movimientos_pendientes.append(dict(movimiento, codigo=codigo, lote=lote))
+
+    def contar(self):
+        """Cantidad de productos en el inventario"""
+        return len(self.cargar())
+
+    def buscar(self, campos, texto):
+        """Productos en que alguno de `campos` contiene `texto` (sin distinguir mayúsculas ni tildes)"""
+        if isinstance(campos, str):
+            campos = (campos,)
+        productos_list = self.cargar()
+        if self._indice_texto.campos.issuperset(campos):
+            return self._indice_texto.buscar(campos, texto)
+        texto = indices.normalizar_texto(texto)
+        return [prod for prod in productos_list
+                if any(texto in indices.normalizar_texto(prod.get(campo, "")) for campo in campos)]
+
+    def buscar_aproximado(self, texto, limite=10):
+        """Hasta `limite` productos cuya descripción o marca se parece a `texto` (admite errores de tipeo)"""
+        self.cargar()
+        return self._indice_difuso.buscar(texto, limite)
+
+    def filtrar_por_ubicacion(self, texto):
+        """Productos cuya ubicación contiene `texto`; todos si el texto está vacío"""
+        if not texto:
+            return list(self.cargar())
+        return self.buscar("ubicacion", texto)
+
+    def stock_critico(self):
+        """Productos con cantidad menor o igual a su stock mínimo"""
+        self.cargar()
+        return self._indice_stock.productos(indices.ESTADO_CRITICO)
+
+    def contar_criticos(self):
+        """Cantidad de productos con stock crítico"""
+        self.cargar()
+        return self._indice_stock.contar(indices.ESTADO_CRITICO)
+
+    def agregados(self):
+        """Totales y grupos por unidad, ubicación, proveedor y estado (ver indices.IndiceAgregados)"""
+        self.cargar()
+        return self._indice_agregados.resumen()
+
+    def verificar_agregados(self):
+        """Recalcula los agregados desde cero; retorna las diferencias con los mantenidos"""
+        self.cargar()
+        return self._indice_agregados.verificar()
+
+    def instantanea_columnar(self):
+        """Inventario en columnas para análisis (ver modules.columnar); solo lectura"""
+        self.cargar()
+        return self._indice_columnar.instantanea()
+
+    def estado_stock(self, producto):
+        """indices.ESTADO_CRITICO, indices.ESTADO_ATENCION o None para un producto del inventario"""
+        if not self._cargado:
+            # Producto generado por recorrer() sin cargar el inventario
+            return indices.estado_stock(producto)
+        return self._indice_stock.estado(producto)
+
+    def contar_por_vencer(self, fecha_limite):
+        """Cantidad de productos con vencimiento hasta `fecha_limite` (date) inclusive"""
+        self.cargar()
+        return self._indice_vencimiento.contar_hasta(fecha_limite.toordinal())
+
+    def por_vencer(self, fecha_limite, inicio=0, cantidad=None):
+        """Pares (fecha de vencimiento, producto) hasta `fecha_limite` (date) inclusive, por fecha.
+
+        `inicio` y `cantidad` permiten pedir solo una página del resultado.
+        """
+        self.cargar()
+        return [(date.fromordinal(ordinal), prod) for ordinal, prod
+                in self._indice_vencimiento.hasta(fecha_limite.toordinal(), inicio, cantidad)]
+
+    def por_ubicacion(self, inicio=0, cantidad=None):
+        """Productos ordenados por ubicación, desde la posición `inicio` y hasta `cantidad` si se indica"""
+        self.cargar()
+        return self._indice_ubicacion.pagina(inicio, cantidad)
+
+    def guardar(self):
+        """Confirma los cambios pendientes en el journal; retorna True si escribió.
+
+        Todas las operaciones pendientes van en una sola línea, de modo que
+        se aplican completas o (si la escritura se corta) no se aplican.
+        Bajo el bloqueo exclusivo primero se incorpora lo que otras sesiones
+        confirmaron; si hay conflicto se descartan los cambios pendientes y
+        se lanza ConflictoConcurrenciaError.
+        """
+        if not self._pendientes:
+            return False
+
+        os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+        with self._bloqueo.exclusivo():
+            utils.reparar_linea_incompleta(self.ruta_journal)
+            self._sincronizar()
+
+            registro = {"seq": self._seq + 1, "ops": self._pendientes}
+            linea = (json.dumps(registro, ensure_ascii=False, default=modelo.serializar) + "\n").encode('utf-8')
+            with open(self.ruta_journal, 'ab') as f:
+                f.write(linea)
+                f.flush()
+                if FSYNC_JOURNAL:
+                    os.fsync(f.fileno())
+
+            self._seq += 1
+            self._journal_leido += len(linea)
+            self._pendientes = []
+            self._confirmar_movimientos()
+
+            if self._journal_leido > max(MIN_BYTES_COMPACTACION, (self._firma or (0, 0))[1] * FACTOR_COMPACTACION):
+                self.compactar()
+        return True
+
+    def _sincronizar(self):
+        """Incorpora lo que otras sesiones confirmaron en disco; se llama con el bloqueo exclusivo.
+
+        Si las operaciones nuevas del journal no tocan productos con cambios
+        pendientes, o en ambos lados son solo variaciones de cantidad (que se
+        suman en cualquier orden), se aplican sobre el estado en memoria. Si
+        no, se recarga desde el disco y se rehacen los cambios pendientes
+        verificando la versión de cada producto.
+        """
+        firma = self._firma_archivo()
+        firma_journal = self._firma_archivo(self.ruta_journal)
+        if self._cargado and firma == self._firma and (firma_journal or (0, 0))[1] >= self._journal_leido:
+            registros = list(self._registros_nuevos())
+            if not registros:
+                return
+            ajenas = _tipos_por_clave(operacion for registro in registros for operacion in registro.get("ops", []))
+            propias = _tipos_por_clave(self._pendientes)
+            comunes = ajenas.keys() & propias.keys()
+            if all(ajenas[clave] == propias[clave] == {"delta"} for clave in comunes):
+                for registro in registros:
+                    self._aplicar_registro(registro)
+                for clave in comunes:
+                    descuento = sum(operacion["delta"] for operacion in self._pendientes
+                                    if operacion["op"] == "delta" and tuple(operacion["clave"]) == clave)
+                    producto = self._indice_clave.obtener(*clave)
+                    if descuento < 0 and producto is not None and producto.get("cantidad", 0) < 0:
+                        self._descartar_pendientes()
+                        raise ConflictoConcurrenciaError(
+                            f"Stock insuficiente de {clave[0]} lote {clave[1]}: otra sesión lo descontó antes")
+                return
+
+        pendientes, movimientos_pendientes = self._pendientes, self._movimientos_pendientes
+        self._pendientes, self._movimientos_pendientes = [], []
+        self._recargar(firma)
+        try:
+            for operacion in pendientes:
+                self._rehacer(operacion)
+        except ConflictoConcurrenciaError:
+            self._descartar_pendientes()
+            raise
+        self._pendientes, self._movimientos_pendientes = pendientes, movimientos_pendientes
+
+    def _rehacer(self, operacion):
+        """Aplica un cambio pendiente sobre el estado recién recargado del disco.
+
+        Lanza ConflictoConcurrenciaError si el producto cambió de forma
+        incompatible desde que se leyó.
+        """
+        if operacion["op"] == "alta":
+            codigo, lote = indices.clave(operacion["producto"])
+            if self._indice_clave.obtener(codigo, lote) is not None:
+                raise ConflictoConcurrenciaError(f"Otra sesión ya ingresó el producto {codigo} con lote {lote}")
+            self._aplicar(operacion)
+            return
+
+        codigo, lote = operacion["clave"]
+        producto = self._indice_clave.obtener(codigo, lote)
+        if producto is None:
+            raise ConflictoConcurrenciaError(f"Otra sesión modificó el producto {codigo} con lote {lote}")
+        if operacion["op"] == "campos":
+            nueva = indices.clave(dict(producto, **operacion["campos"]))
+            if producto.get("version", 0) != operacion["version"] or \
+                    (nueva != (codigo, lote) and self._indice_clave.obtener(*nueva) is not None):
+                raise ConflictoConcurrenciaError(f"Otra sesión modificó el producto {codigo} con lote {lote}")
+        else:
+            # La variación se suma a la cantidad vigente
+            operacion["version"] = producto.get("version", 0)
+        self._aplicar(operacion, producto)
+        if operacion["op"] == "delta" and operacion["delta"] < 0 and producto.get("cantidad", 0) < 0:
+            raise ConflictoConcurrenciaError(
+                f"Stock insuficiente de {codigo} lote {lote}: otra sesión lo descontó antes")
+
+    def _descartar_pendientes(self):
+        """Olvida los cambios sin guardar y vuelve al estado confirmado en disco"""
+        self._pendientes = []
+        self._movimientos_pendientes = []
+        self._recargar(self._firma_archivo())
+
+    def compactar(self):
+        """Reescribe el snapshot con el estado actual (incluidos los cambios
+        pendientes) y vacía el journal"""
+        with self._bloqueo.exclusivo():
+            self._sincronizar()
+            self._escribir_snapshot()
+
+    def _escribir_snapshot(self):
+        """Escribe el snapshot, los agregados y el checkpoint; se llama con el bloqueo exclusivo"""
+        os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+        temporal = self.ruta + ".tmp"
+
+        # Un producto por línea: sigue siendo un arreglo JSON válido, pero más
+        # barato de serializar que indent=2 y legible en un diff
+        with open(temporal, 'w', encoding='utf-8') as f:
+            f.write("[\n")
+            for i, producto in enumerate(self._productos):
+                if i:
+                    f.write(",\n")
+                f.write(json.dumps(producto, ensure_ascii=False, default=modelo.serializar))
+            f.write("\n]\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        # os.replace conserva el mtime, así que la firma del temporal es la
+        # del snapshot final: el checkpoint se escribe antes del reemplazo
+        firma = self._firma_archivo(temporal)
+        with open(self.ruta_agregados + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump({"firma": list(firma), "agregados": self._indice_agregados.resumen()}, f,
+                      ensure_ascii=False)
+        os.replace(self.ruta_agregados + ".tmp", self.ruta_agregados)
+        seq_anterior = self._leer_checkpoint(self._firma)
+        with open(self.ruta_checkpoint + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump({"seq": self._seq, "firma": list(firma), "seq_anterior": seq_anterior}, f)
+        os.replace(self.ruta_checkpoint + ".tmp", self.ruta_checkpoint)
+        os.replace(temporal, self.ruta)
+
+        # Desde aquí el journal ya está incluido en el snapshot
+        open(self.ruta_journal, 'wb').close()
+        self._firma = firma
+        self._journal_leido = 0
+        self._pendientes = []
+        self._confirmar_movimientos()
+
+    def _confirmar_movimientos(self):
+        """Agrega al libro los movimientos de los cambios ya confirmados"""
+        if self._movimientos_pendientes:
+            movimientos.registrar_lote(self._movimientos_pendientes)
+            self._movimientos_pendientes = []
+
+_store = None
+
+def obtener_store():
+    """Retorna el almacén de productos compartido por todos los módulos"""
+    global _store
+    if _store is None:
+        if cliente.conectado():
+            # Modo cliente: el inventario lo mantiene el servicio (modules.servicio)
+            _store = cliente.StoreRemoto()
+        elif BACKEND_PRODUCTOS == "sqlite":
+            from modules.almacen_sqlite import SQLiteProductStore
+            _store = SQLiteProductStore(ARCHIVO_PRODUCTOS_DB)
+        elif BACKEND_PRODUCTOS == "json":
+            _store = ProductStore(ARCHIVO_PRODUCTOS)
+        else:
+            raise ValueError(f"Backend de productos desconocido: {BACKEND_PRODUCTOS}")
+    return _store
@@ -0,0 +1,395 @@
+"""
+Módulo de almacenamiento de productos en SQLite
+Backend alternativo a productos.json con columnas indexadas
+"""
+
+import json
+import os
+import sqlite3
+import sys
+from datetime import date
+if __name__ == "__main__":
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import almacen
+from modules import movimientos
+from modules import indices
+from modules import fechas
+from modules import columnar
+from modules import modelo
+from modules.bloqueos import ConflictoConcurrenciaError
+
+# Columnas que se extraen del producto para filtrar e indexar; el registro
+# completo se guarda como JSON en la columna `datos`
+COLUMNAS = ("codigo", "lote", "descripcion", "ubicacion", "fecha_vencimiento",
+            "proveedor", "cantidad", "stock_minimo")
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS productos (
+    id INTEGER PRIMARY KEY,
+    codigo TEXT NOT NULL DEFAULT '',
+    lote TEXT NOT NULL DEFAULT '',
+    descripcion TEXT NOT NULL DEFAULT '',
+    ubicacion TEXT NOT NULL DEFAULT '',
+    fecha_vencimiento TEXT NOT NULL DEFAULT '',
+    proveedor TEXT NOT NULL DEFAULT '',
+    cantidad REAL NOT NULL DEFAULT 0,
+    stock_minimo REAL NOT NULL DEFAULT 0,
+    datos TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_productos_codigo ON productos(codigo);
+CREATE INDEX IF NOT EXISTS idx_productos_ubicacion ON productos(ubicacion);
+CREATE INDEX IF NOT EXISTS idx_productos_vencimiento ON productos(fecha_vencimiento);
+CREATE INDEX IF NOT EXISTS idx_productos_proveedor ON productos(proveedor);
+CREATE INDEX IF NOT EXISTS idx_productos_critico ON productos(cantidad - stock_minimo);
+"""
+
+# Vencimiento en formato YYYY-MM-DD hasta una fecha límite
+_CONDICION_VENCIMIENTO = ("fecha_vencimiento <= ? AND fecha_vencimiento GLOB "
+                          "'[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'")
+
+def _escapar_like(texto):
+    """Escapa los comodines de LIKE para buscar el texto literal"""
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _fila(producto):
+    """Valores de las columnas indexadas más el JSON completo del producto"""
+    valores = []
+    for columna in COLUMNAS:
+        valor = producto.get(columna)
+        if columna in ("cantidad", "stock_minimo"):
+            valores.append(valor if isinstance(valor, (int, float)) else 0)
+        else:
+            valores.append("" if valor is None else str(valor))
+    valores.append(json.dumps(producto, ensure_ascii=False, default=modelo.serializar))
+    return valores
+
+def _crear_clave_unica(conexion):
+    """Crea el índice único (codigo, lote); si la base trae duplicados deja uno no único"""
+    try:
+        conexion.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_productos_clave ON productos(codigo, lote)")
+    except sqlite3.IntegrityError:
+        print("⚠️  La base contiene productos con código y lote repetidos; "
+              "no se puede exigir la clave única hasta corregirlos")
+        conexion.execute("CREATE INDEX IF NOT EXISTS idx_productos_codigo_lote ON productos(codigo, lote)")
+        return
+    conexion.execute("DROP INDEX IF EXISTS idx_productos_codigo_lote")
+
+class SQLiteProductStore:
+    """Inventario en una base SQLite (modo WAL) con la misma interfaz que ProductStore.
+
+    Los productos se identifican por (codigo, lote). Los cambios quedan en la
+    transacción abierta hasta llamar a guardar(); los movimientos van al
+    libro de movimientos al confirmar. Como en ProductStore, un conflicto
+    con otra sesión descarta todos los cambios pendientes y se informa en
+    guardar().
+    """
+
+    def __init__(self, ruta=almacen.ARCHIVO_PRODUCTOS_DB):
+        self.ruta = ruta
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        self._conexion = sqlite3.connect(ruta)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("PRAGMA synchronous=NORMAL")
+        self._conexion.executescript(ESQUEMA)
+        _crear_clave_unica(self._conexion)
+        self._conexion.commit()
+        self._movimientos_pendientes = []
+        # Conflicto detectado antes de guardar(); se lanza al guardar
+        self._conflicto = None
+        # Índice de palabras para buscar_aproximado; se arma al primer uso
+        self._indice_difuso = None
+
+    def _iniciar_transaccion(self):
+        """Abre la transacción de los cambios pendientes si aún no hay una.
+
+        sqlite3 no abre transacción para un SAVEPOINT: sin este BEGIN el
+        RELEASE confirmaría el cambio de inmediato, fuera de guardar().
+        """
+        if not self._conexion.in_transaction:
+            self._conexion.execute("BEGIN IMMEDIATE")
+
+    def _descartar_pendientes(self, error):
+        """Deshace la transacción pendiente y deja el conflicto para guardar()"""
+        self._conexion.rollback()
+        self._movimientos_pendientes = []
+        self._conflicto = error
+
+    def _recorrer(self, condicion="1", parametros=(), orden="id"):
+        """Ejecuta un SELECT de productos y genera los registros (modelo.Producto) a medida que se leen"""
+        cursor = self._conexion.execute(
+            f"SELECT datos FROM productos WHERE {condicion} ORDER BY {orden}", parametros)
+        for (datos,) in cursor:
+            yield modelo.Producto(json.loads(datos))
+
+    def _consultar(self, condicion="1", parametros=(), orden="id"):
+        """Ejecuta un SELECT de productos y retorna los registros (modelo.Producto)"""
+        return list(self._recorrer(condicion, parametros, orden))
+
+    def cargar(self):
+        """Retorna todos los productos"""
+        return self._consultar()
+
+    def en_memoria(self):
+        """La base no se carga en memoria: siempre False"""
+        return False
+
+    def recorrer(self):
+        """Genera los productos uno a uno, leyéndolos de la base a medida que se piden"""
+        return self._recorrer()
+
+    def obtener(self, codigo, lote):
+        """Producto con la clave (codigo, lote) o None"""
+        productos_list = self._consultar("codigo = ? AND lote = ?", (str(codigo), str(lote)))
+        return productos_list[0] if productos_list else None
+
+    def lotes_de(self, codigo):
+        """Lotes (productos) registrados con un código"""
+        return self._consultar("codigo = ?", (str(codigo),))
+
+    def agregar(self, nuevos):
+        """Agrega productos al inventario.
+
+        Lanza ClaveDuplicadaError (sin agregar ninguno) si algún (codigo, lote)
+        ya existe o se repite dentro de `nuevos`.
+        """
+        def filas():
+            for producto in nuevos:
+                producto.update(fechas.normalizar_producto(producto))
+                yield _fila(producto)
+
+        # El savepoint deshace solo este lote, sin tocar otros cambios pendientes
+        self._iniciar_transaccion()
+        self._conexion.execute("SAVEPOINT agregar")
+        try:
+            self._conexion.executemany(
+                f"INSERT INTO productos ({', '.join(COLUMNAS)}, datos) "
+                f"VALUES ({', '.join('?' * (len(COLUMNAS) + 1))})", filas())
+        except sqlite3.IntegrityError as error:
+            self._conexion.execute("ROLLBACK TO agregar")
+            self._conexion.execute("RELEASE agregar")
+            raise indices.ClaveDuplicadaError("Ya existe un producto con ese código y lote") from error
+        self._conexion.execute("RELEASE agregar")
+        self._indice_difuso = None
+
+    def _reescribir(self, producto, clave, version=None):
+        """Actualiza la fila identificada por `clave` (codigo, lote) con el producto.
+
+        Con `version` solo se actualiza si la fila sigue en esa versión; si
+        no, otra sesión la cambió y se lanza ConflictoConcurrenciaError.
+        """
+        asignaciones = ", ".join(f"{columna} = ?" for columna in COLUMNAS)
+        condicion = "codigo = ? AND lote = ?"
+        parametros = _fila(producto) + list(clave)
+        if version is not None:
+            condicion += " AND COALESCE(json_extract(datos, '$.version'), 0) = ?"
+            parametros.append(version)
+        try:
+            cursor = self._conexion.execute(
+                f"UPDATE productos SET {asignaciones}, datos = ? WHERE {condicion}", parametros)
+        except sqlite3.IntegrityError as error:
+            raise indices.ClaveDuplicadaError("Ya existe un producto con ese código y lote") from error
+        if version is not None and cursor.rowcount == 0:
+            raise ConflictoConcurrenciaError(f"Otra sesión modificó el producto {clave[0]} con lote {clave[1]}")
+
+    def actualizar(self, producto, cambios):
+        """Modifica campos de un producto del inventario.
+
+        Si otra sesión cambió el producto desde que se leyó, guardar()
+        lanza ConflictoConcurrenciaError.
+        """
+        clave = indices.clave(producto)
+        cambios = dict(cambios, **fechas.normalizar_producto(cambios))
+        version = producto.get("version", 0)
+        cambios["version"] = version + 1
+        try:
+            self._reescribir(dict(producto, **cambios), clave, version)
+        except ConflictoConcurrenciaError as error:
+            self._descartar_pendientes(error)
+            return
+        producto.update(cambios)
+        if indices.IndiceDifuso.campos.intersection(cambios):
+            self._indice_difuso = None
+
+    def registrar_movimiento(self, producto, delta, movimiento):
+        """Aplica una variación de cantidad a un producto y registra el movimiento.
+
+        La variación se suma en la base a la cantidad vigente, así dos
+        sesiones que descuentan del mismo lote no se pisan. Si el descuento
+        dejaría el stock negativo, guardar() lanza ConflictoConcurrenciaError.
+        """
+        clave = indices.clave(producto)
+        # La transacción toma el bloqueo de escritura de la base: desde ahí
+        # la fila leída es la vigente hasta confirmar con guardar()
+        self._iniciar_transaccion()
+        self._conexion.execute("SAVEPOINT movimiento")
+        fila = self._conexion.execute(
+            "UPDATE productos SET cantidad = cantidad + ? WHERE codigo = ? AND lote = ? RETURNING datos",
+            [delta] + list(clave)).fetchone()
+        vigente = json.loads(fila[0]) if fila else None
+        if vigente is not None:
+            vigente["cantidad"] = vigente.get("cantidad", 0) + delta
+        if vigente is None or (delta < 0 and vigente["cantidad"] < 0):
+            # Todo el lote de cambios se descarta, no solo este movimiento
+            self._descartar_pendientes(ConflictoConcurrenciaError(
+                f"Stock insuficiente de {clave[0]} lote {clave[1]}: otra sesión lo descontó antes"))
+            return
+        vigente["version"] = vigente.get("version", 0) + 1
+        self._reescribir(vigente, clave)
+        self._conexion.execute("RELEASE movimiento")
+        producto.update(vigente)
+        self._movimientos_pendientes.append(dict(movimiento, codigo=clave[0], lote=clave[1]))
+
+    def contar(self):
+        """Cantidad de productos en el inventario"""
+        return self._conexion.execute("SELECT COUNT(*) FROM productos").fetchone()[0]
+
+    def buscar(self, campos, texto):
+        """Productos en que alguno de `campos` contiene `texto` (sin distinguir mayúsculas)"""
+        if isinstance(campos, str):
+            campos = (campos,)
+        for campo in campos:
+            if campo not in almacen.CAMPOS_BUSQUEDA:
+                raise ValueError(f"Campo de búsqueda no permitido: {campo}")
+        patron = f"%{_escapar_like(texto)}%"
+        condicion = " OR ".join(f"{campo} LIKE ? ESCAPE '\\'" for campo in campos)
+        return self._consultar(condicion, [patron] * len(campos))
+
+    def buscar_aproximado(self, texto, limite=10):
+        """Hasta `limite` productos cuya descripción o marca se parece a `texto` (admite errores de tipeo)"""
+        if self._indice_difuso is None:
+            self._indice_difuso = indices.IndiceDifuso()
+            self._indice_difuso.reconstruir(self.cargar())
+        # El índice guarda copias: se releen las filas para tener cantidades al día
+        encontrados = (self.obtener(*indices.clave(producto))
+                       for producto in self._indice_difuso.buscar(texto, limite))
+        return [producto for producto in encontrados if producto is not None]
+
+    def filtrar_por_ubicacion(self, texto):
+        """Productos cuya ubicación contiene `texto`; todos si el texto está vacío"""
+        if not texto:
+            return self.cargar()
+        return self.buscar("ubicacion", texto)
+
+    def stock_critico(self):
+        """Productos con cantidad menor o igual a su stock mínimo"""
+        return self._consultar("cantidad - stock_minimo <= 0")
+
+    def contar_criticos(self):
+        """Cantidad de productos con stock crítico"""
+        return self._conexion.execute(
+            "SELECT COUNT(*) FROM productos WHERE cantidad - stock_minimo <= 0").fetchone()[0]
+
+    def agregados(self):
+        """Totales y grupos por unidad, ubicación, proveedor y estado (ver indices.IndiceAgregados)"""
+        skus, unidades = self._conexion.execute(
+            "SELECT COUNT(*), COALESCE(SUM(cantidad), 0) FROM productos").fetchone()
+        resultado = {"totales": {"skus": skus, "unidades": unidades}}
+        for dimension, defecto in indices.DIMENSIONES_AGREGADOS.items():
+            expresion = dimension if dimension in COLUMNAS else f"COALESCE(json_extract(datos, '$.{dimension}'), ?)"
+            parametros = () if dimension in COLUMNAS else (defecto,)
+            cursor = self._conexion.execute(
+                f"SELECT {expresion}, COUNT(*), SUM(cantidad) FROM productos GROUP BY 1", parametros)
+            resultado[dimension] = {str(valor): {"skus": total, "unidades": suma}
+                                    for valor, total, suma in cursor}
+        return resultado
+
+    def verificar_agregados(self):
+        """Los agregados se calculan en cada consulta: no hay diferencias posibles"""
+        return []
+
+    def instantanea_columnar(self):
+        """Inventario en columnas para análisis (ver modules.columnar); solo lectura"""
+        return columnar.InstantaneaColumnar(self.cargar())
+
+    def estado_stock(self, producto):
+        """indices.ESTADO_CRITICO, indices.ESTADO_ATENCION o None para un producto"""
+        return indices.estado_stock(producto)
+
+    def contar_por_vencer(self, fecha_limite):
+        """Cantidad de productos con vencimiento hasta `fecha_limite` (date) inclusive"""
+        return self._conexion.execute(
+            f"SELECT COUNT(*) FROM productos WHERE {_CONDICION_VENCIMIENTO}",
+            (fecha_limite.strftime("%Y-%m-%d"),)).fetchone()[0]
+
+    def por_vencer(self, fecha_limite, inicio=0, cantidad=None):
+        """Pares (fecha de vencimiento, producto) hasta `fecha_limite` (date) inclusive, por fecha.
+
+        `inicio` y `cantidad` permiten pedir solo una página del resultado.
+        """
+        orden = "fecha_vencimiento, id"
+        if cantidad is not None or inicio:
+            orden += f" LIMIT {-1 if cantidad is None else int(cantidad)} OFFSET {int(inicio)}"
+        productos_list = self._consultar(
+            _CONDICION_VENCIMIENTO, (fecha_limite.strftime("%Y-%m-%d"),), orden=orden)
+        resultado = []
+        for producto in productos_list:
+            ordinal = fechas.ordinal_campo(producto, "fecha_vencimiento")
+            if ordinal is not None:
+                resultado.append((date.fromordinal(ordinal), producto))
+        return resultado
+
+    def por_ubicacion(self, inicio=0, cantidad=None):
+        """Productos ordenados por ubicación, desde la posición `inicio` y hasta `cantidad` si se indica"""
+        orden = "ubicacion, id"
+        if cantidad is not None or inicio:
+            orden += f" LIMIT {-1 if cantidad is None else int(cantidad)} OFFSET {int(inicio)}"
+        return self._consultar(orden=orden)
+
+    def guardar(self):
+        """Confirma la transacción pendiente y sus movimientos; retorna True si había cambios.
+
+        Lanza ConflictoConcurrenciaError, sin confirmar nada, si otra sesión
+        modificó antes alguno de los productos.
+        """
+        if self._conflicto is not None:
+            error, self._conflicto = self._conflicto, None
+            self._conexion.rollback()
+            self._movimientos_pendientes = []
+            raise error
+        hubo_cambios = self._conexion.in_transaction or bool(self._movimientos_pendientes)
+        if self._conexion.in_transaction:
+            self._conexion.commit()
+        if self._movimientos_pendientes:
+            movimientos.registrar_lote(self._movimientos_pendientes)
+            self._movimientos_pendientes = []
+        return hubo_cambios
+
+    def cerrar(self):
+        """Confirma los cambios y cierra la conexión"""
+        self.guardar()
+        self._conexion.close()
+
+def migrar_desde_json(ruta_json=almacen.ARCHIVO_PRODUCTOS, ruta_db=almacen.ARCHIVO_PRODUCTOS_DB):
+    """Copia una sola vez el inventario de productos.json a la base SQLite.
+
+    Retorna la cantidad de productos migrados. No hace nada si la base ya
+    contiene productos, para no duplicarlos al ejecutarla dos veces.
+    """
+    store = SQLiteProductStore(ruta_db)
+    try:
+        if store._conexion.execute("SELECT 1 FROM productos LIMIT 1").fetchone():
+            print(f"La base {ruta_db} ya contiene productos; no se migra nuevamente")
+            return 0
+
+        origen = almacen.ProductStore(ruta_json)
+        productos_list = origen.cargar()
+        duplicados = origen._indice_clave.duplicados
+        if duplicados:
+            # Se migra la primera aparición de cada (codigo, lote)
+            print(f"⚠️  {len(duplicados)} producto(s) con código y lote repetidos no se migran:")
+            for producto in duplicados:
+                codigo, lote = indices.clave(producto)
+                print(f"   - {codigo} / {lote}")
+            ids_duplicados = {id(producto) for producto in duplicados}
+            productos_list = [p for p in productos_list if id(p) not in ids_duplicados]
+
+        store.agregar(productos_list)
+        store.guardar()
+        print(f"{len(productos_list)} producto(s) migrado(s) de {ruta_json} a {ruta_db}")
+        return len(productos_list)
+    finally:
+        store.cerrar()
+
+if __name__ == "__main__":
+    migrar_desde_json()
@@ -4,11 +4,91 @@ Registra todas las actividades del sistema
 """
 
 import os
+import re
 import json
-from datetime import datetime
+import time
+import gzip
+import zlib
+import queue
+import atexit
+import threading
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from modules import utils
+from modules import bloqueos
 
 DIR_LOGS = "logs/"
 
+# Política de vaciado del escritor de auditoría. Cada lote se entrega al
+# sistema operativo bajo el bloqueo de logs/ (varias sesiones escriben el
+# mismo log); la política decide cada cuánto se fuerza a disco con os.fsync
+# cuando USAR_FSYNC está activo:
+#   "entrada"   -> después de cada registro (o lote)
+#   "lote"      -> cada FLUSH_CADA_N registros
+#   "intervalo" -> cuando pasan FLUSH_CADA_MS milisegundos desde el último
+POLITICA_FLUSH = "entrada"
+FLUSH_CADA_N = 100
+FLUSH_CADA_MS = 1000
+USAR_FSYNC = False  # Además del flush, forzar os.fsync (más lento, más seguro)
+
+# Escritura en segundo plano: registrar_log solo encola la entrada y un hilo
+# escritor las escribe por lotes de hasta MAX_LOTE (una escritura y, según la
+# política de flush, un flush/fsync por lote). Con la cola llena (MAX_COLA):
+#   "bloquear"  -> quien registra espera a que el escritor libere espacio
+#   "descartar" -> la entrada se pierde y se cuenta en entradas_descartadas()
+# Con SEGUNDO_PLANO = False cada entrada se escribe al registrarla
+SEGUNDO_PLANO = True
+MAX_COLA = 10000
+MAX_LOTE = 1000
+POLITICA_DESBORDE = "bloquear"
+
+# Rotación y retención de logs:
+#   - el log del día se corta en una parte nueva al superar MAX_BYTES_LOG
+#   - las partes y los días con DIAS_SIN_COMPRIMIR o más de antigüedad se
+#     comprimen en segmentos .log.gz formados por bloques gzip independientes
+#     de BLOQUE_BYTES, con un índice de bloques (.bidx) para leer al azar
+#   - con RETENCION_DIAS = None (por defecto) los logs se conservan siempre;
+#     solo si se configura un número de días se eliminan los más antiguos
+MAX_BYTES_LOG = 64 * 1024 * 1024
+BLOQUE_BYTES = 64 * 1024
+DIAS_SIN_COMPRIMIR = 1
+RETENCION_DIAS = None
+
+# auditoria_YYYY-MM-DD[.N].log[.gz]
+PATRON_SEGMENTO = re.compile(r'^auditoria_(\d{4}-\d{2}-\d{2})(?:\.(\d+))?\.log(\.gz)?$')
+
+# Estado del escritor: log del día e índice lateral abiertos en modo append
+_escritor = {
+    "ruta": None,
+    "archivo": None,
+    "indice": None,
+    "offset": 0,
+    "pendientes": 0,
+    "ultimo_flush": 0.0
+}
+
+# Cola del escritor en segundo plano (se crean con la primera entrada)
+_segundo_plano = {
+    "cola": None,
+    "hilo": None,
+    "descartadas": 0
+}
+_FIN = object()
+
+# Protege _escritor: lo usan el hilo escritor y las consultas
+_lock_escritor = threading.RLock()
+
+# Bloqueo entre sesiones de los logs (se usa siempre dentro de _lock_escritor)
+_bloqueo = {"ruta": None, "bloqueo": None}
+
+# Índices laterales ya leídos en memoria, por ruta del .idx
+_cache_indices = {}
+
+# Índices de bloques de segmentos comprimidos y último bloque descomprimido
+_cache_bloques = {}
+_ultimo_bloque = {"clave": None, "datos": b""}
+
 def crear_directorio_logs():
     """Crea el directorio de logs si no existe"""
     os.makedirs(DIR_LOGS, exist_ok=True)
@@ -18,10 +98,427 @@ def obtener_archivo_log():
     fecha_actual = datetime.now().strftime("%Y-%m-%d")
     return os.path.join(DIR_LOGS, f"auditoria_{fecha_actual}.log")
 
-def registrar_log(usuario, accion, descripcion):
-    """Registra una entrada en el log de auditoría"""
+def _base_segmento(ruta):
+    """Ruta sin extensiones .log/.log.gz (auditoria_YYYY-MM-DD[.N])"""
+    if ruta.endswith(".gz"):
+        ruta = ruta[:-len(".gz")]
+    return os.path.splitext(ruta)[0]
+
+def obtener_archivo_indice(archivo_log):
+    """Obtiene la ruta del índice lateral (.idx) de un archivo de log"""
+    return _base_segmento(archivo_log) + ".idx"
+
+def obtener_archivo_bloques(archivo_log):
+    """Obtiene la ruta del índice de bloques (.bidx) de un segmento comprimido"""
+    return _base_segmento(archivo_log) + ".bidx"
+
+def _bloqueo_logs():
+    """Bloqueo entre procesos de logs/: lo toman la escritura de cada lote,
+    la reconstrucción de índices y la rotación"""
+    ruta = os.path.join(DIR_LOGS, "auditoria.lock")
+    if _bloqueo["ruta"] != ruta:
+        _bloqueo["ruta"] = ruta
+        _bloqueo["bloqueo"] = bloqueos.Bloqueo(ruta)
+    return _bloqueo["bloqueo"]
+
+def configurar_escritor(politica=None, cada_n=None, cada_ms=None, fsync=None,
+                        segundo_plano=None, max_cola=None, desborde=None):
+    """Configura la política de flush/fsync y la cola del escritor de auditoría.
+
+    Los cambios de la cola (segundo_plano, max_cola) se aplican después de
+    escribir lo que ya estaba encolado.
+    """
+    global POLITICA_FLUSH, FLUSH_CADA_N, FLUSH_CADA_MS, USAR_FSYNC
+    global SEGUNDO_PLANO, MAX_COLA, POLITICA_DESBORDE
+    
+    if politica is not None:
+        if politica not in ("entrada", "lote", "intervalo"):
+            raise ValueError(f"Política de flush desconocida: {politica}")
+        POLITICA_FLUSH = politica
+    if cada_n is not None:
+        FLUSH_CADA_N = max(1, int(cada_n))
+    if cada_ms is not None:
+        FLUSH_CADA_MS = max(0, int(cada_ms))
+    if fsync is not None:
+        USAR_FSYNC = bool(fsync)
+    if desborde is not None:
+        if desborde not in ("bloquear", "descartar"):
+            raise ValueError(f"Política de desborde desconocida: {desborde}")
+        POLITICA_DESBORDE = desborde
+    if segundo_plano is not None or max_cola is not None:
+        detener_escritor()
+        if segundo_plano is not None:
+            SEGUNDO_PLANO = bool(segundo_plano)
+        if max_cola is not None:
+            MAX_COLA = max(1, int(max_cola))
+
+def configurar_retencion(dias):
+    """Elimina en cada rotación los logs con más de `dias` días (None = conservar siempre)"""
+    global RETENCION_DIAS
+    if dias is not None and int(dias) < 1:
+        raise ValueError("La retención debe ser de al menos un día")
+    RETENCION_DIAS = None if dias is None else int(dias)
+
+def _vaciar_escritor():
+    """Hace flush (y fsync si está configurado) del archivo abierto"""
+    archivo = _escritor["archivo"]
+    if archivo is None:
+        return
+    
+    # Primero el log y después el índice: el índice nunca apunta a bytes no escritos
+    archivo.flush()
+    _escritor["indice"].flush()
+    if USAR_FSYNC:
+        os.fsync(archivo.fileno())
+        os.fsync(_escritor["indice"].fileno())
+    _escritor["pendientes"] = 0
+    _escritor["ultimo_flush"] = time.monotonic()
+
+def cerrar_log():
+    """Vacía y cierra el archivo de log abierto"""
+    with _lock_escritor:
+        if _escritor["archivo"] is None:
+            return
+        
+        _vaciar_escritor()
+        _escritor["archivo"].close()
+        _escritor["indice"].close()
+        _escritor["archivo"] = None
+        _escritor["indice"] = None
+        _escritor["ruta"] = None
+
+def _iniciar_escritor():
+    """Crea la cola y arranca el hilo escritor"""
+    cola = queue.Queue(MAX_COLA)
+    hilo = threading.Thread(target=_escribir_cola, args=(cola,), name="auditoria", daemon=True)
+    _segundo_plano["cola"] = cola
+    _segundo_plano["hilo"] = hilo
+    hilo.start()
+
+def _escribir_cola(cola):
+    """Hilo escritor: toma las entradas encoladas y las escribe por lotes"""
+    fin = False
+    while not fin:
+        lote = [cola.get()]
+        while len(lote) < MAX_LOTE:
+            try:
+                lote.append(cola.get_nowait())
+            except queue.Empty:
+                break
+        if any(entrada is _FIN for entrada in lote):
+            fin = True
+            lote = [entrada for entrada in lote if entrada is not _FIN]
+        try:
+            _escribir_lote(lote)
+        except Exception as error:
+            # El hilo sigue atendiendo: una falla de disco no detiene el sistema
+            print(f"⚠ Auditoría: no se pudieron escribir {len(lote)} entrada(s): {error}")
+        finally:
+            for _ in range(len(lote) + fin):
+                cola.task_done()
+
+def vaciar_cola():
+    """Espera a que se escriban las entradas encoladas y las vacía a disco"""
+    cola = _segundo_plano["cola"]
+    if cola is not None:
+        cola.join()
+    with _lock_escritor:
+        _vaciar_escritor()
+
+def detener_escritor():
+    """Escribe lo encolado, detiene el hilo escritor y cierra el log"""
+    cola, hilo = _segundo_plano["cola"], _segundo_plano["hilo"]
+    if hilo is not None:
+        # _FIN va detrás de lo ya encolado; se espera aunque la cola esté llena
+        cola.put(_FIN)
+        hilo.join()
+        _segundo_plano["cola"] = None
+        _segundo_plano["hilo"] = None
+    cerrar_log()
+
+def entradas_descartadas():
+    """Entradas perdidas por cola llena (política de desborde "descartar")"""
+    return _segundo_plano["descartadas"]
+
+def _reiniciar_en_hijo():
+    """Tras un fork el hijo no tiene el hilo escritor: empieza con cola y log propios"""
+    global _lock_escritor
+    _lock_escritor = threading.RLock()
+    _bloqueo["ruta"] = None
+    _bloqueo["bloqueo"] = None
+    _segundo_plano["cola"] = None
+    _segundo_plano["hilo"] = None
+    _escritor["archivo"] = None
+    _escritor["indice"] = None
+    _escritor["ruta"] = None
+
+atexit.register(detener_escritor)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reiniciar_en_hijo)
+
+def _minuto_del_dia(timestamp):
+    """Convierte 'YYYY-MM-DD HH:MM:SS' en minuto del día (0-1439)"""
+    try:
+        return int(timestamp[11:13]) * 60 + int(timestamp[14:16])
+    except (ValueError, TypeError):
+        return 0
+
+def _linea_indice(offset, longitud, entrada):
+    """Genera la línea del índice lateral para una entrada del log"""
+    usuario = str(entrada.get("usuario", "")).replace("\t", " ").replace("\n", " ")
+    accion = str(entrada.get("accion", "")).replace("\t", " ").replace("\n", " ")
+    minuto = _minuto_del_dia(entrada.get("timestamp", ""))
+    return f"{offset}\t{longitud}\t{usuario}\t{accion}\t{minuto}\n".encode('utf-8')
+
+def _fin_cubierto_por_indice(ruta_idx):
+    """Retorna el byte del log hasta donde llega la última entrada indexada"""
+    if not os.path.exists(ruta_idx):
+        return 0
+    
+    with open(ruta_idx, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        tamano = f.tell()
+        if tamano == 0:
+            return 0
+        f.seek(max(0, tamano - 4096))
+        ultima = f.read().rstrip(b'\n').rsplit(b'\n', 1)[-1]
+    
+    campos = ultima.split(b'\t')
+    try:
+        return int(campos[0]) + int(campos[1])
+    except (ValueError, IndexError):
+        return 0
+
+def _sincronizar_indice(ruta_log):
+    """Asegura que el índice lateral cubra exactamente todas las líneas completas del log"""
+    # Bajo el bloqueo de logs/: ningún escritor queda con el log escrito y su índice pendiente
+    with _lock_escritor, _bloqueo_logs().exclusivo():
+        _completar_indice(ruta_log)
+
+def _completar_indice(ruta_log):
+    """Indexa las líneas del log que aún no están en su índice lateral"""
+    ruta_idx = obtener_archivo_indice(ruta_log)
+    
+    if ruta_log.endswith(".gz"):
+        # Los segmentos comprimidos son inmutables: solo se reconstruye si falta
+        if not os.path.exists(ruta_idx):
+            with gzip.open(ruta_log, 'rb') as log:
+                _escribir_indice(log, ruta_idx, 0)
+        return
+    
+    tamano_log = os.path.getsize(ruta_log) if os.path.exists(ruta_log) else 0
+    
+    utils.reparar_linea_incompleta(ruta_idx)
+    cubierto = _fin_cubierto_por_indice(ruta_idx)
+    
+    if cubierto > tamano_log:
+        # El log fue truncado (línea cortada): el índice se reconstruye completo
+        open(ruta_idx, 'wb').close()
+        _cache_indices.pop(ruta_idx, None)
+        cubierto = 0
+    
+    if cubierto == tamano_log:
+        if not os.path.exists(ruta_idx):
+            open(ruta_idx, 'wb').close()
+        return
+    
+    # Indexar solo la cola del log que aún no tiene entrada en el índice
+    with open(ruta_log, 'rb') as log:
+        log.seek(cubierto)
+        _escribir_indice(log, ruta_idx, cubierto)
+
+def _escribir_indice(log, ruta_idx, offset):
+    """Agrega al índice lateral las líneas completas leídas de `log` desde `offset`"""
+    with open(ruta_idx, 'ab') as idx:
+        for linea in log:
+            if not linea.endswith(b'\n'):
+                break
+            try:
+                entrada = json.loads(linea)
+            except ValueError:
+                entrada = {}
+            idx.write(_linea_indice(offset, len(linea), entrada))
+            offset += len(linea)
+
+def _listar_segmentos():
+    """Lista los segmentos de log como (fecha, parte, ruta) en orden cronológico.
+    
+    Dentro de un día van primero las partes rotadas por tamaño y al final el
+    archivo activo. Si un segmento existe plano y comprimido (rotación
+    interrumpida) se usa el plano.
+    """
+    if not os.path.isdir(DIR_LOGS):
+        return []
+    
+    nombres = set(os.listdir(DIR_LOGS))
+    segmentos = []
+    for nombre in nombres:
+        coincidencia = PATRON_SEGMENTO.match(nombre)
+        if not coincidencia:
+            continue
+        if coincidencia.group(3) and nombre[:-len(".gz")] in nombres:
+            continue
+        try:
+            fecha = datetime.strptime(coincidencia.group(1), "%Y-%m-%d").date()
+        except ValueError:
+            continue
+        parte = int(coincidencia.group(2)) if coincidencia.group(2) else None
+        segmentos.append((fecha, parte, os.path.join(DIR_LOGS, nombre)))
+    
+    segmentos.sort(key=lambda s: (s[0], s[1] if s[1] is not None else float("inf")))
+    return segmentos
+
+def comprimir_segmento(ruta_log):
+    """Comprime un log plano en bloques gzip independientes con índice de bloques.
+    
+    Cada bloque termina en un salto de línea, así ninguna entrada queda
+    repartida entre dos bloques. El índice lateral (.idx) sigue siendo válido
+    porque los offsets se expresan sobre el contenido sin comprimir. Se hace
+    bajo el bloqueo de logs/, igual que las escrituras.
+    """
+    with _lock_escritor, _bloqueo_logs().exclusivo():
+        return _comprimir(ruta_log)
+
+def _comprimir(ruta_log):
+    """comprimir_segmento ya bajo el bloqueo de logs/"""
+    _sincronizar_indice(ruta_log)
+    
+    ruta_gz = ruta_log + ".gz"
+    ruta_bidx = obtener_archivo_bloques(ruta_log)
+    
+    with open(ruta_log, 'rb') as origen, \
+         open(ruta_gz + ".tmp", 'wb') as destino, \
+         open(ruta_bidx + ".tmp", 'wb') as bloques:
+        inicio = 0
+        resto = b""
+        while True:
+            datos = origen.read(BLOQUE_BYTES)
+            bloque = resto + datos
+            if datos:
+                corte = bloque.rfind(b'\n') + 1
+                if corte == 0:
+                    resto = bloque
+                    continue
+                bloque, resto = bloque[:corte], bloque[corte:]
+            elif not bloque.endswith(b'\n'):
+                # Línea final cortada: no forma parte del índice, se descarta
+                bloque = bloque[:bloque.rfind(b'\n') + 1]
+            if not bloque:
+                break
+            
+            comprimido = gzip.compress(bloque)
+            bloques.write(f"{inicio}\t{destino.tell()}\t{len(comprimido)}\n".encode('utf-8'))
+            destino.write(comprimido)
+            inicio += len(bloque)
+            if not datos:
+                break
+    
+    # Publicar primero el índice de bloques, luego los datos, y al final borrar el plano
+    os.replace(ruta_bidx + ".tmp", ruta_bidx)
+    os.replace(ruta_gz + ".tmp", ruta_gz)
+    os.remove(ruta_log)
+    _cache_bloques.pop(ruta_gz, None)
+    return ruta_gz
+
+def _eliminar_segmento(ruta):
+    """Elimina un segmento con su índice lateral y su índice de bloques"""
+    for asociado in (ruta, obtener_archivo_indice(ruta), obtener_archivo_bloques(ruta)):
+        if os.path.exists(asociado):
+            os.remove(asociado)
+    _cache_indices.pop(obtener_archivo_indice(ruta), None)
+    _cache_bloques.pop(ruta, None)
+
+def _rotar_por_tamano():
+    """Convierte el log activo en una parte numerada y la comprime.
+
+    Se llama bajo el bloqueo de logs/; las otras sesiones detectan el
+    cambio de archivo (inodo) en su próxima escritura y lo vuelven a abrir.
+    """
+    ruta = _escritor["ruta"]
+    cerrar_log()
+    
+    fecha = os.path.basename(ruta)[len("auditoria_"):-len(".log")]
+    partes = [p for f, p, r in _listar_segmentos() if str(f) == fecha and p is not None]
+    parte = max(partes, default=0) + 1
+    destino = os.path.join(DIR_LOGS, f"auditoria_{fecha}.{parte}.log")
+    
+    # Renombrar es atómico: tras una caída queda una parte plana que se comprime después
+    os.replace(ruta, destino)
+    ruta_idx = obtener_archivo_indice(ruta)
+    if os.path.exists(ruta_idx):
+        os.replace(ruta_idx, obtener_archivo_indice(destino))
+    _cache_indices.pop(ruta_idx, None)
+    
+    comprimir_segmento(destino)
+
+def rotar_logs(hoy=None):
+    """Comprime los segmentos antiguos y aplica la política de retención"""
+    hoy = hoy or datetime.now().date()
+    
+    with _lock_escritor, _bloqueo_logs().exclusivo():
+        _rotar_segmentos(hoy)
+
+def _rotar_segmentos(hoy):
+    """rotar_logs ya bajo el bloqueo de logs/"""
+    for fecha, parte, ruta in _listar_segmentos():
+        antiguedad = (hoy - fecha).days
+        
+        if RETENCION_DIAS is not None and antiguedad > RETENCION_DIAS:
+            _eliminar_segmento(ruta)
+            continue
+        
+        if ruta.endswith(".gz") or ruta == _escritor["ruta"]:
+            continue
+        
+        if parte is not None or antiguedad >= DIAS_SIN_COMPRIMIR:
+            comprimir_segmento(ruta)
+
+def _abrir_escritor(ruta):
+    """Abre (o rota al cambiar de día) el archivo de log en modo append"""
+    cerrar_log()
     crear_directorio_logs()
+    rotar_logs()
+    
+    descartados = utils.reparar_linea_incompleta(ruta)
+    _sincronizar_indice(ruta)
+    
+    _escritor["archivo"] = open(ruta, 'ab')
+    _escritor["indice"] = open(obtener_archivo_indice(ruta), 'ab')
+    _escritor["offset"] = os.path.getsize(ruta)
+    _escritor["ruta"] = ruta
+    _escritor["pendientes"] = 0
+    _escritor["ultimo_flush"] = time.monotonic()
     
+    if descartados:
+        print(f"⚠ Auditoría: se descartó una línea incompleta ({descartados} bytes) en {ruta}")
+
+def _archivo_vigente(ruta):
+    """True si el escritor tiene abierto el archivo que hoy está en `ruta`
+    (otra sesión pudo rotarlo o comprimirlo)"""
+    if _escritor["ruta"] != ruta or _escritor["archivo"] is None:
+        return False
+    try:
+        en_disco = os.stat(ruta)
+    except FileNotFoundError:
+        return False
+    abierto = os.fstat(_escritor["archivo"].fileno())
+    return (en_disco.st_dev, en_disco.st_ino) == (abierto.st_dev, abierto.st_ino)
+
+def _requiere_flush():
+    """Indica si la política configurada exige vaciar el buffer ahora"""
+    if POLITICA_FLUSH == "entrada":
+        return True
+    if POLITICA_FLUSH == "lote":
+        return _escritor["pendientes"] >= FLUSH_CADA_N
+    transcurrido_ms = (time.monotonic() - _escritor["ultimo_flush"]) * 1000
+    return transcurrido_ms >= FLUSH_CADA_MS
+
+def registrar_log(usuario, accion, descripcion):
+    """Registra una entrada en el log de auditoría.
+
+    En segundo plano solo la encola (ver SEGUNDO_PLANO); las consultas de
+    este módulo esperan a que lo encolado esté escrito.
+    """
     entrada = {
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "usuario": usuario,
@@ -29,37 +526,313 @@ def registrar_log(usuario, accion, descripcion):
         "descripcion": descripcion
     }
     
-    archivo_log = obtener_archivo_log()
+    if not SEGUNDO_PLANO:
+        _escribir_lote([entrada])
+        return
     
-    # Cargar logs existentes o crear nuevo
-    logs = []
-    if os.path.exists(archivo_log):
+    if _segundo_plano["hilo"] is None:
+        _iniciar_escritor()
+    try:
+        _segundo_plano["cola"].put(entrada, block=POLITICA_DESBORDE == "bloquear")
+    except queue.Full:
+        _segundo_plano["descartadas"] += 1
+
+def _escribir_lote(entradas):
+    """Escribe entradas en el log del día (append O(1)), una escritura por archivo.
+
+    Cada tramo se escribe bajo el bloqueo exclusivo de logs/: el offset se
+    toma del tamaño real del archivo y el log y su índice se escriben en la
+    misma sección crítica, así otras sesiones que escriben el mismo log no
+    desordenan el índice.
+    """
+    inicio = 0
+    while inicio < len(entradas):
+        with _lock_escritor, _bloqueo_logs().exclusivo():
+            archivo_log = obtener_archivo_log()
+            if not _archivo_vigente(archivo_log):
+                _abrir_escritor(archivo_log)
+            
+            # Otra sesión pudo agregar líneas al mismo log desde la última escritura
+            offset = os.fstat(_escritor["archivo"].fileno()).st_size
+            
+            # Una línea JSON por entrada; se corta el lote si alcanza el tamaño de rotación
+            lineas = []
+            lineas_indice = []
+            while inicio < len(entradas) and (not lineas or offset < MAX_BYTES_LOG):
+                entrada = entradas[inicio]
+                linea = (json.dumps(entrada, ensure_ascii=False) + '\n').encode('utf-8')
+                lineas.append(linea)
+                lineas_indice.append(_linea_indice(offset, len(linea), entrada))
+                offset += len(linea)
+                inicio += 1
+            
+            # Primero el log y después el índice, ambos antes de soltar el bloqueo
+            _escritor["archivo"].write(b"".join(lineas))
+            _escritor["archivo"].flush()
+            _escritor["indice"].write(b"".join(lineas_indice))
+            _escritor["indice"].flush()
+            _escritor["offset"] = offset
+            _escritor["pendientes"] += len(lineas)
+            
+            if _requiere_flush():
+                _vaciar_escritor()
+            
+            if _escritor["offset"] >= MAX_BYTES_LOG:
+                _rotar_por_tamano()
+
+def _cargar_indice(ruta_log):
+    """Carga (incrementalmente) el índice lateral de un log en memoria"""
+    ruta_idx = obtener_archivo_indice(ruta_log)
+    indice = _cache_indices.get(ruta_idx)
+    if indice is None:
+        indice = {
+            "leido": 0,
+            "offsets": [],
+            "longitudes": [],
+            "minutos": [],
+            # False si algún minuto es menor que el anterior (ver _posiciones_coincidentes)
+            "ordenado": True,
+            "por_usuario": {},
+            "por_accion": {}
+        }
+        _cache_indices[ruta_idx] = indice
+    
+    if not os.path.exists(ruta_idx):
+        return indice
+    
+    with open(ruta_idx, 'rb') as f:
+        f.seek(indice["leido"])
+        for linea in f:
+            if not linea.endswith(b'\n'):
+                break
+            indice["leido"] += len(linea)
+            campos = linea.decode('utf-8', errors='replace').rstrip('\n').split('\t')
+            if len(campos) != 5:
+                continue
+            try:
+                offset, longitud, minuto = int(campos[0]), int(campos[1]), int(campos[4])
+            except ValueError:
+                continue
+            
+            if indice["minutos"] and minuto < indice["minutos"][-1]:
+                indice["ordenado"] = False
+            posicion = len(indice["offsets"])
+            indice["offsets"].append(offset)
+            indice["longitudes"].append(longitud)
+            indice["minutos"].append(minuto)
+            indice["por_usuario"].setdefault(campos[2], []).append(posicion)
+            indice["por_accion"].setdefault(campos[3], []).append(posicion)
+    
+    return indice
+
+def _parsear_limite(valor, fin=False):
+    """Convierte un límite de fecha (str o datetime) en datetime; None si está vacío"""
+    if not valor:
+        return None
+    if isinstance(valor, datetime):
+        return valor
+    
+    valor = valor.strip()
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
         try:
-            with open(archivo_log, 'r', encoding='utf-8') as f:
-                # Leer todas las líneas como JSON
-                for linea in f:
-                    linea = linea.strip()
-                    if linea:
-                        logs.append(json.loads(linea))
-        except:
-            logs = []
+            fecha = datetime.strptime(valor, fmt)
+        except ValueError:
+            continue
+        if fmt == "%Y-%m-%d" and fin:
+            fecha += timedelta(days=1, minutes=-1)
+        return fecha
+    raise ValueError(f"Fecha inválida: {valor}")
+
+def _cargar_bloques(ruta_gz):
+    """Carga el índice de bloques de un segmento comprimido: (inicios, offsets, longitudes)"""
+    bloques = _cache_bloques.get(ruta_gz)
+    if bloques is not None:
+        return bloques
+    
+    inicios, offsets, longitudes = [], [], []
+    with open(obtener_archivo_bloques(ruta_gz), 'r', encoding='utf-8') as f:
+        for linea in f:
+            campos = linea.split('\t')
+            if len(campos) == 3:
+                inicios.append(int(campos[0]))
+                offsets.append(int(campos[1]))
+                longitudes.append(int(campos[2]))
+    
+    bloques = (inicios, offsets, longitudes)
+    _cache_bloques[ruta_gz] = bloques
+    return bloques
+
+def _leer_lineas(ruta_log, indice, posiciones):
+    """Lee del segmento solo las líneas de las posiciones indicadas"""
+    lineas = []
+    
+    if not ruta_log.endswith(".gz"):
+        with open(ruta_log, 'rb') as f:
+            for posicion in posiciones:
+                f.seek(indice["offsets"][posicion])
+                lineas.append(f.read(indice["longitudes"][posicion]))
+        return lineas
+    
+    # Segmento comprimido: descomprimir únicamente los bloques que contienen las líneas
+    inicios, offsets, longitudes = _cargar_bloques(ruta_log)
+    with open(ruta_log, 'rb') as f:
+        for posicion in posiciones:
+            offset = indice["offsets"][posicion]
+            bloque = bisect_left(inicios, offset + 1) - 1
+            clave = (ruta_log, bloque)
+            if _ultimo_bloque["clave"] != clave:
+                f.seek(offsets[bloque])
+                _ultimo_bloque["datos"] = zlib.decompress(f.read(longitudes[bloque]), 16 + zlib.MAX_WBITS)
+                _ultimo_bloque["clave"] = clave
+            relativo = offset - inicios[bloque]
+            lineas.append(_ultimo_bloque["datos"][relativo:relativo + indice["longitudes"][posicion]])
+    return lineas
+
+def _posiciones_coincidentes(indice, usuario, accion, minuto_desde, minuto_hasta):
+    """Posiciones (ordenadas) del índice que cumplen los filtros, sin leer el log"""
+    minutos = indice["minutos"]
+    if indice["ordenado"]:
+        # Los minutos crecen con el orden de escritura: el rango temporal es un bisect
+        inicio = bisect_left(minutos, minuto_desde)
+        fin = bisect_left(minutos, minuto_hasta + 1)
+    else:
+        # Entradas fuera de orden (varias sesiones, o lotes escritos tarde por
+        # el hilo escritor): el rango se filtra minuto a minuto más abajo
+        inicio, fin = 0, len(minutos)
+    
+    listas = []
+    if usuario:
+        listas.append(indice["por_usuario"].get(usuario, []))
+    if accion:
+        listas.append(indice["por_accion"].get(accion, []))
+    
+    if not listas:
+        base = range(inicio, fin)
+    else:
+        listas.sort(key=len)
+        base = listas[0]
+        base = base[bisect_left(base, inicio):bisect_left(base, fin)]
+        for otra in listas[1:]:
+            conjunto = set(otra)
+            base = [p for p in base if p in conjunto]
+    
+    if not indice["ordenado"] and (minuto_desde > 0 or minuto_hasta < 1439):
+        base = [p for p in base if minuto_desde <= minutos[p] <= minuto_hasta]
+    return base
+
+def consultar_logs(usuario=None, accion=None, desde=None, hasta=None, pagina=1, por_pagina=20):
+    """Consulta los logs de varios días usando el índice lateral.
+    
+    Retorna (entradas_de_la_pagina, total_coincidencias). Los límites de fecha
+    tienen precisión de minuto y solo se leen del log las líneas de la página.
+    """
+    desde = _parsear_limite(desde)
+    hasta = _parsear_limite(hasta, fin=True)
+    
+    crear_directorio_logs()
+    vaciar_cola()
+    
+    # Selección de segmentos por fecha en el nombre (orden cronológico)
+    archivos = []
+    for fecha, parte, ruta_log in _listar_segmentos():
+        if (desde and fecha < desde.date()) or (hasta and fecha > hasta.date()):
+            continue
+        archivos.append((fecha, ruta_log))
+    
+    coincidencias = []
+    total = 0
+    for fecha, ruta_log in archivos:
+        _sincronizar_indice(ruta_log)
+        indice = _cargar_indice(ruta_log)
+        
+        minuto_desde = desde.hour * 60 + desde.minute if desde and fecha == desde.date() else 0
+        minuto_hasta = hasta.hour * 60 + hasta.minute if hasta and fecha == hasta.date() else 1439
+        
+        posiciones = _posiciones_coincidentes(indice, usuario, accion, minuto_desde, minuto_hasta)
+        if posiciones:
+            coincidencias.append((ruta_log, indice, posiciones))
+            total += len(posiciones)
+    
+    # Leer únicamente las líneas de la página solicitada
+    salto = max(0, (pagina - 1) * por_pagina)
+    restantes = por_pagina
+    entradas = []
+    for ruta_log, indice, posiciones in coincidencias:
+        if restantes <= 0:
+            break
+        if salto >= len(posiciones):
+            salto -= len(posiciones)
+            continue
+        
+        seleccion = posiciones[salto:salto + restantes]
+        salto = 0
+        for linea in _leer_lineas(ruta_log, indice, seleccion):
+            try:
+                entradas.append(json.loads(linea))
+            except ValueError:
+                continue
+        restantes -= len(seleccion)
+    
+    return entradas, total
+
+def _imprimir_entradas(entradas):
+    """Imprime entradas de log en formato de tabla"""
+    print("-" * 100)
+    print(f"{'Fecha/Hora':20} {'Usuario':15} {'Acción':20} {'Descripción':40}")
+    print("-" * 100)
+    for log in entradas:
+        print(f"{log.get('timestamp', '')[:20]:20} {log.get('usuario', '')[:15]:15} "
+              f"{log.get('accion', '')[:20]:20} {log.get('descripcion', '')[:40]:40}")
+
+def buscar_logs():
+    """Búsqueda paginada de logs por usuario, acción y rango de fechas"""
+    print("\n--- BÚSQUEDA EN LOGS DE AUDITORÍA ---")
     
-    # Agregar nueva entrada
-    logs.append(entrada)
+    usuario = input("Usuario (vacío = todos): ").strip() or None
+    accion = input("Acción, ej. PROCESAR_PEDIDO (vacío = todas): ").strip().upper() or None
+    desde = input("Desde (YYYY-MM-DD [HH:MM], vacío = sin límite): ").strip()
+    hasta = input("Hasta (YYYY-MM-DD [HH:MM], vacío = sin límite): ").strip()
+    por_pagina = 20
+    pagina = 1
     
-    # Guardar en formato JSON línea por línea
-    with open(archivo_log, 'w', encoding='utf-8') as f:
-        for log in logs:
-            f.write(json.dumps(log, ensure_ascii=False) + '\n')
+    while True:
+        try:
+            entradas, total = consultar_logs(usuario, accion, desde, hasta, pagina, por_pagina)
+        except ValueError as e:
+            print(e)
+            return
+        
+        if total == 0:
+            print("No se encontraron registros con esos filtros")
+            return
+        
+        total_paginas = (total + por_pagina - 1) // por_pagina
+        print(f"\nPágina {pagina}/{total_paginas} - {total} registro(s)")
+        _imprimir_entradas(entradas)
+        
+        opcion = input("\n[S]iguiente, [A]nterior, número de página o Enter para salir: ").strip().upper()
+        if opcion == "S" and pagina < total_paginas:
+            pagina += 1
+        elif opcion == "A" and pagina > 1:
+            pagina -= 1
+        elif opcion.isdigit() and 1 <= int(opcion) <= total_paginas:
+            pagina = int(opcion)
+        elif not opcion:
+            return
 
 def mostrar_logs():
     """Muestra los logs de auditoría (solo administrador)"""
     print("\n--- LOGS DE AUDITORÍA ---")
     
+    if input("1. Ver archivo de un día, 2. Buscar por usuario/acción/fechas: ").strip() == "2":
+        buscar_logs()
+        return
+    
     crear_directorio_logs()
+    vaciar_cola()
     
-    # Listar archivos de log disponibles
-    archivos_log = sorted([f for f in os.listdir(DIR_LOGS) if f.endswith('.log')])
+    # Listar archivos de log disponibles (planos y comprimidos)
+    archivos_log = [os.path.basename(ruta) for fecha, parte, ruta in _listar_segmentos()]
     
     if not archivos_log:
         print("No hay archivos de log disponibles")
@@ -91,13 +864,19 @@ def mostrar_logs():
         print("-" * 100)
         
         try:
-            with open(archivo_log, 'r', encoding='utf-8') as f:
+            abrir = gzip.open if archivo_log.endswith(".gz") else open
+            with abrir(archivo_log, 'rt', encoding='utf-8') as f:
                 for linea in f:
                     linea = linea.strip()
-                    if linea:
+                    if not linea:
+                        continue
+                    try:
                         log = json.loads(linea)
-                        print(f"{log.get('timestamp', '')[:20]:20} {log.get('usuario', '')[:15]:15} "
-                              f"{log.get('accion', '')[:20]:20} {log.get('descripcion', '')[:40]:40}")
+                    except json.JSONDecodeError:
+                        # Línea cortada por una escritura interrumpida
+                        continue
+                    print(f"{log.get('timestamp', '')[:20]:20} {log.get('usuario', '')[:15]:15} "
+                          f"{log.get('accion', '')[:20]:20} {log.get('descripcion', '')[:40]:40}")
         except:
             print("Error al leer el archivo de log")
     else:
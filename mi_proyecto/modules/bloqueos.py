@@ -0,0 +1,67 @@
+"""
+Módulo de bloqueos entre sesiones
+Coordina a varias terminales que leen y escriben los mismos archivos de data/
+"""
+
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # fcntl solo existe en Unix: sin él cada sesión trabaja sin bloqueos
+    fcntl = None
+
+class ConflictoConcurrenciaError(RuntimeError):
+    """Otra sesión confirmó cambios sobre el mismo registro; los cambios locales se descartan"""
+
+def ruta_bloqueo(ruta):
+    """Archivo de bloqueo asociado a un archivo de datos (data/x.json -> data/x.lock)"""
+    return os.path.splitext(ruta)[0] + ".lock"
+
+class Bloqueo:
+    """Bloqueo de archivo entre procesos (flock) para lectores y escritores.
+
+    compartido() admite varios lectores a la vez y exclusivo() a un solo
+    escritor. Se pueden anidar dentro del mismo proceso: un exclusivo
+    dentro de un compartido lo convierte mientras dura y al salir vuelve a
+    compartido. Los escritores deben tenerlo el menor tiempo posible.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._archivo = None
+        # Modo vigente por cada nivel de anidamiento (True = exclusivo)
+        self._niveles = []
+
+    def compartido(self):
+        """Contexto con bloqueo de lectura"""
+        return self._tomar(False)
+
+    def exclusivo(self):
+        """Contexto con bloqueo de escritura"""
+        return self._tomar(True)
+
+    @contextmanager
+    def _tomar(self, exclusivo):
+        anterior = self._niveles[-1] if self._niveles else None
+        modo = exclusivo or bool(anterior)
+        if anterior is None:
+            os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+            self._archivo = open(self.ruta, 'ab')
+        if modo != anterior:
+            self._flock(modo)
+        self._niveles.append(modo)
+        try:
+            yield
+        finally:
+            self._niveles.pop()
+            if not self._niveles:
+                # Cerrar el archivo libera el bloqueo
+                self._archivo.close()
+                self._archivo = None
+            elif self._niveles[-1] != modo:
+                self._flock(self._niveles[-1])
+
+    def _flock(self, exclusivo):
+        if fcntl is not None:
+            fcntl.flock(self._archivo.fileno(), fcntl.LOCK_EX if exclusivo else fcntl.LOCK_SH)
@@ -0,0 +1,222 @@
+"""
+Módulo cliente del servicio de inventario
+Conecta una sesión con el servicio local (modules.servicio) en lugar de leer data/
+"""
+
+import json
+import os
+import socket
+from datetime import date
+
+from modules import indices
+from modules import modelo
+from modules.bloqueos import ConflictoConcurrenciaError
+
+# Socket Unix del servicio (también se puede indicar con main.py --cliente <ruta>)
+RUTA_SOCKET = os.environ.get("ABP3_SOCKET", "data/inventario.sock")
+
+# Productos por pedido al recorrer el inventario completo
+PRODUCTOS_POR_BLOQUE = 1000
+
+# Errores que el servicio retorna por nombre y se vuelven a lanzar en el cliente
+ERRORES = {
+    "ConflictoConcurrenciaError": ConflictoConcurrenciaError,
+    "ClaveDuplicadaError": indices.ClaveDuplicadaError,
+    "ValueError": ValueError,
+}
+
+class ErrorServicio(RuntimeError):
+    """Error del servicio sin equivalente local, o conexión perdida"""
+
+_conexion = None
+
+class Conexion:
+    """Conexión al servicio: una petición JSON por línea y una respuesta por línea"""
+
+    def __init__(self, ruta=RUTA_SOCKET):
+        self.ruta = ruta
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(ruta)
+        self._lector = self._socket.makefile('rb')
+
+    def llamar(self, operacion, *argumentos):
+        """Ejecuta `operacion` en el servicio y retorna su resultado"""
+        peticion = json.dumps({"op": operacion, "args": argumentos}, ensure_ascii=False,
+                              default=modelo.serializar)
+        self._socket.sendall(peticion.encode('utf-8') + b"\n")
+        linea = self._lector.readline()
+        if not linea:
+            raise ErrorServicio("El servicio de inventario cerró la conexión")
+        respuesta = json.loads(linea)
+        if respuesta["ok"]:
+            return respuesta["resultado"]
+        raise ERRORES.get(respuesta["error"], ErrorServicio)(respuesta["mensaje"])
+
+    def cerrar(self):
+        self._lector.close()
+        self._socket.close()
+
+def conectar(ruta=RUTA_SOCKET):
+    """Activa el modo cliente: productos y usuarios se piden al servicio en `ruta`.
+
+    Lanza OSError si el servicio no está escuchando.
+    """
+    global _conexion
+    _conexion = Conexion(ruta)
+    return _conexion
+
+def conectado():
+    """True si la sesión trabaja contra el servicio"""
+    return _conexion is not None
+
+def llamar(operacion, *argumentos):
+    """Ejecuta una operación en el servicio conectado"""
+    return _conexion.llamar(operacion, *argumentos)
+
+def _productos(datos):
+    return [modelo.Producto(producto) for producto in datos]
+
+def _producto(datos):
+    return None if datos is None else modelo.Producto(datos)
+
+class StoreRemoto:
+    """Almacén con la interfaz de almacen.ProductStore que delega en el servicio.
+
+    Las lecturas se responden desde el inventario en memoria del servicio.
+    Los cambios se aplican a las copias locales y se envían juntos al
+    guardar(); el servicio los valida contra las versiones vigentes (como
+    ProductStore.guardar) y los confirma en su próxima escritura.
+    """
+
+    def __init__(self):
+        self._pendientes = []
+
+    def cargar(self):
+        """Lista completa de productos (copias)"""
+        return list(self.recorrer())
+
+    def en_memoria(self):
+        """El servicio mantiene el inventario en memoria: siempre True"""
+        return True
+
+    def recorrer(self):
+        """Genera los productos pidiéndolos por bloques"""
+        inicio = 0
+        while True:
+            bloque = llamar("pagina", inicio, PRODUCTOS_POR_BLOQUE)
+            yield from _productos(bloque)
+            if len(bloque) < PRODUCTOS_POR_BLOQUE:
+                return
+            inicio += len(bloque)
+
+    def obtener(self, codigo, lote):
+        """Producto con la clave (codigo, lote) o None"""
+        return _producto(llamar("obtener", codigo, lote))
+
+    def lotes_de(self, codigo):
+        """Lotes (productos) registrados con un código"""
+        return _productos(llamar("lotes_de", codigo))
+
+    def agregar(self, nuevos):
+        """Agrega productos al inventario.
+
+        Lanza ClaveDuplicadaError (sin agregar ninguno) si algún (codigo, lote)
+        ya existe o se repite dentro de `nuevos`.
+        """
+        nuevos = [modelo.como_producto(producto) for producto in nuevos]
+        claves = [indices.clave(producto) for producto in nuevos]
+        if len(set(claves)) < len(claves) or llamar("existe_alguno", claves):
+            raise indices.ClaveDuplicadaError("Ya existe un producto con ese código y lote")
+        self._pendientes.extend({"op": "alta", "producto": producto} for producto in nuevos)
+
+    def actualizar(self, producto, cambios):
+        """Modifica campos de un producto del inventario"""
+        version = producto.get("version", 0)
+        self._pendientes.append({"op": "campos", "clave": list(indices.clave(producto)),
+                                 "campos": dict(cambios), "version": version})
+        producto.update(cambios)
+        producto["version"] = version + 1
+
+    def registrar_movimiento(self, producto, delta, movimiento):
+        """Aplica una variación de cantidad a un producto y registra el movimiento"""
+        version = producto.get("version", 0)
+        self._pendientes.append({"op": "delta", "clave": list(indices.clave(producto)), "delta": delta,
+                                 "movimiento": movimiento, "version": version})
+        producto["cantidad"] = producto.get("cantidad", 0) + delta
+        producto["version"] = version + 1
+
+    def guardar(self):
+        """Envía los cambios pendientes al servicio; retorna True si había cambios.
+
+        Lanza ConflictoConcurrenciaError si otra sesión modificó antes los
+        mismos productos; los cambios pendientes se descartan igual.
+        """
+        if not self._pendientes:
+            return False
+        pendientes, self._pendientes = self._pendientes, []
+        llamar("confirmar", pendientes)
+        return True
+
+    def contar(self):
+        """Cantidad de productos en el inventario"""
+        return llamar("contar")
+
+    def buscar(self, campos, texto):
+        """Productos en que alguno de `campos` contiene `texto`"""
+        return _productos(llamar("buscar", [campos] if isinstance(campos, str) else list(campos), texto))
+
+    def buscar_aproximado(self, texto, limite=10):
+        """Hasta `limite` productos cuya descripción o marca se parece a `texto`"""
+        return _productos(llamar("buscar_aproximado", texto, limite))
+
+    def filtrar_por_ubicacion(self, texto):
+        """Productos cuya ubicación contiene `texto`; todos si el texto está vacío"""
+        return _productos(llamar("filtrar_por_ubicacion", texto))
+
+    def stock_critico(self):
+        """Productos con cantidad menor o igual a su stock mínimo"""
+        return _productos(llamar("stock_critico"))
+
+    def contar_criticos(self):
+        """Cantidad de productos con stock crítico"""
+        return llamar("contar_criticos")
+
+    def agregados(self):
+        """Totales y grupos por unidad, ubicación, proveedor y estado"""
+        return llamar("agregados")
+
+    def instantanea_columnar(self):
+        """Análisis columnar calculado en el servicio (mismos métodos que InstantaneaColumnar)"""
+        return InstantaneaRemota()
+
+    def estado_stock(self, producto):
+        """indices.ESTADO_CRITICO, indices.ESTADO_ATENCION o None para un producto"""
+        return indices.estado_stock(producto)
+
+    def contar_por_vencer(self, fecha_limite):
+        """Cantidad de productos con vencimiento hasta `fecha_limite` (date) inclusive"""
+        return llamar("contar_por_vencer", fecha_limite.isoformat())
+
+    def por_vencer(self, fecha_limite, inicio=0, cantidad=None):
+        """Pares (fecha de vencimiento, producto) hasta `fecha_limite` (date) inclusive, por fecha"""
+        return [(date.fromisoformat(fecha), modelo.Producto(producto)) for fecha, producto
+                in llamar("por_vencer", fecha_limite.isoformat(), inicio, cantidad)]
+
+    def por_ubicacion(self, inicio=0, cantidad=None):
+        """Productos ordenados por ubicación, desde la posición `inicio` y hasta `cantidad` si se indica"""
+        return _productos(llamar("por_ubicacion", inicio, cantidad))
+
+class InstantaneaRemota:
+    """Análisis de la instantánea columnar del servicio, sin traer las columnas"""
+
+    def totales_por(self, campo):
+        return llamar("columnar", "totales_por", campo)
+
+    def totales_por_prefijo(self, campo="ubicacion", separador="-"):
+        return llamar("columnar", "totales_por_prefijo", campo, separador)
+
+    def contar_criticos(self):
+        return llamar("columnar", "contar_criticos")
+
+    def histograma_vencimientos(self, hoy, ancho_dias=30, tramos=12):
+        return llamar("columnar", "histograma_vencimientos", hoy, ancho_dias, tramos)
@@ -0,0 +1,156 @@
+"""
+Módulo de instantánea columnar del inventario
+Columnas compactas para los análisis de reportes; usa NumPy si está instalado
+"""
+
+from array import array
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin él se usan arrays de la biblioteca estándar
+    np = None
+
+from modules import fechas
+from modules.indices import DIMENSIONES_AGREGADOS
+
+# Columnas categóricas codificadas por diccionario (valor -> código entero)
+CAMPOS_CATEGORICOS = ("unidad", "ubicacion", "proveedor")
+
+# Ordinal que se guarda para los productos sin fecha de vencimiento reconocible
+SIN_FECHA = -1
+
+class InstantaneaColumnar:
+    """Inventario en columnas: cantidades, mínimos, ordinales de vencimiento y
+    códigos de las columnas categóricas (`categorias[campo][codigo]` es el valor).
+
+    Con NumPy las columnas son ndarrays y los cálculos se vectorizan; sin
+    NumPy son array.array y los cálculos recorren las columnas en Python.
+    """
+
+    def __init__(self, productos, usar_numpy=True):
+        self.usa_numpy = usar_numpy and np is not None
+        cantidades = array('d')
+        minimos = array('d')
+        vencimientos = array('q')
+        self.categorias = {campo: [] for campo in CAMPOS_CATEGORICOS}
+        codigos = {campo: array('l') for campo in CAMPOS_CATEGORICOS}
+        posiciones = {campo: {} for campo in CAMPOS_CATEGORICOS}
+
+        for producto in productos:
+            cantidades.append(producto.get("cantidad", 0))
+            minimos.append(producto.get("stock_minimo", 0))
+            ordinal = fechas.ordinal_campo(producto, "fecha_vencimiento")
+            vencimientos.append(SIN_FECHA if ordinal is None else ordinal)
+            for campo in CAMPOS_CATEGORICOS:
+                valor = str(producto.get(campo, DIMENSIONES_AGREGADOS[campo]))
+                codigo = posiciones[campo].get(valor)
+                if codigo is None:
+                    codigo = posiciones[campo][valor] = len(self.categorias[campo])
+                    self.categorias[campo].append(valor)
+                codigos[campo].append(codigo)
+
+        if self.usa_numpy:
+            # array.array expone su buffer: NumPy toma el tipo sin convertir valor por valor
+            self.cantidades = np.asarray(cantidades)
+            self.minimos = np.asarray(minimos)
+            self.vencimientos = np.asarray(vencimientos)
+            self.codigos = {campo: np.asarray(columna) for campo, columna in codigos.items()}
+        else:
+            self.cantidades = cantidades
+            self.minimos = minimos
+            self.vencimientos = vencimientos
+            self.codigos = codigos
+
+    def __len__(self):
+        return len(self.cantidades)
+
+    def _sumar_por_codigo(self, codigos, grupos):
+        """Suma de cantidades por código de grupo (lista de largo `grupos`)"""
+        if self.usa_numpy:
+            return np.bincount(codigos, weights=self.cantidades, minlength=grupos).tolist()
+        sumas = [0.0] * grupos
+        for codigo, cantidad in zip(codigos, self.cantidades):
+            sumas[codigo] += cantidad
+        return sumas
+
+    def totales_por(self, campo):
+        """{valor: unidades} para una columna categórica"""
+        categorias = self.categorias[campo]
+        return dict(zip(categorias, self._sumar_por_codigo(self.codigos[campo], len(categorias))))
+
+    def totales_por_prefijo(self, campo="ubicacion", separador="-"):
+        """{prefijo: unidades} agrupando los valores por el texto anterior a `separador`"""
+        prefijos = []
+        posiciones = {}
+        mapa = []
+        for valor in self.categorias[campo]:
+            prefijo = valor.split(separador, 1)[0]
+            if prefijo not in posiciones:
+                posiciones[prefijo] = len(prefijos)
+                prefijos.append(prefijo)
+            mapa.append(posiciones[prefijo])
+
+        if self.usa_numpy:
+            codigos = np.asarray(mapa, dtype=np.int64)[self.codigos[campo]] if mapa else self.codigos[campo]
+        else:
+            codigos = [mapa[codigo] for codigo in self.codigos[campo]]
+        return dict(zip(prefijos, self._sumar_por_codigo(codigos, len(prefijos))))
+
+    def contar_criticos(self):
+        """Cantidad de lotes con cantidad menor o igual al stock mínimo"""
+        if self.usa_numpy:
+            return int(np.count_nonzero(self.cantidades <= self.minimos))
+        return sum(1 for cantidad, minimo in zip(self.cantidades, self.minimos) if cantidad <= minimo)
+
+    def histograma_vencimientos(self, hoy, ancho_dias=30, tramos=12):
+        """Lotes por tramo de vencimiento contado desde `hoy` (ordinal).
+
+        Retorna tramos + 2 conteos: [vencidos, tramo 1, ..., tramo N, después].
+        El tramo k cubre los días [(k-1)*ancho_dias, k*ancho_dias) desde hoy.
+        Los lotes sin fecha no se cuentan.
+        """
+        if self.usa_numpy:
+            dias = self.vencimientos[self.vencimientos != SIN_FECHA] - hoy
+            tramo = np.where(dias < 0, 0, np.minimum(dias // ancho_dias + 1, tramos + 1))
+            return np.bincount(tramo, minlength=tramos + 2).tolist()
+        # Hay pocas fechas distintas: se cuentan en C y se reparten por tramo
+        conteos = [0] * (tramos + 2)
+        for ordinal, lotes in Counter(self.vencimientos).items():
+            if ordinal == SIN_FECHA:
+                continue
+            dias = ordinal - hoy
+            conteos[0 if dias < 0 else min(dias // ancho_dias + 1, tramos + 1)] += lotes
+        return conteos
+
+class IndiceColumnar:
+    """Mantiene una InstantaneaColumnar del inventario para el almacén.
+
+    La instantánea se arma en el primer uso y se descarta ante cualquier
+    cambio en sus columnas; se vuelve a armar en el siguiente análisis.
+    """
+
+    campos = frozenset(("cantidad", "stock_minimo", "fecha_vencimiento", "fecha_vencimiento_ordinal")
+                       + CAMPOS_CATEGORICOS)
+
+    def __init__(self):
+        self.reconstruir([])
+
+    def reconstruir(self, productos):
+        """Descarta la instantánea; se armará sobre `productos` en el próximo uso"""
+        self._productos = productos
+        self._instantanea = None
+
+    def agregar(self, producto):
+        """Invalida la instantánea"""
+        self._instantanea = None
+
+    def quitar(self, producto):
+        """Invalida la instantánea"""
+        self._instantanea = None
+
+    def instantanea(self):
+        """InstantaneaColumnar vigente del inventario"""
+        if self._instantanea is None:
+            self._instantanea = InstantaneaColumnar(self._productos)
+        return self._instantanea
@@ -0,0 +1,74 @@
+"""
+Módulo de fechas
+Normaliza las fechas de los productos a ISO (YYYY-MM-DD) más un ordinal de día
+"""
+
+from datetime import date, datetime
+from functools import lru_cache
+
+# Formatos aceptados al ingresar o migrar fechas, en orden de preferencia
+FORMATOS_FECHA = ("%Y-%m-%d", "%d-%m-%y", "%d/%m/%y", "%d-%m-%Y", "%d/%m/%Y")
+
+# Campos de fecha del producto; cada uno se acompaña de `<campo>_ordinal`
+# (date.toordinal) para comparar fechas como enteros
+CAMPOS_FECHA = ("fecha_elaboracion", "fecha_vencimiento")
+
+# Tamaño de la caché de textos de fecha ya interpretados
+MAX_CACHE_FECHAS = 4096
+
+def ordinal_iso(texto):
+    """Ordinal de una fecha 'YYYY-MM-DD'; None si el texto no tiene esa forma"""
+    if not (isinstance(texto, str) and len(texto) == 10 and texto[4] == "-" and texto[7] == "-"
+            and texto[:4].isdigit() and texto[5:7].isdigit() and texto[8:].isdigit()):
+        return None
+    try:
+        return date(int(texto[:4]), int(texto[5:7]), int(texto[8:])).toordinal()
+    except ValueError:
+        return None
+
+@lru_cache(maxsize=MAX_CACHE_FECHAS)
+def ordinal_fecha(texto):
+    """Ordinal de una fecha en cualquiera de FORMATOS_FECHA; None si no se reconoce"""
+    ordinal = ordinal_iso(texto)
+    if ordinal is not None or not isinstance(texto, str):
+        return ordinal
+    texto = texto.strip()
+    for formato in FORMATOS_FECHA[1:]:
+        try:
+            return datetime.strptime(texto, formato).toordinal()
+        except ValueError:
+            pass
+    return None
+
+def normalizar_fecha(texto):
+    """Fecha en formato ISO; None si el texto no se reconoce como fecha"""
+    ordinal = ordinal_fecha(texto)
+    return None if ordinal is None else date.fromordinal(ordinal).isoformat()
+
+def ordinal_campo(producto, campo):
+    """Ordinal de un campo de fecha del producto, usando el guardado si existe"""
+    ordinal = producto.get(campo + "_ordinal")
+    if ordinal is None:
+        ordinal = ordinal_fecha(producto.get(campo))
+    return ordinal
+
+def normalizar_producto(datos):
+    """Cambios que dejan en ISO y con ordinal los campos de fecha presentes en `datos`.
+
+    `datos` puede ser un producto completo o un dict de cambios. Las fechas
+    que no se reconocen se dejan tal cual, con ordinal None.
+    """
+    cambios = {}
+    for campo in CAMPOS_FECHA:
+        if campo not in datos:
+            continue
+        texto = datos[campo]
+        ordinal = ordinal_fecha(texto) if texto else None
+        if ordinal is not None:
+            iso = date.fromordinal(ordinal).isoformat()
+            if texto != iso:
+                cambios[campo] = iso
+        campo_ordinal = campo + "_ordinal"
+        if campo_ordinal not in datos or datos[campo_ordinal] != ordinal:
+            cambios[campo_ordinal] = ordinal
+    return cambios
@@ -0,0 +1,658 @@
+"""
+Módulo de índices en memoria del inventario
+Estructuras que el almacén mantiene al día en cada alta o modificación
+
+Cada índice implementa:
+    campos              -> conjunto de campos del producto de los que depende
+    reconstruir(lista)  -> lo construye desde cero
+    agregar(producto)   -> incorpora un producto (o su nueva versión)
+    quitar(producto)    -> retira un producto (o su versión anterior)
+El almacén llama quitar/agregar alrededor de cada cambio, solo en los
+índices cuyos campos se ven afectados.
+"""
+
+import re
+import math
+import heapq
+import unicodedata
+from bisect import bisect_left, bisect_right
+
+from modules import fechas
+
+# Un producto está "en atención" si su cantidad no supera FACTOR_ATENCION
+# veces su stock mínimo (y "crítico" si no supera el stock mínimo)
+FACTOR_ATENCION = 1.5
+
+ESTADO_CRITICO = "critico"
+ESTADO_ATENCION = "atencion"
+
+class ClaveDuplicadaError(ValueError):
+    """Se intentó registrar un (codigo, lote) que ya existe en el inventario"""
+
+def normalizar_texto(texto):
+    """Texto en minúsculas y sin tildes, para comparar búsquedas"""
+    texto = str(texto).lower()
+    if texto.isascii():
+        return texto
+    return "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+
+def estado_stock(producto):
+    """ESTADO_CRITICO, ESTADO_ATENCION o None según cantidad y stock mínimo"""
+    cantidad = producto.get("cantidad", 0)
+    stock_minimo = producto.get("stock_minimo", 0)
+    if cantidad <= stock_minimo:
+        return ESTADO_CRITICO
+    if cantidad <= stock_minimo * FACTOR_ATENCION:
+        return ESTADO_ATENCION
+    return None
+
+def clave(producto):
+    """Clave primaria (codigo, lote) de un producto"""
+    return (str(producto.get("codigo", "")), str(producto.get("lote", "")))
+
+class IndiceClave:
+    """Índice primario (codigo, lote) -> producto y secundario codigo -> lotes"""
+
+    campos = frozenset(("codigo", "lote"))
+
+    def __init__(self):
+        self.por_clave = {}
+        self.por_codigo = {}
+        self.duplicados = []
+
+    def reconstruir(self, productos):
+        """Construye el índice; los duplicados heredados quedan en `duplicados`"""
+        self.por_clave = {}
+        self.por_codigo = {}
+        self.duplicados = []
+        for producto in productos:
+            try:
+                self.agregar(producto)
+            except ClaveDuplicadaError:
+                self.duplicados.append(producto)
+
+    def agregar(self, producto):
+        """Indexa un producto; falla si su clave ya está ocupada por otro"""
+        codigo, lote = clave(producto)
+        existente = self.por_clave.get((codigo, lote))
+        if existente is not None and existente is not producto:
+            raise ClaveDuplicadaError(f"Ya existe el producto {codigo} con lote {lote}")
+        self.por_clave[(codigo, lote)] = producto
+        self.por_codigo.setdefault(codigo, {})[lote] = producto
+
+    def quitar(self, producto):
+        """Retira un producto del índice (solo si es el indexado con su clave)"""
+        codigo, lote = clave(producto)
+        if self.por_clave.get((codigo, lote)) is not producto:
+            return
+        del self.por_clave[(codigo, lote)]
+        lotes = self.por_codigo[codigo]
+        del lotes[lote]
+        if not lotes:
+            del self.por_codigo[codigo]
+
+    def obtener(self, codigo, lote):
+        """Producto con la clave dada o None"""
+        return self.por_clave.get((str(codigo), str(lote)))
+
+    def lotes(self, codigo):
+        """Productos (lotes) de un código"""
+        return list(self.por_codigo.get(str(codigo), {}).values())
+
+def _trigramas(texto):
+    """Conjunto de subcadenas de 3 caracteres de un texto"""
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+class IndiceTrigramas:
+    """Índice de subcadenas (trigramas) sobre codigo, descripcion y lote.
+
+    Por campo se indexan los valores distintos ya normalizados: cada trigrama
+    apunta a los valores que lo contienen y cada valor a sus productos. Una
+    búsqueda intersecta los trigramas del texto y verifica solo los valores
+    candidatos.
+
+    El índice se construye recién en la primera búsqueda, sobre la lista viva
+    de productos del almacén; desde ahí se mantiene con agregar/quitar.
+    """
+
+    campos = frozenset(("codigo", "descripcion", "lote"))
+
+    def __init__(self):
+        self.reconstruir([])
+
+    def reconstruir(self, productos):
+        """Descarta el índice; se construirá sobre `productos` en la próxima búsqueda"""
+        self._productos = productos
+        self.por_campo = None
+
+    def _construir(self):
+        """Construye el índice desde cero"""
+        productos = self._productos
+        # campo -> {"gramas": trigrama -> {valor}, "valores": valor -> {id: producto}}
+        self.por_campo = {}
+        self._orden = {id(producto): posicion for posicion, producto in enumerate(productos)}
+        for campo in self.campos:
+            # Primero se agrupan los productos por valor, así cada valor
+            # distinto se normaliza y se parte en trigramas una sola vez
+            por_valor = {}
+            for producto in productos:
+                por_valor.setdefault(str(producto.get(campo, "")), {})[id(producto)] = producto
+            valores = {}
+            for crudo, productos_valor in por_valor.items():
+                valor = normalizar_texto(crudo)
+                if valor in valores:
+                    valores[valor].update(productos_valor)
+                else:
+                    valores[valor] = productos_valor
+            gramas = {}
+            for valor in valores:
+                for trigrama in _trigramas(valor):
+                    if trigrama in gramas:
+                        gramas[trigrama].add(valor)
+                    else:
+                        gramas[trigrama] = {valor}
+            self.por_campo[campo] = {"gramas": gramas, "valores": valores}
+
+    def agregar(self, producto):
+        """Indexa los campos de texto de un producto"""
+        if self.por_campo is None:
+            return
+        self._orden.setdefault(id(producto), len(self._orden))
+        for campo, indice in self.por_campo.items():
+            valor = normalizar_texto(producto.get(campo, ""))
+            productos_valor = indice["valores"].get(valor)
+            if productos_valor is None:
+                productos_valor = indice["valores"][valor] = {}
+                for trigrama in _trigramas(valor):
+                    indice["gramas"].setdefault(trigrama, set()).add(valor)
+            productos_valor[id(producto)] = producto
+
+    def quitar(self, producto):
+        """Retira un producto; los valores que quedan sin productos salen del índice"""
+        if self.por_campo is None:
+            return
+        for campo, indice in self.por_campo.items():
+            valor = normalizar_texto(producto.get(campo, ""))
+            productos_valor = indice["valores"].get(valor)
+            if productos_valor is None or productos_valor.get(id(producto)) is not producto:
+                continue
+            del productos_valor[id(producto)]
+            if productos_valor:
+                continue
+            del indice["valores"][valor]
+            for trigrama in _trigramas(valor):
+                valores = indice["gramas"][trigrama]
+                valores.discard(valor)
+                if not valores:
+                    del indice["gramas"][trigrama]
+
+    def _candidatos(self, indice, texto):
+        """Valores del campo que pueden contener `texto` según sus trigramas"""
+        trigramas = _trigramas(texto)
+        if not trigramas:
+            # Texto de menos de 3 caracteres: se revisan los valores distintos
+            return indice["valores"].keys()
+        conjuntos = []
+        for trigrama in trigramas:
+            valores = indice["gramas"].get(trigrama)
+            if not valores:
+                return ()
+            conjuntos.append(valores)
+        conjuntos.sort(key=len)
+        return conjuntos[0].intersection(*conjuntos[1:])
+
+    def buscar(self, campos, texto):
+        """Productos en que alguno de `campos` contiene `texto`, en orden de alta"""
+        if self.por_campo is None:
+            self._construir()
+        texto = normalizar_texto(texto)
+        encontrados = {}
+        for campo in campos:
+            indice = self.por_campo[campo]
+            for valor in self._candidatos(indice, texto):
+                if texto in valor:
+                    encontrados.update(indice["valores"][valor])
+        return sorted(encontrados.values(), key=lambda producto: self._orden[id(producto)])
+
+def _comparador(palabra):
+    """Función que calcula la distancia de Levenshtein de otra palabra a `palabra`.
+
+    Usa el algoritmo de vectores de bits de Myers/Hyyrö: la tabla de
+    coincidencias de `palabra` se arma una vez y cada comparación avanza una
+    columna completa por carácter con operaciones sobre enteros.
+    """
+    largo = len(palabra)
+    if not largo:
+        return len
+    coincidencias = {}
+    for i, caracter in enumerate(palabra):
+        coincidencias[caracter] = coincidencias.get(caracter, 0) | (1 << i)
+    todos = (1 << largo) - 1
+    ultimo = 1 << (largo - 1)
+
+    def distancia(otra):
+        positivos, negativos, valor = todos, 0, largo
+        for caracter in otra:
+            eq = coincidencias.get(caracter, 0)
+            xv = eq | negativos
+            xh = (((eq & positivos) + positivos) ^ positivos) | eq
+            horizontal_pos = negativos | (~(xh | positivos) & todos)
+            horizontal_neg = positivos & xh
+            if horizontal_pos & ultimo:
+                valor += 1
+            elif horizontal_neg & ultimo:
+                valor -= 1
+            horizontal_pos = ((horizontal_pos << 1) | 1) & todos
+            horizontal_neg = (horizontal_neg << 1) & todos
+            positivos = horizontal_neg | (~(xv | horizontal_pos) & todos)
+            negativos = horizontal_pos & xv
+        return valor
+
+    return distancia
+
+def distancia_edicion(a, b):
+    """Distancia de Levenshtein entre dos textos"""
+    return _comparador(a)(b)
+
+def _palabras(texto):
+    """Palabras normalizadas de un texto"""
+    return re.findall(r"\w+", normalizar_texto(texto))
+
+def _tolerancia(palabra, max_distancia):
+    """Errores admitidos para una palabra según su largo"""
+    if len(palabra) < 3:
+        return 0
+    if len(palabra) < 6:
+        return min(1, max_distancia)
+    return max_distancia
+
+class ArbolBK:
+    """BK-tree de palabras con distancia de edición.
+
+    Cada nodo guarda a sus hijos según la distancia a él; al buscar con
+    tolerancia r desde un nodo a distancia d solo se recorren los hijos en
+    [d - r, d + r] (desigualdad triangular).
+    """
+
+    def __init__(self):
+        self.raiz = None
+        self.hijos = {}
+
+    def agregar(self, palabra):
+        """Inserta una palabra (si ya está no hace nada)"""
+        if palabra in self.hijos:
+            return
+        self.hijos[palabra] = {}
+        if self.raiz is None:
+            self.raiz = palabra
+            return
+        distancia = _comparador(palabra)
+        nodo = self.raiz
+        while True:
+            d = distancia(nodo)
+            siguiente = self.hijos[nodo].get(d)
+            if siguiente is None:
+                self.hijos[nodo][d] = palabra
+                return
+            nodo = siguiente
+
+    def buscar(self, palabra, tolerancia):
+        """Lista de (palabra, distancia) a lo más a `tolerancia` de `palabra`"""
+        if self.raiz is None:
+            return []
+        distancia = _comparador(palabra)
+        resultado = []
+        pendientes = [self.raiz]
+        while pendientes:
+            nodo = pendientes.pop()
+            d = distancia(nodo)
+            if d <= tolerancia:
+                resultado.append((nodo, d))
+            for distancia_hijo, hijo in self.hijos[nodo].items():
+                if d - tolerancia <= distancia_hijo <= d + tolerancia:
+                    pendientes.append(hijo)
+        return resultado
+
+class IndiceDifuso:
+    """Índice de palabras de descripcion y marca para búsquedas con errores de tipeo.
+
+    El vocabulario vive en un ArbolBK y cada palabra apunta a sus productos.
+    Las palabras que se quedan sin productos permanecen en el árbol (no admite
+    borrado) pero se ignoran. Como IndiceTrigramas, se construye en la primera
+    búsqueda.
+    """
+
+    campos = frozenset(("descripcion", "marca"))
+
+    def __init__(self):
+        self.reconstruir([])
+
+    def reconstruir(self, productos):
+        """Descarta el índice; se construirá sobre `productos` en la próxima búsqueda"""
+        self._productos = productos
+        self.por_palabra = None
+
+    def _construir(self):
+        """Construye el índice desde cero"""
+        self.por_palabra = {}
+        self.arbol = ArbolBK()
+        self._orden = {}
+        for producto in self._productos:
+            self.agregar(producto)
+
+    def _palabras_producto(self, producto):
+        """Palabras distintas de los campos indexados de un producto"""
+        palabras = set()
+        for campo in self.campos:
+            palabras.update(_palabras(producto.get(campo, "")))
+        return palabras
+
+    def agregar(self, producto):
+        """Indexa las palabras de un producto"""
+        if self.por_palabra is None:
+            return
+        self._orden.setdefault(id(producto), len(self._orden))
+        for palabra in self._palabras_producto(producto):
+            productos_palabra = self.por_palabra.get(palabra)
+            if productos_palabra is None:
+                productos_palabra = self.por_palabra[palabra] = {}
+                self.arbol.agregar(palabra)
+            productos_palabra[id(producto)] = producto
+
+    def quitar(self, producto):
+        """Retira las palabras de un producto"""
+        if self.por_palabra is None:
+            return
+        for palabra in self._palabras_producto(producto):
+            productos_palabra = self.por_palabra.get(palabra)
+            if productos_palabra is None or productos_palabra.get(id(producto)) is not producto:
+                continue
+            del productos_palabra[id(producto)]
+            if not productos_palabra:
+                del self.por_palabra[palabra]
+
+    def buscar(self, texto, limite=10, max_distancia=2):
+        """Hasta `limite` productos parecidos a `texto`, los mejores primero.
+
+        Cada palabra del texto admite hasta `max_distancia` errores (menos en
+        palabras cortas) y se asocia a las palabras del vocabulario más
+        cercanas que encuentre. Se prefiere el producto que coincide en más palabras
+        y, a igualdad, el de menor distancia total.
+        """
+        if self.por_palabra is None:
+            self._construir()
+        consulta = list(dict.fromkeys(_palabras(texto)))
+        # id de producto -> {posición de la palabra buscada: menor distancia}
+        coincidencias = {}
+        productos = {}
+        for posicion, palabra in enumerate(consulta):
+            # Se amplía la tolerancia solo si no hay palabras más cercanas:
+            # recorrer el árbol con tolerancia 1 visita muchos menos nodos
+            encontradas = []
+            for tolerancia in range(_tolerancia(palabra, max_distancia) + 1):
+                encontradas = self.arbol.buscar(palabra, tolerancia)
+                if encontradas:
+                    break
+            for encontrada, distancia in encontradas:
+                for id_producto, producto in self.por_palabra.get(encontrada, {}).items():
+                    distancias = coincidencias.setdefault(id_producto, {})
+                    if distancia < distancias.get(posicion, distancia + 1):
+                        distancias[posicion] = distancia
+                    productos[id_producto] = producto
+
+        mejores = heapq.nsmallest(
+            limite, coincidencias.items(),
+            key=lambda item: (-len(item[1]), sum(item[1].values()), self._orden[item[0]]))
+        return [productos[id_producto] for id_producto, _ in mejores]
+
+class IndiceOrdenado:
+    """Productos ordenados por el valor que calcula `valor(producto)`.
+
+    `claves` es una lista ordenada de (valor, orden de alta) y `productos`
+    la lista paralela: una página o un rango es un bisect y un corte. A igual
+    valor se conserva el orden de alta; los productos con valor None no se
+    indexan. Se construye en la primera consulta. Las subclases definen
+    `campos` y `valor`.
+    """
+
+    campos = frozenset()
+
+    def __init__(self):
+        self.reconstruir([])
+
+    def valor(self, producto):
+        """Valor por el que se ordena el producto (None para no indexarlo)"""
+        raise NotImplementedError
+
+    def reconstruir(self, productos):
+        """Descarta el índice; se construirá sobre `productos` en la próxima consulta"""
+        self._productos = productos
+        self.claves = None
+
+    def _construir(self):
+        """Construye el índice desde cero"""
+        self._orden = {}
+        filas = []
+        for posicion, producto in enumerate(self._productos):
+            self._orden[id(producto)] = posicion
+            valor = self.valor(producto)
+            if valor is not None:
+                filas.append((valor, posicion, producto))
+        # La posición es única: nunca se llega a comparar productos
+        filas.sort()
+        self.claves = [(valor, posicion) for valor, posicion, _ in filas]
+        self.productos = [producto for _, _, producto in filas]
+
+    def agregar(self, producto):
+        """Inserta un producto en su posición según el valor"""
+        if self.claves is None:
+            return
+        orden = self._orden.setdefault(id(producto), len(self._orden))
+        valor = self.valor(producto)
+        if valor is None:
+            return
+        posicion = bisect_right(self.claves, (valor, orden))
+        self.claves.insert(posicion, (valor, orden))
+        self.productos.insert(posicion, producto)
+
+    def quitar(self, producto):
+        """Retira un producto del índice"""
+        if self.claves is None:
+            return
+        valor = self.valor(producto)
+        if valor is None:
+            return
+        clave_producto = (valor, self._orden.get(id(producto)))
+        posicion = bisect_left(self.claves, clave_producto)
+        if posicion < len(self.claves) and self.productos[posicion] is producto:
+            del self.claves[posicion]
+            del self.productos[posicion]
+
+    def contar(self):
+        """Cantidad de productos indexados"""
+        if self.claves is None:
+            self._construir()
+        return len(self.claves)
+
+    def pagina(self, inicio=0, cantidad=None):
+        """Productos desde la posición `inicio`, en orden; hasta `cantidad` si se indica"""
+        if self.claves is None:
+            self._construir()
+        fin = None if cantidad is None else inicio + cantidad
+        return self.productos[inicio:fin]
+
+class IndiceVencimiento(IndiceOrdenado):
+    """Lotes ordenados por fecha de vencimiento (como ordinal de fecha).
+
+    "Lo que vence hasta X" es un bisect y un corte. Usa el ordinal guardado
+    en el producto (modules.fechas); los productos sin fecha reconocible no
+    se indexan.
+    """
+
+    campos = frozenset(("fecha_vencimiento", "fecha_vencimiento_ordinal"))
+
+    def valor(self, producto):
+        """Ordinal de la fecha de vencimiento"""
+        return fechas.ordinal_campo(producto, "fecha_vencimiento")
+
+    def contar_hasta(self, ordinal):
+        """Cantidad de productos que vencen hasta `ordinal` inclusive"""
+        if self.claves is None:
+            self._construir()
+        return bisect_left(self.claves, (ordinal + 1,))
+
+    def hasta(self, ordinal, inicio=0, cantidad=None):
+        """Pares (ordinal de vencimiento, producto) que vencen hasta `ordinal` inclusive.
+
+        `inicio` y `cantidad` acotan el corte, para no armar la lista completa.
+        """
+        fin = self.contar_hasta(ordinal)
+        if cantidad is not None:
+            fin = min(fin, inicio + cantidad)
+        return [(clave_producto[0], producto) for clave_producto, producto
+                in zip(self.claves[inicio:fin], self.productos[inicio:fin])]
+
+class IndiceUbicacion(IndiceOrdenado):
+    """Productos ordenados por ubicación (y por orden de alta dentro de cada
+    ubicación): es el orden de los listados del inventario, que así se
+    pagina sin ordenar la lista completa en cada consulta.
+    """
+
+    campos = frozenset(("ubicacion",))
+
+    def valor(self, producto):
+        """Ubicación del producto"""
+        return str(producto.get("ubicacion", ""))
+
+class IndiceStock:
+    """Conjuntos de productos en stock crítico y en atención.
+
+    Cada cambio de cantidad o stock mínimo mueve al producto entre conjuntos
+    en O(1); las pantallas leen los conjuntos sin recorrer el inventario.
+    """
+
+    campos = frozenset(("cantidad", "stock_minimo"))
+
+    def __init__(self):
+        self.reconstruir([])
+
+    def reconstruir(self, productos):
+        """Clasifica todos los productos"""
+        self.conjuntos = {ESTADO_CRITICO: {}, ESTADO_ATENCION: {}}
+        self._orden = {}
+        for producto in productos:
+            self.agregar(producto)
+
+    def agregar(self, producto):
+        """Ubica un producto en el conjunto que le corresponde"""
+        self._orden.setdefault(id(producto), len(self._orden))
+        estado = estado_stock(producto)
+        if estado is not None:
+            self.conjuntos[estado][id(producto)] = producto
+
+    def quitar(self, producto):
+        """Saca un producto de su conjunto"""
+        for conjunto in self.conjuntos.values():
+            if conjunto.get(id(producto)) is producto:
+                del conjunto[id(producto)]
+
+    def estado(self, producto):
+        """Estado del producto según los conjuntos (None si está en nivel normal)"""
+        for estado, conjunto in self.conjuntos.items():
+            if id(producto) in conjunto:
+                return estado
+        return None
+
+    def contar(self, estado):
+        """Cantidad de productos en un estado"""
+        return len(self.conjuntos[estado])
+
+    def productos(self, estado):
+        """Productos en un estado, en orden de alta"""
+        return sorted(self.conjuntos[estado].values(), key=lambda producto: self._orden[id(producto)])
+
+# Dimensiones de los agregados de reportes y el valor que se usa si falta el campo
+DIMENSIONES_AGREGADOS = {"unidad": "unidad", "ubicacion": "", "proveedor": "", "estado": ""}
+
+def _calcular_agregados(productos):
+    """Totales y grupos por dimensión calculados desde cero"""
+    datos = {"totales": {"skus": 0, "unidades": 0}}
+    datos.update({dimension: {} for dimension in DIMENSIONES_AGREGADOS})
+    for producto in productos:
+        _sumar_agregados(datos, producto, 1)
+    return datos
+
+def _sumar_agregados(datos, producto, signo):
+    """Suma (signo 1) o resta (signo -1) un producto de los agregados"""
+    cantidad = producto.get("cantidad", 0) * signo
+    datos["totales"]["skus"] += signo
+    datos["totales"]["unidades"] += cantidad
+    for dimension, defecto in DIMENSIONES_AGREGADOS.items():
+        valor = str(producto.get(dimension, defecto))
+        grupo = datos[dimension].get(valor)
+        if grupo is None:
+            grupo = datos[dimension][valor] = {"skus": 0, "unidades": 0}
+        grupo["skus"] += signo
+        grupo["unidades"] += cantidad
+        if not grupo["skus"]:
+            del datos[dimension][valor]
+
+class IndiceAgregados:
+    """Agregados de reportes (SKUs y unidades totales, por unidad, ubicación,
+    proveedor y estado) actualizados por diferencias en cada cambio.
+
+    Se construye en el primer uso o se restaura desde el archivo persistido
+    junto al snapshot (ver ProductStore.compactar).
+    """
+
+    campos = frozenset(("cantidad",) + tuple(DIMENSIONES_AGREGADOS))
+
+    def __init__(self):
+        self.reconstruir([])
+
+    def reconstruir(self, productos):
+        """Descarta los agregados; se calcularán sobre `productos` en el próximo uso"""
+        self._productos = productos
+        self.datos = None
+
+    def restaurar(self, datos):
+        """Toma agregados ya calculados (persistidos) en lugar de recalcularlos"""
+        self.datos = datos
+
+    def agregar(self, producto):
+        """Suma un producto a los agregados"""
+        if self.datos is not None:
+            _sumar_agregados(self.datos, producto, 1)
+
+    def quitar(self, producto):
+        """Resta un producto de los agregados"""
+        if self.datos is not None:
+            _sumar_agregados(self.datos, producto, -1)
+
+    def resumen(self):
+        """Copia de los agregados: {"totales": {...}, dimensión: {valor: {"skus", "unidades"}}}"""
+        if self.datos is None:
+            self.datos = _calcular_agregados(self._productos)
+        resumen = {"totales": dict(self.datos["totales"])}
+        for dimension in DIMENSIONES_AGREGADOS:
+            resumen[dimension] = {valor: dict(grupo) for valor, grupo in self.datos[dimension].items()}
+        return resumen
+
+    def verificar(self):
+        """Recalcula desde cero y retorna la lista de diferencias con los agregados mantenidos"""
+        mantenidos = self.resumen()
+        calculados = _calcular_agregados(self._productos)
+        diferencias = []
+
+        def comparar(nombre, esperado, actual):
+            for campo in ("skus", "unidades"):
+                if not math.isclose(esperado.get(campo, 0), actual.get(campo, 0), abs_tol=1e-6):
+                    diferencias.append(f"{nombre} {campo}: mantenido {actual.get(campo, 0)}, "
+                                       f"recalculado {esperado.get(campo, 0)}")
+
+        comparar("totales", calculados["totales"], mantenidos["totales"])
+        for dimension in DIMENSIONES_AGREGADOS:
+            for valor in sorted(set(calculados[dimension]) | set(mantenidos[dimension])):
+                comparar(f"{dimension}={valor!r}", calculados[dimension].get(valor, {}),
+                         mantenidos[dimension].get(valor, {}))
+        return diferencias
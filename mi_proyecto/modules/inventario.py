@@ -3,7 +3,7 @@ Módulo de gestión de inventario y stock
 Maneja control de stock, alertas y procesamiento de pedidos
 """
 
-import json
+import csv
 import os
 from datetime import datetime, timedelta
 import sys
@@ -11,139 +11,102 @@ if __name__ == "__main__":
     sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from modules import auditoria
+from modules import almacen
+from modules import indices
+from modules import paginacion
+from modules import pedidos
 
-ARCHIVO_PRODUCTOS = "data/productos.json"
-
-def cargar_productos():
-    """Carga productos desde archivo JSON"""
-    if not os.path.exists(ARCHIVO_PRODUCTOS):
-        return []
-    
-    try:
-        with open(ARCHIVO_PRODUCTOS, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except:
-        return []
-
-def guardar_productos(productos_list):
-    """Guarda productos en archivo JSON"""
-    os.makedirs(os.path.dirname(ARCHIVO_PRODUCTOS), exist_ok=True)
-    with open(ARCHIVO_PRODUCTOS, 'w', encoding='utf-8') as f:
-        json.dump(productos_list, f, indent=2, ensure_ascii=False)
+# Columnas del listado de inventario: (título, ancho[, alineación])
+COLUMNAS_INVENTARIO = [("Código", 10), ("Descripción", 25), ("Cantidad", 12), ("Ubicación", 15),
+                       ("Lote", 10), ("Vencimiento", 12), ("Stock Min", 10, ">"), ("Proveedor", 20),
+                       ("Estado", 10)]
+COLUMNAS_REVISION = [("Descripción", 30), ("Cantidad", 15), ("Mínimo", 10, ">"), ("Ubicación", 15)]
 
 def mostrar_inventario():
-    """Muestra todo el inventario"""
+    """Muestra todo el inventario, por páginas y ordenado por ubicación"""
     print("\n--- INVENTARIO COMPLETO ---")
     
-    productos_list = cargar_productos()
+    store = almacen.obtener_store()
+    total_productos = store.contar()
     
-    if not productos_list:
+    if not total_productos:
         print("No hay productos en inventario")
         return
     
-    # Ordenar por ubicación
-    productos_list.sort(key=lambda x: x.get("ubicacion", ""))
+    etiquetas_stock = {indices.ESTADO_CRITICO: "⚠ BAJO", indices.ESTADO_ATENCION: "⚠ ATENCIÓN", None: ""}
     
-    print("\n" + "="*120)
-    print(f"{'Código':10} {'Descripción':25} {'Cantidad':12} {'Ubicación':15} {'Lote':10} {'Vencimiento':12} {'Stock Min':10} {'Proveedor':20}")
-    print("="*120)
+    def formatear_fila(prod):
+        # Estado de stock mantenido por el almacén (bajo mínimo / en atención)
+        return (prod.get("codigo", ""), prod.get("descripcion", ""),
+                f"{prod.get('cantidad', 0)} {prod.get('unidad', 'unidad')}", prod.get("ubicacion", ""),
+                prod.get("lote", ""), prod.get("fecha_vencimiento", ""), prod.get("stock_minimo", 0),
+                prod.get("proveedor", ""), etiquetas_stock[store.estado_stock(prod)])
     
-    total_productos = 0
-    total_valor = 0
+    # El almacén mantiene el orden por ubicación: cada página es un corte del índice
+    paginacion.paginar(COLUMNAS_INVENTARIO, store.por_ubicacion, formatear_fila, total=total_productos)
     
-    for prod in productos_list:
-        cantidad = prod.get("cantidad", 0)
-        unidad = prod.get("unidad", "unidad")
-        
-        # Calcular si está bajo stock mínimo
-        stock_min = prod.get("stock_minimo", 0)
-        estado_stock = ""
-        if cantidad <= stock_min:
-            estado_stock = "⚠ BAJO"
-        elif cantidad <= stock_min * 1.5:
-            estado_stock = "⚠ ATENCIÓN"
-        
-        cantidad_str = f"{cantidad} {unidad}"
-        
-        print(f"{prod.get('codigo', ''):10} {prod.get('descripcion', '')[:25]:25} {cantidad_str:12} "
-              f"{prod.get('ubicacion', ''):15} {prod.get('lote', '')[:10]:10} "
-              f"{prod.get('fecha_vencimiento', '')[:12]:12} {stock_min:10} "
-              f"{prod.get('proveedor', '')[:20]:20} {estado_stock}")
-        
-        total_productos += 1
-        total_valor += cantidad
-    
-    print("="*120)
-    print(f"Total productos: {total_productos}")
-    print(f"Total ítems en stock: {total_valor}")
+    totales = store.agregados()["totales"]
+    print(f"Total productos: {totales['skus']}")
+    print(f"Total ítems en stock: {totales['unidades']:g}")
 
 def mostrar_stock_critico():
     """Muestra productos con stock crítico (para supervisor)"""
     print("\n--- STOCK CRÍTICO ---")
     
-    productos_list = cargar_productos()
-    criticos = []
+    store = almacen.obtener_store()
+    if store.en_memoria():
+        criticos = store.stock_critico()
+    else:
+        # Inventario sin cargar: se filtra en streaming y cada fila se imprime al encontrarla
+        criticos = (prod for prod in store.recorrer()
+                    if indices.estado_stock(prod) == indices.ESTADO_CRITICO)
     
-    for prod in productos_list:
+    encontrados = 0
+    for prod in criticos:
+        if not encontrados:
+            print("-" * 90)
+            print(f"{'Descripción':30} {'Stock Actual':15} {'Stock Mínimo':15} {'Diferencia':15} {'Ubicación':15}")
+            print("-" * 90)
+        encontrados += 1
+        
         cantidad = prod.get("cantidad", 0)
         stock_min = prod.get("stock_minimo", 0)
+        diferencia = cantidad - stock_min
         
-        if cantidad <= stock_min:
-            criticos.append(prod)
+        print(f"{prod.get('descripcion', '')[:30]:30} {cantidad:15} {stock_min:15} {diferencia:15} {prod.get('ubicacion', '')[:15]:15}")
     
-    if not criticos:
+    if not encontrados:
         print("No hay productos con stock crítico")
         return
     
-    print(f"\nSe encontraron {len(criticos)} producto(s) con stock crítico:")
     print("-" * 90)
-    print(f"{'Descripción':30} {'Stock Actual':15} {'Stock Mínimo':15} {'Diferencia':15} {'Ubicación':15}")
-    print("-" * 90)
-    
-    for prod in criticos:
-        cantidad = prod.get("cantidad", 0)
-        stock_min = prod.get("stock_minimo", 0)
-        diferencia = cantidad - stock_min
-        
-        print(f"{prod.get('descripcion', '')[:30]:30} {cantidad:15} {stock_min:15} {diferencia:15} {prod.get('ubicacion', '')[:15]:15}")
+    print(f"Se encontraron {encontrados} producto(s) con stock crítico")
 
-def mostrar_productos_por_vencer():
-    """Muestra productos próximos a vencer (para supervisor)"""
+def mostrar_productos_por_vencer(dias_alerta=30, limite=100):
+    """Muestra los (hasta `limite`) productos que vencen dentro de `dias_alerta` días (para supervisor)"""
     print("\n--- PRODUCTOS POR VENCER ---")
     
-    dias_alerta = 30  # Alertar 30 días antes
-    fecha_hoy = datetime.now()
+    store = almacen.obtener_store()
+    fecha_hoy = datetime.now().date()
     fecha_limite = fecha_hoy + timedelta(days=dias_alerta)
     
-    productos_list = cargar_productos()
-    por_vencer = []
-    
-    for prod in productos_list:
-        fecha_vencimiento_str = prod.get("fecha_vencimiento", "")
-        if fecha_vencimiento_str:
-            try:
-                fecha_vencimiento = datetime.strptime(fecha_vencimiento_str, "%Y-%m-%d")
-                if fecha_vencimiento <= fecha_limite:
-                    dias_restantes = (fecha_vencimiento - fecha_hoy).days
-                    prod["dias_restantes"] = dias_restantes
-                    por_vencer.append(prod)
-            except ValueError:
-                continue
-    
-    if not por_vencer:
+    total = store.contar_por_vencer(fecha_limite)
+    if not total:
         print(f"No hay productos por vencer en los próximos {dias_alerta} días")
         return
     
-    # Ordenar por fecha de vencimiento
-    por_vencer.sort(key=lambda x: x.get("dias_restantes", 999))
+    # El almacén los entrega ya ordenados por fecha de vencimiento
+    por_vencer = [((fecha_vencimiento - fecha_hoy).days, prod)
+                  for fecha_vencimiento, prod in store.por_vencer(fecha_limite, cantidad=limite)]
     
-    print(f"\nSe encontraron {len(por_vencer)} producto(s) por vencer:")
+    print(f"\nSe encontraron {total} producto(s) por vencer:")
+    if total > len(por_vencer):
+        print(f"(se muestran los {len(por_vencer)} más próximos)")
     print("-" * 100)
     print(f"{'Descripción':30} {'Lote':15} {'Vencimiento':15} {'Días Restantes':15} {'Cantidad':15} {'Ubicación':15}")
     print("-" * 100)
     
-    for prod in por_vencer:
-        dias = prod.get("dias_restantes", 0)
+    for dias, prod in por_vencer:
         estado = "⚠ VENCIDO" if dias < 0 else f"⚠ {dias} días"
         
         print(f"{prod.get('descripcion', '')[:30]:30} {prod.get('lote', '')[:15]:15} "
@@ -154,12 +117,17 @@ def procesar_pedido(usuario):
     """Procesa salida de pedidos"""
     print("\n--- PROCESAMIENTO DE PEDIDO ---")
     
-    productos_list = cargar_productos()
+    store = almacen.obtener_store()
     
-    if not productos_list:
+    if not store.contar():
         print("No hay productos en inventario")
         return
     
+    print("1. Ingresar un pedido, 2. Procesar archivo de pedidos (CSV o JSONL)")
+    if input("Seleccione (1-2): ").strip() == "2":
+        procesar_archivo_pedidos(usuario)
+        return
+    
     # Crear nuevo pedido
     pedido = {
         "numero": f"PED-{datetime.now().strftime('%Y%m%d-%H%M%S')}",
@@ -176,12 +144,7 @@ def procesar_pedido(usuario):
         
         # Buscar producto
         busqueda = input("Buscar producto (código o descripción): ").strip().lower()
-        resultados = []
-        
-        for prod in productos_list:
-            if busqueda in prod.get("codigo", "").lower() or \
-               busqueda in prod.get("descripcion", "").lower():
-                resultados.append(prod)
+        resultados = store.buscar(("codigo", "descripcion"), busqueda)
         
         if not resultados:
             print("No se encontraron productos")
@@ -244,27 +207,25 @@ def procesar_pedido(usuario):
         if confirmar == "S":
             # Actualizar inventario
             for item in pedido["items"]:
-                for prod in productos_list:
-                    if prod["codigo"] == item["codigo"] and prod["lote"] == item["lote"]:
-                        prod["cantidad"] -= item["cantidad"]
-                        
-                        # Registrar movimiento
-                        if "movimientos" not in prod:
-                            prod["movimientos"] = []
-                        
-                        movimiento = {
-                            "tipo": "Salida pedido",
-                            "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                            "cantidad": item["cantidad"],
-                            "usuario": usuario,
-                            "pedido": pedido["numero"]
-                        }
-                        
-                        prod["movimientos"].append(movimiento)
-                        break
+                prod = store.obtener(item["codigo"], item["lote"])
+                if prod is not None:
+                    # Registrar movimiento
+                    movimiento = {
+                        "tipo": "Salida pedido",
+                        "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        "cantidad": item["cantidad"],
+                        "usuario": usuario,
+                        "pedido": pedido["numero"]
+                    }
+                    
+                    store.registrar_movimiento(prod, -item["cantidad"], movimiento)
             
             # Guardar cambios
-            guardar_productos(productos_list)
+            try:
+                store.guardar()
+            except almacen.ConflictoConcurrenciaError as error:
+                print(f"\n⚠️  {error}. El pedido no se procesó; intente nuevamente")
+                return
             
             # Generar impresión (simulada)
             print("\n" + "="*50)
@@ -288,11 +249,23 @@ def procesar_pedido(usuario):
     else:
         print("Pedido vacío. No se procesó nada.")
 
+def procesar_archivo_pedidos(usuario):
+    """Procesa un archivo con muchos pedidos (ver modules.pedidos)"""
+    ruta = input("Archivo de pedidos (.csv o .jsonl): ").strip()
+    try:
+        completados, rechazados = pedidos.procesar_pedidos(ruta, usuario)
+    except (OSError, UnicodeDecodeError, csv.Error) as error:
+        print(f"No se pudo leer el archivo: {error}")
+        return
+    
+    print(f"\nPedidos completados: {completados} | rechazados: {rechazados}")
+    print(f"Detalle por pedido en {os.path.splitext(ruta)[0]}.resultados.jsonl")
+
 def ordenar_mercancia():
     """Función para ordenar mercancía (bodeguero)"""
     print("\n--- ORDENAR MERCANCÍA ---")
     
-    productos_list = cargar_productos()
+    productos_list = almacen.obtener_store().cargar()
     
     if not productos_list:
         print("No hay productos para ordenar")
@@ -314,88 +287,107 @@ def revisar_stock():
     """Función para revisar stock (bodeguero)"""
     print("\n--- REVISIÓN DE STOCK ---")
     
-    productos_list = cargar_productos()
+    store = almacen.obtener_store()
     
-    if not productos_list:
+    # Basta un producto para saber que hay inventario: no se carga completo
+    if next(store.recorrer(), None) is None:
         print("No hay productos en inventario")
         return
     
-    ubicacion = input("Ubicación a revisar (dejar vacío para todas): ").strip()
+    ubicacion = indices.normalizar_texto(input("Ubicación a revisar (dejar vacío para todas): ").strip())
     
-    productos_filtrados = []
-    for prod in productos_list:
-        if not ubicacion or ubicacion.lower() in prod.get("ubicacion", "").lower():
-            productos_filtrados.append(prod)
-    
-    print(f"\nSe encontraron {len(productos_filtrados)} producto(s) en la ubicación:")
+    # Se filtra en streaming y por páginas: solo se leen los productos que se muestran
+    filtrados = (prod for prod in store.recorrer()
+                 if not ubicacion or ubicacion in indices.normalizar_texto(prod.get("ubicacion", "")))
+    obtener_pagina = paginacion.paginas_de_iterador(filtrados)
+    if not obtener_pagina(0, paginacion.FILAS_POR_PAGINA):
+        print("No se encontraron productos en la ubicación")
+        return
     
-    for prod in productos_filtrados:
-        print(f"- {prod['descripcion']}: {prod['cantidad']} {prod['unidad']} "
-              f"(Mínimo: {prod.get('stock_minimo', 0)})")
+    paginacion.paginar(COLUMNAS_REVISION, obtener_pagina,
+                       lambda prod: (prod["descripcion"], f"{prod['cantidad']} {prod['unidad']}",
+                                     prod.get("stock_minimo", 0), prod.get("ubicacion", "")),
+                       titulo="Productos en la ubicación")
+
+def _mostrar_grupos(titulo, grupos, maximo=10):
+    """Imprime los grupos de un agregado, los de más SKUs primero"""
+    print(f"\n{titulo}")
+    print("-" * 40)
+    ordenados = sorted(grupos.items(), key=lambda item: (-item[1]["skus"], item[0]))
+    for valor, grupo in ordenados[:maximo]:
+        print(f"- {valor or '(sin dato)'}: {grupo['unidades']:g} ítems en {grupo['skus']} SKU(s)")
+    if len(ordenados) > maximo:
+        print(f"  ... y {len(ordenados) - maximo} más")
 
 def mostrar_reportes():
     """Muestra reportes consolidados del inventario"""
     print("\n--- REPORTES Y ESTADÍSTICAS ---")
     
-    productos_list = cargar_productos()
+    store = almacen.obtener_store()
     
-    if not productos_list:
+    if not store.contar():
         print("No hay datos para generar reportes")
         return
 
-    # Cálculos generales
-    total_skus = len(productos_list)
-    total_unidades = sum(prod.get("cantidad", 0) for prod in productos_list)
-    
-    # Stock crítico
-    criticos = [p for p in productos_list if p.get("cantidad", 0) <= p.get("stock_minimo", 0)]
-    
-    # Por vencer (30 días)
-    fecha_hoy = datetime.now()
-    fecha_limite = fecha_hoy + timedelta(days=30)
-    por_vencer = []
-    
-    def parse_date(date_str):
-        for fmt in ("%Y-%m-%d", "%d-%m-%y", "%d/%m/%y", "%d-%m-%Y", "%d/%m/%Y"):
-            try:
-                return datetime.strptime(date_str, fmt)
-            except ValueError:
-                pass
-        return None
-
-    for prod in productos_list:
-        if prod.get("fecha_vencimiento"):
-            fv = parse_date(prod["fecha_vencimiento"])
-            if fv and fv <= fecha_limite:
-                por_vencer.append(prod)
-
-    # Valorización (Simulada ya que no hay precio, usamos conteo por unidad)
-    unidades_dist = {}
-    for prod in productos_list:
-        u = prod.get("unidad", "unidad")
-        unidades_dist[u] = unidades_dist.get(u, 0) + prod.get("cantidad", 0)
+    # Agregados mantenidos por el almacén: el costo depende de la cantidad
+    # de grupos, no de la cantidad de productos
+    agregados = store.agregados()
+    criticos = store.contar_criticos()
+    por_vencer = store.contar_por_vencer((datetime.now() + timedelta(days=30)).date())
 
     print(f"\nRESUMEN GENERAL")
     print("-" * 40)
-    print(f"Total Productos (SKUs): {total_skus}")
-    print(f"Total Ítems (Suma):     {total_unidades:g}")
-    print(f"Productos Críticos:     {len(criticos)}")
-    print(f"Productos por Vencer:   {len(por_vencer)}")
+    print(f"Total Productos (SKUs): {agregados['totales']['skus']}")
+    print(f"Total Ítems (Suma):     {agregados['totales']['unidades']:g}")
+    print(f"Productos Críticos:     {criticos}")
+    print(f"Productos por Vencer:   {por_vencer}")
     
     print(f"\nDISTRIBUCIÓN POR UNIDAD")
     print("-" * 40)
-    for u, cant in unidades_dist.items():
-        print(f"- {u}: {cant:g}")
+    for u, grupo in agregados["unidad"].items():
+        print(f"- {u}: {grupo['unidades']:g}")
+    
+    _mostrar_grupos("DISTRIBUCIÓN POR UBICACIÓN", agregados["ubicacion"])
+    _mostrar_grupos("DISTRIBUCIÓN POR PROVEEDOR", agregados["proveedor"])
+    _mostrar_grupos("DISTRIBUCIÓN POR ESTADO", agregados["estado"])
     
     print(f"\nALERTAS")
     print("-" * 40)
     if criticos:
-        print(f"⚠ {len(criticos)} productos con stock bajo o nulo")
+        print(f"⚠ {criticos} productos con stock bajo o nulo")
     if por_vencer:
-        print(f"⚠ {len(por_vencer)} productos vencidos o próximos a vencer")
+        print(f"⚠ {por_vencer} productos vencidos o próximos a vencer")
         
     if not criticos and not por_vencer:
         print("✓ Inventario saludable")
+    
+    if input("\n¿Ver análisis detallado (pasillos, proveedores, vencimientos)? (S/N): ").strip().upper() == "S":
+        mostrar_analisis()
+
+def mostrar_analisis(ancho_dias=30, tramos=6):
+    """Análisis del inventario sobre la instantánea columnar del almacén"""
+    instantanea = almacen.obtener_store().instantanea_columnar()
+    
+    _mostrar_totales("UNIDADES POR PASILLO (prefijo de ubicación)", instantanea.totales_por_prefijo("ubicacion"))
+    _mostrar_totales("UNIDADES POR PROVEEDOR", instantanea.totales_por("proveedor"))
+    
+    conteos = instantanea.histograma_vencimientos(datetime.now().date().toordinal(), ancho_dias, tramos)
+    print(f"\nVENCIMIENTOS (tramos de {ancho_dias} días)")
+    print("-" * 40)
+    print(f"- Vencidos:            {conteos[0]}")
+    for i, conteo in enumerate(conteos[1:-1]):
+        print(f"- Días {i * ancho_dias:>4} a {(i + 1) * ancho_dias - 1:>4}:  {conteo}")
+    print(f"- Después de {tramos * ancho_dias} días: {conteos[-1]}")
+
+def _mostrar_totales(titulo, totales, maximo=10):
+    """Imprime {valor: unidades}, los de más unidades primero"""
+    print(f"\n{titulo}")
+    print("-" * 40)
+    ordenados = sorted(totales.items(), key=lambda item: (-item[1], item[0]))
+    for valor, unidades in ordenados[:maximo]:
+        print(f"- {valor or '(sin dato)'}: {unidades:g}")
+    if len(ordenados) > maximo:
+        print(f"  ... y {len(ordenados) - maximo} más")
 
 if __name__ == "__main__":
     # Test execution
@@ -0,0 +1,170 @@
+"""
+Módulo del modelo de producto
+Registro compacto (__slots__) para los productos del inventario
+"""
+
+import sys
+from collections.abc import MutableMapping
+
+# Campos habituales del producto, en el orden en que se guardan en JSON
+CAMPOS = ("codigo", "descripcion", "unidad", "cantidad", "marca", "fecha_elaboracion",
+          "fecha_vencimiento", "ubicacion", "lote", "stock_minimo", "proveedor", "guia_despacho",
+          "fecha_ingreso", "usuario_ingreso", "estado", "observaciones", "peligrosidad", "temperatura",
+          "fecha_elaboracion_ordinal", "fecha_vencimiento_ordinal", "version")
+
+# Campos opcionales, casi siempre vacíos: no ocupan un slot propio
+CAMPOS_OPCIONALES = ("peligrosidad", "temperatura")
+
+# Campos cuyos valores se repiten entre productos: todos los productos
+# comparten un mismo objeto por valor
+CAMPOS_CATEGORICOS = ("unidad", "marca", "fecha_elaboracion", "fecha_vencimiento", "ubicacion",
+                      "proveedor", "guia_despacho", "usuario_ingreso", "estado",
+                      "fecha_elaboracion_ordinal", "fecha_vencimiento_ordinal")
+
+# Máximo de enteros distintos compartidos (los textos usan sys.intern)
+MAX_ENTEROS_COMPARTIDOS = 100_000
+
+_FIJOS = tuple(campo for campo in CAMPOS if campo not in CAMPOS_OPCIONALES)
+_CONJUNTO_FIJOS = frozenset(_FIJOS)
+_CONJUNTO_CATEGORICOS = frozenset(CAMPOS_CATEGORICOS)
+_BITS_OPCIONALES = {campo: 1 << i for i, campo in enumerate(CAMPOS_OPCIONALES)}
+_enteros = {}
+
+def compartir(valor):
+    """Objeto compartido para un texto o entero repetido; otros valores se retornan tal cual"""
+    if type(valor) is str:
+        return sys.intern(valor)
+    if type(valor) is int:
+        compartido = _enteros.get(valor)
+        if compartido is None:
+            if len(_enteros) >= MAX_ENTEROS_COMPARTIDOS:
+                return valor
+            _enteros[valor] = compartido = valor
+        return compartido
+    return valor
+
+class Producto(MutableMapping):
+    """Producto del inventario con la interfaz de un dict.
+
+    Los campos habituales van en slots (un campo ausente es un slot sin
+    asignar) y los valores de CAMPOS_CATEGORICOS se comparten entre
+    productos. De los opcionales vacíos solo se guarda un bit; los
+    opcionales con valor y cualquier otro campo van a un dict aparte que
+    existe solo si hace falta. a_dict() reproduce el JSON original.
+    """
+
+    __slots__ = _FIJOS + ("_vacios", "_extra")
+
+    def __init__(self, datos=(), **campos):
+        self._vacios = 0
+        self._extra = None
+        if campos or type(datos) is not dict:
+            datos = dict(datos, **campos)
+        # Igual que update(), pero sin pasar por __setitem__ en los campos fijos:
+        # es el camino de cada producto leído del disco
+        for campo, valor in datos.items():
+            if campo in _CONJUNTO_CATEGORICOS:
+                setattr(self, campo, compartir(valor))
+            elif campo in _CONJUNTO_FIJOS:
+                setattr(self, campo, valor)
+            else:
+                self[campo] = valor
+
+    def __getitem__(self, campo):
+        if campo in _CONJUNTO_FIJOS:
+            try:
+                return getattr(self, campo)
+            except AttributeError:
+                raise KeyError(campo) from None
+        if self._vacios & _BITS_OPCIONALES.get(campo, 0):
+            return ""
+        if self._extra is not None and campo in self._extra:
+            return self._extra[campo]
+        raise KeyError(campo)
+
+    def get(self, campo, defecto=None):
+        if campo in _CONJUNTO_FIJOS:
+            return getattr(self, campo, defecto)
+        try:
+            return self[campo]
+        except KeyError:
+            return defecto
+
+    def __contains__(self, campo):
+        if campo in _CONJUNTO_FIJOS:
+            return hasattr(self, campo)
+        return bool(self._vacios & _BITS_OPCIONALES.get(campo, 0)) or \
+            (self._extra is not None and campo in self._extra)
+
+    def __setitem__(self, campo, valor):
+        if campo in _CONJUNTO_FIJOS:
+            setattr(self, campo, compartir(valor) if campo in _CONJUNTO_CATEGORICOS else valor)
+            return
+        bit = _BITS_OPCIONALES.get(campo, 0)
+        if bit:
+            if valor == "":
+                self._vacios |= bit
+                self._quitar_extra(campo)
+                return
+            self._vacios &= ~bit
+        if self._extra is None:
+            self._extra = {}
+        self._extra[campo] = valor
+
+    def __delitem__(self, campo):
+        if campo in _CONJUNTO_FIJOS:
+            try:
+                delattr(self, campo)
+            except AttributeError:
+                raise KeyError(campo) from None
+            return
+        bit = _BITS_OPCIONALES.get(campo, 0)
+        if self._vacios & bit:
+            self._vacios &= ~bit
+        elif not self._quitar_extra(campo):
+            raise KeyError(campo)
+
+    def _quitar_extra(self, campo):
+        """Quita un campo del dict aparte; retorna True si estaba"""
+        if self._extra is None or campo not in self._extra:
+            return False
+        del self._extra[campo]
+        if not self._extra:
+            self._extra = None
+        return True
+
+    def __iter__(self):
+        extra = self._extra or {}
+        for campo in CAMPOS:
+            if campo in _CONJUNTO_FIJOS:
+                if hasattr(self, campo):
+                    yield campo
+            elif self._vacios & _BITS_OPCIONALES[campo] or campo in extra:
+                yield campo
+        for campo in extra:
+            if campo not in _BITS_OPCIONALES:
+                yield campo
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"Producto({self.a_dict()!r})"
+
+    def a_dict(self):
+        """dict con los mismos campos y valores, listo para json.dumps"""
+        return {campo: self[campo] for campo in self}
+
+    def copy(self):
+        """Copia independiente del producto"""
+        return Producto(self)
+
+def como_producto(datos):
+    """El mismo Producto, o uno nuevo armado desde un dict"""
+    return datos if isinstance(datos, Producto) else Producto(datos)
+
+def serializar(objeto):
+    """Para json.dumps(default=serializar): convierte los Producto en dict"""
+    if isinstance(objeto, Producto):
+        return objeto.a_dict()
+    raise TypeError(f"Objeto de tipo {type(objeto).__name__} no serializable en JSON")
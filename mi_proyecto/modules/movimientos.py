@@ -0,0 +1,285 @@
+"""
+Módulo de movimientos de inventario
+Libro de movimientos append-only, separado de las fichas de producto
+"""
+
+import os
+import json
+import threading
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from datetime import date, datetime
+
+from modules import utils
+from modules import fechas
+from modules import bloqueos
+
+# Un archivo JSON-lines por mes (movimientos_YYYY-MM.jsonl) con un índice
+# lateral (.idx) que guarda offset, largo, codigo, lote y fecha de cada línea
+# (normalizada a 'YYYY-MM-DD HH:MM:SS', vacía si no se reconoce)
+DIR_MOVIMIENTOS = "data/movimientos/"
+
+# Índices de los archivos mensuales ya leídos en memoria, por ruta
+_cache_indices = {}
+
+# Hilos de esta sesión que escriben el libro o sincronizan su índice
+_lock_escritor = threading.RLock()
+
+# Bloqueo entre sesiones del libro (se usa siempre dentro de _lock_escritor)
+_bloqueo = {"ruta": None, "bloqueo": None}
+
+def _bloqueo_movimientos():
+    """Bloqueo entre procesos de DIR_MOVIMIENTOS: lo toman la escritura de
+    cada lote y la sincronización de los índices laterales"""
+    ruta = os.path.join(DIR_MOVIMIENTOS, "movimientos.lock")
+    if _bloqueo["ruta"] != ruta:
+        _bloqueo["ruta"] = ruta
+        _bloqueo["bloqueo"] = bloqueos.Bloqueo(ruta)
+    return _bloqueo["bloqueo"]
+
+def obtener_archivo_mes(mes):
+    """Ruta del libro de movimientos de un mes 'YYYY-MM'"""
+    return os.path.join(DIR_MOVIMIENTOS, f"movimientos_{mes}.jsonl")
+
+def _ruta_indice(ruta):
+    """Ruta del índice lateral de un archivo mensual"""
+    return os.path.splitext(ruta)[0] + ".idx"
+
+def _limpiar(texto):
+    """Quita tabs y saltos de línea para usar el texto como campo del índice"""
+    return str(texto).replace("\t", " ").replace("\n", " ")
+
+def _fecha_indice(fecha):
+    """Fecha de un movimiento como 'YYYY-MM-DD HH:MM:SS' (hora 00:00:00 si no trae); "" si no se reconoce"""
+    texto = str(fecha or "").strip()
+    if len(texto) == 19 and texto[10] == " " and texto[13] == texto[16] == ":" and fechas.ordinal_iso(texto[:10]):
+        return texto
+    dia, _, hora = texto.replace("T", " ").partition(" ")
+    dia = fechas.normalizar_fecha(dia)
+    if dia is None:
+        return ""
+    for formato in ("%H:%M:%S", "%H:%M:%S.%f", "%H:%M"):
+        try:
+            return f"{dia} {datetime.strptime(hora.strip(), formato):%H:%M:%S}"
+        except ValueError:
+            pass
+    return f"{dia} 00:00:00"
+
+def _linea_indice(offset, longitud, registro):
+    """Línea del índice lateral para un movimiento"""
+    return (f"{offset}\t{longitud}\t{_limpiar(registro.get('codigo', ''))}\t"
+            f"{_limpiar(registro.get('lote', ''))}\t{_fecha_indice(registro.get('fecha'))}\n").encode('utf-8')
+
+def _sincronizar_indice(ruta):
+    """Indexa las líneas del libro que aún no figuran en el índice lateral"""
+    ruta_idx = _ruta_indice(ruta)
+    utils.reparar_linea_incompleta(ruta_idx)
+
+    cubierto = 0
+    if os.path.exists(ruta_idx) and os.path.getsize(ruta_idx):
+        with open(ruta_idx, 'rb') as f:
+            f.seek(max(0, os.path.getsize(ruta_idx) - 4096))
+            campos = f.read().rstrip(b'\n').rsplit(b'\n', 1)[-1].split(b'\t')
+        try:
+            cubierto = int(campos[0]) + int(campos[1])
+        except (ValueError, IndexError):
+            # Última línea ilegible: el índice no es confiable y se rehace entero
+            cubierto = None
+
+    tamano = os.path.getsize(ruta) if os.path.exists(ruta) else 0
+    if cubierto is None or cubierto > tamano:
+        open(ruta_idx, 'wb').close()
+        _cache_indices.pop(ruta, None)
+        cubierto = 0
+    if cubierto == tamano:
+        return
+
+    with open(ruta, 'rb') as libro, open(ruta_idx, 'ab') as idx:
+        libro.seek(cubierto)
+        offset = cubierto
+        for linea in libro:
+            if not linea.endswith(b'\n'):
+                break
+            try:
+                registro = json.loads(linea)
+            except ValueError:
+                registro = {}
+            idx.write(_linea_indice(offset, len(linea), registro))
+            offset += len(linea)
+
+def _mes(fecha):
+    """Mes 'YYYY-MM' de la fecha de un movimiento (el actual si no tiene); ValueError si no se reconoce"""
+    if not fecha:
+        return datetime.now().strftime("%Y-%m")
+    normalizada = _fecha_indice(fecha)
+    if not normalizada:
+        raise ValueError(f"Fecha de movimiento no válida: {fecha!r}")
+    return normalizada[:7]
+
+def fecha_valida(fecha):
+    """True si registrar_lote acepta `fecha` (vacía se archiva en el mes actual)"""
+    return not fecha or bool(_fecha_indice(fecha))
+
+def registrar_lote(movimientos):
+    """Agrega movimientos al libro; cada uno es un dict con codigo, lote y fecha.
+
+    Los movimientos se agrupan por mes y cada archivo recibe una sola
+    escritura (más la de su índice). Lanza ValueError, sin escribir nada,
+    si alguna fecha no se reconoce (ver fechas.FORMATOS_FECHA).
+    """
+    por_mes = {}
+    for registro in movimientos:
+        por_mes.setdefault(_mes(registro.get("fecha")), []).append(registro)
+
+    with _lock_escritor, _bloqueo_movimientos().exclusivo():
+        for mes, registros in por_mes.items():
+            ruta = obtener_archivo_mes(mes)
+            utils.reparar_linea_incompleta(ruta)
+            _sincronizar_indice(ruta)
+
+            offset = os.path.getsize(ruta) if os.path.exists(ruta) else 0
+            lineas = []
+            entradas_indice = []
+            for registro in registros:
+                linea = (json.dumps(registro, ensure_ascii=False) + "\n").encode('utf-8')
+                entradas_indice.append(_linea_indice(offset, len(linea), registro))
+                lineas.append(linea)
+                offset += len(linea)
+
+            # Primero el libro y después el índice: el índice nunca apunta a bytes no escritos
+            with open(ruta, 'ab') as f:
+                f.write(b"".join(lineas))
+            with open(_ruta_indice(ruta), 'ab') as f:
+                f.write(b"".join(entradas_indice))
+
+def registrar_historicos(movimientos):
+    """Como registrar_lote, pero omite los movimientos que el libro ya tiene.
+
+    Un movimiento ya está si el libro tiene otro con igual codigo, lote,
+    fecha y tipo (contando repeticiones). Así rehacer una migración que se
+    cortó después de escribir el libro no los duplica. Retorna cuántos agregó.
+    """
+    with _lock_escritor, _bloqueo_movimientos().exclusivo():
+        existentes = Counter()
+        for codigo, lote in {(str(m.get("codigo", "")), str(m.get("lote", ""))) for m in movimientos}:
+            existentes.update(_clave_historico(m) for m in movimientos_de_lote(codigo, lote))
+        nuevos = []
+        for movimiento in movimientos:
+            clave = _clave_historico(movimiento)
+            if existentes[clave] > 0:
+                existentes[clave] -= 1
+            else:
+                nuevos.append(movimiento)
+        if nuevos:
+            registrar_lote(nuevos)
+    return len(nuevos)
+
+def _clave_historico(movimiento):
+    return tuple(str(movimiento.get(campo, "")) for campo in ("codigo", "lote", "fecha", "tipo"))
+
+def registrar(codigo, lote, movimiento):
+    """Agrega un movimiento del lote (codigo, lote) al libro"""
+    registrar_lote([dict(movimiento, codigo=codigo, lote=lote)])
+
+def _cargar_indice(ruta):
+    """Carga (incrementalmente) el índice lateral de un archivo mensual"""
+    # Sincronizar puede agregar líneas al .idx o rehacerlo: se hace como un
+    # escritor más, y la lectura queda dentro para no ver un .idx a medias
+    with _lock_escritor, _bloqueo_movimientos().exclusivo():
+        _sincronizar_indice(ruta)
+        indice = _cache_indices.get(ruta)
+        if indice is None:
+            # "ordenado" es False si alguna fecha es menor que la anterior (ver movimientos_entre)
+            indice = {"leido": 0, "offsets": [], "longitudes": [], "fechas": [], "ordenado": True,
+                      "por_clave": {}}
+            _cache_indices[ruta] = indice
+
+        with open(_ruta_indice(ruta), 'rb') as f:
+            f.seek(indice["leido"])
+            for linea in f:
+                if not linea.endswith(b'\n'):
+                    break
+                indice["leido"] += len(linea)
+                campos = linea.decode('utf-8', errors='replace').rstrip('\n').split('\t')
+                if len(campos) != 5:
+                    continue
+                try:
+                    offset, longitud = int(campos[0]), int(campos[1])
+                except ValueError:
+                    continue
+                # Los índices escritos antes de normalizar guardan la fecha tal como venía
+                fecha = _fecha_indice(campos[4])
+                if indice["fechas"] and fecha < indice["fechas"][-1]:
+                    indice["ordenado"] = False
+                posicion = len(indice["offsets"])
+                indice["offsets"].append(offset)
+                indice["longitudes"].append(longitud)
+                indice["fechas"].append(fecha)
+                indice["por_clave"].setdefault((campos[2], campos[3]), []).append(posicion)
+        return indice
+
+def _leer(ruta, indice, posiciones):
+    """Lee del libro solo las líneas de las posiciones indicadas"""
+    resultado = []
+    with open(ruta, 'rb') as f:
+        for posicion in posiciones:
+            f.seek(indice["offsets"][posicion])
+            resultado.append(json.loads(f.read(indice["longitudes"][posicion])))
+    return resultado
+
+def _archivos_mensuales(desde_mes=None, hasta_mes=None):
+    """Rutas de los libros mensuales en orden cronológico, opcionalmente acotadas"""
+    if not os.path.isdir(DIR_MOVIMIENTOS):
+        return []
+    rutas = []
+    for nombre in sorted(os.listdir(DIR_MOVIMIENTOS)):
+        if not (nombre.startswith("movimientos_") and nombre.endswith(".jsonl")):
+            continue
+        mes = nombre[len("movimientos_"):-len(".jsonl")]
+        if (desde_mes and mes < desde_mes) or (hasta_mes and mes > hasta_mes):
+            continue
+        rutas.append(os.path.join(DIR_MOVIMIENTOS, nombre))
+    return rutas
+
+def movimientos_de_lote(codigo, lote):
+    """Todos los movimientos de un lote, en orden cronológico"""
+    clave = (_limpiar(codigo), _limpiar(lote))
+    resultado = []
+    for ruta in _archivos_mensuales():
+        indice = _cargar_indice(ruta)
+        posiciones = indice["por_clave"].get(clave)
+        if posiciones:
+            resultado.extend(_leer(ruta, indice, posiciones))
+    return resultado
+
+def _texto_fecha(valor, fin=False):
+    """Normaliza un límite de fecha (date, datetime o str) a 'YYYY-MM-DD HH:MM:SS'"""
+    if isinstance(valor, datetime):
+        return valor.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(valor, date):
+        valor = valor.strftime("%Y-%m-%d")
+    texto = str(valor).strip()
+    normalizada = _fecha_indice(texto)
+    if not normalizada:
+        raise ValueError(f"Fecha no válida: {valor!r}")
+    if fin and " " not in texto and "T" not in texto:
+        return normalizada[:10] + " 23:59:59"
+    return normalizada
+
+def movimientos_entre(desde, hasta):
+    """Movimientos con fecha entre `desde` y `hasta` (inclusive), en orden cronológico"""
+    desde = _texto_fecha(desde)
+    hasta = _texto_fecha(hasta, fin=True)
+    resultado = []
+    for ruta in _archivos_mensuales(desde[:7], hasta[:7]):
+        indice = _cargar_indice(ruta)
+        fechas_mes = indice["fechas"]
+        if indice["ordenado"]:
+            posiciones = range(bisect_left(fechas_mes, desde), bisect_right(fechas_mes, hasta))
+        else:
+            # Cada sesión agrega sus movimientos al guardar, con la fecha en que los
+            # registró: una que guarda después puede escribir fechas anteriores
+            posiciones = sorted((p for p, fecha in enumerate(fechas_mes) if desde <= fecha <= hasta),
+                                key=fechas_mes.__getitem__)
+        resultado.extend(_leer(ruta, indice, posiciones))
+    return resultado
@@ -0,0 +1,119 @@
+"""
+Módulo de listados paginados
+Arma cada página de una tabla en un solo texto y la escribe de una vez
+"""
+
+import sys
+from itertools import islice
+
+# Filas por página de los listados
+FILAS_POR_PAGINA = 20
+
+def plantilla_fila(columnas):
+    """Formato de una fila para columnas (título, ancho[, alineación]).
+
+    Cada valor se rellena y recorta a su ancho; la alineación es '<' (por
+    defecto) o '>' para números.
+    """
+    return " ".join("{:%s%d.%d}" % (columna[2] if len(columna) > 2 else "<", columna[1], columna[1])
+                    for columna in columnas)
+
+def renderizar_pagina(columnas, filas, formatear_fila, inicio=0, numerar=False, titulo=""):
+    """Texto completo de una página: título, encabezado y filas.
+
+    `formatear_fila(fila)` retorna los valores de las columnas de una fila.
+    Con `numerar` se antepone el número de cada fila (contado desde 1).
+    """
+    if numerar:
+        columnas = [("#", len(str(inicio + len(filas))), ">")] + list(columnas)
+    plantilla = plantilla_fila(columnas)
+    ancho = sum(columna[1] for columna in columnas) + len(columnas) - 1
+    lineas = ["", titulo] if titulo else [""]
+    lineas.append("=" * ancho)
+    lineas.append(plantilla.format(*(columna[0] for columna in columnas)))
+    lineas.append("=" * ancho)
+    for numero, fila in enumerate(filas, inicio + 1):
+        valores = formatear_fila(fila)
+        if numerar:
+            valores = (numero, *valores)
+        lineas.append(plantilla.format(*map(str, valores)))
+    lineas.append("=" * ancho)
+    return "\n".join(lineas) + "\n"
+
+def paginas_de_iterador(iterador):
+    """Adapta un iterador a obtener_pagina(inicio, cantidad) para paginar().
+
+    Solo se consumen las filas necesarias para las páginas pedidas; las ya
+    leídas se guardan para poder volver atrás.
+    """
+    leidas = []
+
+    def obtener_pagina(inicio, cantidad):
+        faltan = inicio + cantidad - len(leidas)
+        if faltan > 0:
+            leidas.extend(islice(iterador, faltan))
+        return leidas[inicio:inicio + cantidad]
+
+    return obtener_pagina
+
+def paginar(columnas, obtener_pagina, formatear_fila, total=None, titulo="",
+            seleccionar=False, filas_por_pagina=FILAS_POR_PAGINA, salida=None):
+    """Muestra un listado por páginas y atiende la navegación.
+
+    `obtener_pagina(inicio, cantidad)` retorna las filas de una página, así
+    el costo de cada página depende de su tamaño y no del listado completo.
+    `total` es la cantidad de filas (None si no se conoce de antemano).
+    Cada página se escribe en `salida` (sys.stdout) con una sola llamada.
+
+    Comandos: Enter o S = siguiente, A = anterior, P<n> = ir a la página n,
+    Q = salir. Con `seleccionar` se numeran las filas y escribir un número
+    elige esa fila, que se retorna. Retorna None si se sale sin elegir.
+    """
+    salida = salida or sys.stdout
+    paginas = None if total is None else max(1, -(-total // filas_por_pagina))
+    comandos = "Enter/S: siguiente | A: anterior | P<n>: ir a la página n | Q: salir"
+    if seleccionar:
+        comandos = "N° de fila: elegir | " + comandos
+
+    pagina = 0
+    while True:
+        inicio = pagina * filas_por_pagina
+        filas = obtener_pagina(inicio, filas_por_pagina)
+        if not filas and pagina:
+            # Salto más allá del final (solo posible si no se conoce el total)
+            pagina -= 1
+            continue
+
+        if total is not None:
+            hay_siguiente = inicio + len(filas) < total
+            encabezado = f"{titulo} - Página {pagina + 1} de {paginas}"
+        else:
+            hay_siguiente = len(filas) == filas_por_pagina
+            encabezado = f"{titulo} - Página {pagina + 1}"
+        salida.write(renderizar_pagina(columnas, filas, formatear_fila, inicio, seleccionar,
+                                       encabezado.strip(" -")))
+        salida.flush()
+        if not seleccionar and pagina == 0 and not hay_siguiente:
+            # Cabe en una sola página: no hay nada que navegar
+            return None
+
+        comando = input(f"{comandos}\n> ").strip().upper()
+        if comando in ("", "S"):
+            if not hay_siguiente:
+                return None
+            pagina += 1
+        elif comando == "A":
+            pagina = max(0, pagina - 1)
+        elif comando == "Q":
+            return None
+        elif comando.startswith("P") and comando[1:].strip().isdigit():
+            pagina = max(0, int(comando[1:]) - 1)
+            if paginas is not None:
+                pagina = min(pagina, paginas - 1)
+        elif seleccionar and comando.isdigit() and int(comando) >= 1:
+            elegida = obtener_pagina(int(comando) - 1, 1)
+            if elegida:
+                return elegida[0]
+            print("Número de fila inválido")
+        else:
+            print("Comando no reconocido")
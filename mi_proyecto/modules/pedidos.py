@@ -0,0 +1,193 @@
+"""
+Módulo de procesamiento de pedidos por lote
+Procesa un archivo con muchos pedidos contra el inventario en una sola escritura
+Uso: python modules/pedidos.py <archivo.csv|archivo.jsonl> <usuario>
+"""
+
+import os
+import sys
+if __name__ == "__main__":
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+from datetime import datetime
+
+from modules import utils
+from modules import almacen
+from modules import auditoria
+from modules import fechas
+from modules import indices
+
+ESTADO_COMPLETADO = "Completado"
+ESTADO_RECHAZADO = "Rechazado"
+
+# Veces que se rehace el lote si otra sesión descontó los mismos productos al guardar
+REINTENTOS_CONFLICTO = 3
+MOTIVO_CONFLICTO = "conflicto de concurrencia"
+
+def leer_pedidos(ruta):
+    """Pedidos de un archivo CSV o JSONL como lista de {"numero", "items", "errores"}.
+
+    En CSV cada fila es una línea de pedido (columnas numero, codigo,
+    cantidad y, opcional, lote) y las filas con el mismo número forman un
+    pedido. En JSONL cada línea es un pedido {"numero", "items": [{"codigo",
+    "cantidad", "lote"}]}. Las líneas con errores quedan en "errores" con
+    su número de línea; un pedido con errores no se procesa.
+    """
+    pedidos = {}
+    sin_numero = []
+    for linea, datos in utils.leer_lineas(ruta):
+        if datos is None:
+            sin_numero.append({"numero": None, "items": [],
+                               "errores": [f"línea {linea}: no es un objeto JSON válido"]})
+            continue
+        numero = str(datos.get("numero") or "").strip()
+        if not numero:
+            sin_numero.append({"numero": None, "items": [], "errores": [f"línea {linea}: falta numero"]})
+            continue
+
+        items = datos["items"] if isinstance(datos.get("items"), list) else [datos]
+        pedido = pedidos.get(numero)
+        if pedido is None:
+            pedido = pedidos[numero] = {"numero": numero, "items": [], "errores": []}
+        elif "items" in datos:
+            # En JSONL cada pedido ocupa una sola línea
+            pedido["errores"].append(f"línea {linea}: número de pedido repetido")
+            continue
+
+        for item in items:
+            codigo = str(item.get("codigo") or "").strip() if isinstance(item, dict) else ""
+            try:
+                cantidad = float(item.get("cantidad"))
+            except (AttributeError, TypeError, ValueError):
+                cantidad = 0
+            if not codigo or not cantidad > 0:
+                pedido["errores"].append(f"línea {linea}: se requiere codigo y una cantidad mayor que 0")
+                continue
+            lote = str(item.get("lote") or "").strip()
+            pedido["items"].append({"codigo": codigo, "cantidad": cantidad, "lote": lote or None})
+    return list(pedidos.values()) + sin_numero
+
+def _orden_fefo(producto):
+    """Clave para consumir primero los lotes que vencen antes (los sin fecha al final)"""
+    ordinal = fechas.ordinal_campo(producto, "fecha_vencimiento")
+    return (ordinal is None, ordinal or 0, str(producto.get("lote", "")))
+
+def reservar(store, items):
+    """Asigna las líneas de un pedido a lotes del inventario, por orden de vencimiento.
+
+    Retorna (asignaciones, motivo): asignaciones es una lista de
+    (línea, producto, cantidad); si alguna línea no se puede cubrir
+    completa, asignaciones es None y motivo explica por qué. No modifica
+    el inventario.
+    """
+    tomado = {}
+    asignaciones = []
+    for item in items:
+        if item["lote"]:
+            producto = store.obtener(item["codigo"], item["lote"])
+            lotes = [producto] if producto is not None else []
+        else:
+            lotes = sorted(store.lotes_de(item["codigo"]), key=_orden_fefo)
+        if not lotes:
+            return None, f"producto {item['codigo']} inexistente" + (f" (lote {item['lote']})" if item["lote"] else "")
+
+        pendiente = item["cantidad"]
+        for producto in lotes:
+            clave = indices.clave(producto)
+            disponible = producto.get("cantidad", 0) - tomado.get(clave, 0)
+            if disponible <= 0:
+                continue
+            cantidad = min(disponible, pendiente)
+            tomado[clave] = tomado.get(clave, 0) + cantidad
+            asignaciones.append((item, producto, cantidad))
+            pendiente -= cantidad
+            if pendiente <= 0:
+                break
+        if pendiente > 0:
+            return None, (f"stock insuficiente de {item['codigo']}: faltan {pendiente:g} de "
+                          f"{item['cantidad']:g}")
+    return asignaciones, None
+
+def _descontar_pedidos(store, pedidos, usuario, fecha):
+    """Reserva y descuenta del almacén (sin guardar) cada pedido que se pueda
+    cubrir completo; retorna el resultado de cada pedido"""
+    resultados = []
+    for pedido in pedidos:
+        resultado = {"numero": pedido["numero"], "estado": ESTADO_RECHAZADO}
+        resultados.append(resultado)
+        if pedido["errores"]:
+            resultado["motivo"] = "; ".join(pedido["errores"])
+            continue
+        if not pedido["items"]:
+            resultado["motivo"] = "pedido sin líneas"
+            continue
+
+        asignaciones, motivo = reservar(store, pedido["items"])
+        if asignaciones is None:
+            resultado["motivo"] = motivo
+            continue
+
+        resultado["estado"] = ESTADO_COMPLETADO
+        resultado["items"] = []
+        for item, producto, cantidad in asignaciones:
+            movimiento = {
+                "tipo": "Salida pedido",
+                "fecha": fecha,
+                "cantidad": cantidad,
+                "usuario": usuario,
+                "pedido": pedido["numero"]
+            }
+            store.registrar_movimiento(producto, -cantidad, movimiento)
+            resultado["items"].append({"codigo": item["codigo"], "lote": producto.get("lote", ""),
+                                       "cantidad": cantidad})
+    return resultados
+
+def procesar_pedidos(ruta, usuario, ruta_resultados=None):
+    """Procesa todos los pedidos de un archivo; retorna (completados, rechazados).
+
+    Cada pedido se acepta completo o se rechaza completo: antes de
+    descontar se verifica que todas sus líneas tengan stock, contando lo
+    ya descontado por los pedidos anteriores del archivo. Todos los
+    descuentos se confirman juntos en una sola escritura del almacén; si
+    otra sesión descontó antes los mismos lotes, el lote se rehace sobre el
+    stock vigente, y si el conflicto persiste tras REINTENTOS_CONFLICTO
+    intentos esos pedidos se rechazan. Luego se registra en auditoría cada
+    pedido completado. El resultado de cada pedido se escribe en
+    `ruta_resultados` (por defecto <archivo>.resultados.jsonl).
+    """
+    ruta_resultados = ruta_resultados or os.path.splitext(ruta)[0] + ".resultados.jsonl"
+    store = almacen.obtener_store()
+    fecha = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    pedidos = leer_pedidos(ruta)
+
+    for intento in range(1, REINTENTOS_CONFLICTO + 1):
+        store.cargar()
+        resultados = _descontar_pedidos(store, pedidos, usuario, fecha)
+        try:
+            # Una sola escritura para todos los pedidos aceptados
+            store.guardar()
+            break
+        except almacen.ConflictoConcurrenciaError:
+            # Los descuentos pendientes se descartaron: se reservan de nuevo
+            if intento == REINTENTOS_CONFLICTO:
+                # No se guardó ningún descuento: los pedidos aceptados quedan rechazados
+                resultados = [{"numero": r["numero"], "estado": ESTADO_RECHAZADO, "motivo": MOTIVO_CONFLICTO}
+                              if r["estado"] == ESTADO_COMPLETADO else r for r in resultados]
+
+    completados = [r for r in resultados if r["estado"] == ESTADO_COMPLETADO]
+    for resultado in completados:
+        auditoria.registrar_log(usuario, "PROCESAR_PEDIDO",
+                                f"Pedido {resultado['numero']} procesado desde {os.path.basename(ruta)}")
+
+    with open(ruta_resultados, 'w', encoding='utf-8') as f:
+        for resultado in resultados:
+            f.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+    return len(completados), len(resultados) - len(completados)
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(2)
+    completados, rechazados = procesar_pedidos(sys.argv[1], sys.argv[2])
+    print(f"Pedidos completados: {completados} | rechazados: {rechazados}")
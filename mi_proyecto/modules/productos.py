@@ -3,44 +3,41 @@ Módulo de gestión de productos y mercancías
 Maneja ingreso, salida y consulta de productos
 """
 
-import json
 import os
 import sys
 if __name__ == "__main__":
     sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from datetime import datetime, timedelta
+import csv
+import math
 import re
 
-ARCHIVO_PRODUCTOS = "data/productos.json"
+from modules import utils
+from modules import almacen
+from modules import fechas
+from modules import paginacion
+from modules import modelo
 
-def cargar_productos():
-    """Carga productos desde archivo JSON"""
-    if not os.path.exists(ARCHIVO_PRODUCTOS):
-        return []
-    
-    try:
-        with open(ARCHIVO_PRODUCTOS, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except:
-        return []
+# Columnas de los listados para elegir un producto: (título, ancho[, alineación])
+COLUMNAS_SELECCION_RECEPCION = [("Descripción", 30), ("Lote", 12), ("Ubicación", 15), ("Estado", 15)]
+COLUMNAS_SELECCION_EGRESO = [("Descripción", 30), ("Stock", 15), ("Ubicación", 15), ("Lote", 12)]
 
-def guardar_productos(productos_list):
-    """Guarda productos en archivo JSON"""
-    os.makedirs(os.path.dirname(ARCHIVO_PRODUCTOS), exist_ok=True)
-    with open(ARCHIVO_PRODUCTOS, 'w', encoding='utf-8') as f:
-        json.dump(productos_list, f, indent=2, ensure_ascii=False)
+# Columnas de un archivo de importación de mercancía (una línea por producto)
+CAMPOS_LINEA = ("codigo", "descripcion", "unidad", "cantidad", "marca", "fecha_elaboracion",
+                "fecha_vencimiento", "ubicacion", "lote", "stock_minimo", "peligrosidad", "temperatura")
+CAMPOS_OBLIGATORIOS = ("codigo", "descripcion", "cantidad", "fecha_elaboracion", "fecha_vencimiento",
+                       "stock_minimo")
+
+# Errores de importación que se muestran en pantalla (el resto va al archivo de errores)
+MAX_ERRORES_EN_PANTALLA = 20
 
 def solicitar_fecha(mensaje):
-    """Solicita una fecha y valida su formato"""
+    """Solicita una fecha y la retorna en formato YYYY-MM-DD"""
     while True:
-        fecha_str = input(f"{mensaje} (YYYY-MM-DD): ").strip()
-        for fmt in ("%Y-%m-%d", "%d-%m-%y", "%d/%m/%y", "%d-%m-%Y", "%d/%m/%Y"):
-            try:
-                dt = datetime.strptime(fecha_str, fmt)
-                return dt.strftime("%Y-%m-%d")
-            except ValueError:
-                pass
+        fecha = fechas.normalizar_fecha(input(f"{mensaje} (YYYY-MM-DD): ").strip())
+        if fecha:
+            return fecha
         print("Formato de fecha inválido. Intente nuevamente.")
 
 def solicitar_float(mensaje):
@@ -82,13 +79,21 @@ def ingresar_mercancia(usuario):
     fecha_documento = solicitar_fecha("Fecha documento")
     proveedor = input("Proveedor: ").strip()
     
+    print("\nPRODUCTOS: 1. Ingresar uno por uno, 2. Importar desde archivo (CSV o JSONL)")
+    if input("Seleccione (1-2): ").strip() == "2":
+        importar_mercancia({"proveedor": proveedor, "guia_despacho": num_documento,
+                            "usuario_ingreso": usuario, "estado": estado, "observaciones": observaciones})
+        return
+    
+    store = almacen.obtener_store()
     productos = []
+    claves_documento = set()
     continuar = True
     
     while continuar:
         print(f"\n--- PRODUCTO {len(productos) + 1} ---")
         
-        producto = {
+        producto = modelo.Producto({
             "codigo": input("Código interno: ").strip(),
             "descripcion": input("Descripción: ").strip(),
             "unidad": input("Unidad (unidad/ml/gr): ").strip() or "unidad",
@@ -105,7 +110,14 @@ def ingresar_mercancia(usuario):
             "usuario_ingreso": usuario,
             "estado": estado,
             "observaciones": observaciones
-        }
+        })
+        
+        # (codigo, lote) identifica al producto: no puede repetirse
+        while (producto["codigo"], producto["lote"]) in claves_documento or \
+                store.obtener(producto["codigo"], producto["lote"]) is not None:
+            print(f"Ya existe el producto {producto['codigo']} con lote {producto['lote']}")
+            producto["lote"] = input("Número de lote: ").strip()
+        claves_documento.add((producto["codigo"], producto["lote"]))
         
         # Campos opcionales
         producto["peligrosidad"] = input("Peligrosidad (opcional): ").strip()
@@ -115,35 +127,133 @@ def ingresar_mercancia(usuario):
         continuar = input("\n¿Agregar otro producto? (S/N): ").strip().upper() == "S"
     
     # Guardar productos
-    productos_existentes = cargar_productos()
-    productos_existentes.extend(productos)
-    guardar_productos(productos_existentes)
+    store.agregar(productos)
+    try:
+        store.guardar()
+    except almacen.ConflictoConcurrenciaError as error:
+        print(f"\n⚠️  {error}. No se ingresó ningún producto; intente nuevamente")
+        return
     
     print(f"\n¡{len(productos)} producto(s) ingresado(s) exitosamente!")
     print(f"Estado: {estado}")
     print(f"Guía de despacho: {num_documento}")
 
+def validar_linea_mercancia(datos):
+    """Producto armado desde una línea importada y la lista de errores encontrados"""
+    if datos is None:
+        return None, ["la línea no es un objeto JSON válido"]
+
+    errores = [f"columna desconocida '{campo}'" for campo in datos if campo not in CAMPOS_LINEA]
+    producto = {campo: "" if datos.get(campo) is None else str(datos[campo]).strip() for campo in CAMPOS_LINEA}
+    for campo in CAMPOS_OBLIGATORIOS:
+        if not producto[campo]:
+            errores.append(f"falta {campo}")
+    producto["unidad"] = producto["unidad"] or "unidad"
+
+    for campo, tipo, mensaje in (("cantidad", float, "un número"), ("stock_minimo", int, "un número entero")):
+        try:
+            producto[campo] = tipo(producto[campo])
+        except ValueError:
+            if producto[campo]:
+                errores.append(f"{campo} debe ser {mensaje}: '{producto[campo]}'")
+    if isinstance(producto["cantidad"], float) and not (math.isfinite(producto["cantidad"])
+                                                         and producto["cantidad"] > 0):
+        errores.append(f"cantidad debe ser un número finito mayor que 0: '{datos.get('cantidad')}'")
+    if isinstance(producto["stock_minimo"], int) and producto["stock_minimo"] < 0:
+        errores.append(f"stock_minimo no puede ser negativo: '{datos.get('stock_minimo')}'")
+    for campo in fechas.CAMPOS_FECHA:
+        fecha = fechas.normalizar_fecha(producto[campo])
+        if fecha:
+            producto[campo] = fecha
+        elif producto[campo]:
+            errores.append(f"{campo} no es una fecha válida: '{producto[campo]}'")
+    return producto, errores
+
+def importar_mercancia(encabezado, ruta=None):
+    """Ingreso masivo de mercancía desde un archivo CSV o JSONL.
+
+    `encabezado` trae los datos del documento comunes a todas las líneas
+    (proveedor, guía, usuario, estado, observaciones). Todas las líneas se
+    validan antes de escribir: las que tienen errores no se ingresan y se
+    informan con su número de línea; las válidas se ingresan juntas en una
+    sola escritura, o ninguna si el usuario no confirma. Retorna la
+    cantidad de productos ingresados.
+    """
+    ruta = ruta or input("Archivo a importar (.csv o .jsonl): ").strip()
+    store = almacen.obtener_store()
+    fecha_ingreso = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    
+    validos = []
+    errores = []
+    claves = {}
+    try:
+        for numero, datos in utils.leer_lineas(ruta):
+            producto, errores_linea = validar_linea_mercancia(datos)
+            if producto is not None:
+                clave = (producto["codigo"], producto["lote"])
+                if clave in claves:
+                    errores_linea.append(f"código {clave[0]} con lote {clave[1]} repetido (línea {claves[clave]})")
+                elif store.obtener(*clave) is not None:
+                    errores_linea.append(f"ya existe el producto {clave[0]} con lote {clave[1]}")
+                else:
+                    claves[clave] = numero
+            if errores_linea:
+                errores.append((numero, errores_linea))
+            else:
+                validos.append(modelo.Producto(producto, fecha_ingreso=fecha_ingreso, **encabezado))
+    except (OSError, UnicodeDecodeError, csv.Error) as error:
+        print(f"No se pudo leer el archivo: {error}")
+        return 0
+    
+    print(f"\nLíneas válidas: {len(validos)} | con errores: {len(errores)}")
+    if errores:
+        for numero, errores_linea in errores[:MAX_ERRORES_EN_PANTALLA]:
+            print(f"  Línea {numero}: {'; '.join(errores_linea)}")
+        if len(errores) > MAX_ERRORES_EN_PANTALLA:
+            print(f"  ... y {len(errores) - MAX_ERRORES_EN_PANTALLA} línea(s) más")
+        ruta_errores = os.path.splitext(ruta)[0] + ".errores.txt"
+        with open(ruta_errores, 'w', encoding='utf-8') as f:
+            f.writelines(f"Línea {numero}: {'; '.join(errores_linea)}\n" for numero, errores_linea in errores)
+        print(f"Detalle completo de errores en {ruta_errores}")
+    
+    if not validos:
+        print("No se ingresó ningún producto")
+        return 0
+    if errores and input(f"\n¿Ingresar las {len(validos)} línea(s) válidas y omitir las demás? (S/N): ").strip().upper() != "S":
+        print("Importación cancelada: no se ingresó ningún producto")
+        return 0
+    
+    # Una sola escritura para todo el lote
+    store.agregar(validos)
+    try:
+        store.guardar()
+    except almacen.ConflictoConcurrenciaError as error:
+        print(f"\n⚠️  {error}. No se ingresó ningún producto; intente nuevamente")
+        return 0
+    
+    print(f"\n¡{len(validos)} producto(s) ingresado(s) exitosamente!")
+    print(f"Guía de despacho: {encabezado.get('guia_despacho', '')}")
+    return len(validos)
+
 def recibir_mercancia(usuario):
     """Proceso de recepción de mercancía para bodeguero"""
     print("\n--- RECEPCIÓN DE MERCANCÍA ---")
     
-    productos_list = cargar_productos()
+    store = almacen.obtener_store()
+    pendientes = [prod for prod in store.por_ubicacion() if prod.get("estado_recepcion") != "Recibido"]
     
-    if not productos_list:
+    if not pendientes:
         print("No hay productos pendientes de recepción")
         return
     
-    # Mostrar productos pendientes
-    print("\nProductos pendientes de recepción:")
-    for i, prod in enumerate(productos_list):
-        if prod.get("estado_recepcion") != "Recibido":
-            print(f"{i+1}. {prod['descripcion']} - Lote: {prod['lote']} - Estado: {prod.get('estado', 'Pendiente')}")
+    # Mostrar productos pendientes, por páginas
+    producto = paginacion.paginar(
+        COLUMNAS_SELECCION_RECEPCION, lambda inicio, cantidad: pendientes[inicio:inicio + cantidad],
+        lambda prod: (prod["descripcion"], prod["lote"], prod.get("ubicacion", ""), prod.get("estado", "Pendiente")),
+        total=len(pendientes), titulo="Productos pendientes de recepción", seleccionar=True)
     
     try:
-        seleccion = int(input("\nSeleccione producto a recibir (número): ")) - 1
-        if 0 <= seleccion < len(productos_list):
-            producto = productos_list[seleccion]
-            
+        if producto is not None:
             print(f"\nRecibiendo: {producto['descripcion']}")
             print(f"Lote: {producto['lote']}")
             print(f"Proveedor: {producto['proveedor']}")
@@ -152,17 +262,22 @@ def recibir_mercancia(usuario):
             conforme = input("\n¿Recepción conforme? (S/N): ").strip().upper()
             observaciones = input("Observaciones: ").strip()
             
-            productos_list[seleccion]["estado_recepcion"] = "Recibido" if conforme == "S" else "No conforme"
-            productos_list[seleccion]["observaciones_recepcion"] = observaciones
-            productos_list[seleccion]["fecha_recepcion"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            productos_list[seleccion]["usuario_recepcion"] = usuario
-            
-            guardar_productos(productos_list)
+            store.actualizar(producto, {
+                "estado_recepcion": "Recibido" if conforme == "S" else "No conforme",
+                "observaciones_recepcion": observaciones,
+                "fecha_recepcion": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "usuario_recepcion": usuario
+            })
+            try:
+                store.guardar()
+            except almacen.ConflictoConcurrenciaError as error:
+                print(f"\n⚠️  {error}. La recepción no se registró; intente nuevamente")
+                return
             
             estado = "CONFORME" if conforme == "S" else "NO CONFORME"
             print(f"\nProducto marcado como {estado}")
         else:
-            print("Selección inválida")
+            print("No se seleccionó ningún producto")
     except ValueError:
         print("Entrada inválida")
 
@@ -170,17 +285,18 @@ def consultar_producto():
     """Consulta si un producto está en bodega"""
     print("\n--- CONSULTA DE PRODUCTO ---")
     
-    criterio = input("Buscar por (1. código, 2. descripción, 3. lote): ").strip()
+    criterio = input("Buscar por (1. código, 2. descripción, 3. lote, 4. descripción aproximada): ").strip()
     busqueda = input("Texto a buscar: ").strip().lower()
     
-    productos_list = cargar_productos()
-    resultados = []
+    store = almacen.obtener_store()
+    campo = {"1": "codigo", "2": "descripcion", "3": "lote"}.get(criterio)
+    resultados = store.buscar(campo, busqueda) if campo else []
     
-    for prod in productos_list:
-        if (criterio == "1" and busqueda in prod.get("codigo", "").lower()) or \
-           (criterio == "2" and busqueda in prod.get("descripcion", "").lower()) or \
-           (criterio == "3" and busqueda in prod.get("lote", "").lower()):
-            resultados.append(prod)
+    # Sin coincidencia exacta en la descripción se ofrecen las más parecidas
+    if criterio == "4" or (criterio == "2" and not resultados and busqueda):
+        if criterio == "2":
+            print("Sin coincidencias exactas; mostrando descripciones parecidas")
+        resultados = store.buscar_aproximado(busqueda)
     
     if resultados:
         print(f"\nSe encontraron {len(resultados)} resultado(s):")
@@ -198,21 +314,21 @@ def marcar_egreso(usuario):
     """Marca egresos de mercancías (para digitador)"""
     print("\n--- MARCADO DE EGRESOS ---")
     
-    productos_list = cargar_productos()
+    store = almacen.obtener_store()
+    total = store.contar()
     
-    if not productos_list:
+    if not total:
         print("No hay productos en inventario")
         return
     
-    print("Seleccione producto para marcar egreso:")
-    for i, prod in enumerate(productos_list):
-        print(f"{i+1}. {prod['descripcion']} - Stock: {prod['cantidad']} {prod['unidad']}")
+    producto = paginacion.paginar(
+        COLUMNAS_SELECCION_EGRESO, store.por_ubicacion,
+        lambda prod: (prod["descripcion"], f"{prod['cantidad']} {prod['unidad']}", prod.get("ubicacion", ""),
+                      prod.get("lote", "")),
+        total=total, titulo="Seleccione producto para marcar egreso", seleccionar=True)
     
     try:
-        seleccion = int(input("\nSelección: ")) - 1
-        if 0 <= seleccion < len(productos_list):
-            producto = productos_list[seleccion]
-            
+        if producto is not None:
             print(f"\nProducto: {producto['descripcion']}")
             print(f"Stock actual: {producto['cantidad']} {producto['unidad']}")
             
@@ -220,9 +336,6 @@ def marcar_egreso(usuario):
             
             if cantidad_egreso <= producto['cantidad']:
                 # Registrar movimiento
-                if "movimientos" not in producto:
-                    producto["movimientos"] = []
-                
                 movimiento = {
                     "tipo": "Egreso",
                     "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
@@ -231,16 +344,19 @@ def marcar_egreso(usuario):
                     "motivo": input("Motivo del egreso: ").strip()
                 }
                 
-                producto["movimientos"].append(movimiento)
-                producto["cantidad"] -= cantidad_egreso
-                
-                productos_list[seleccion] = producto
-                guardar_productos(productos_list)
+                store.registrar_movimiento(producto, -cantidad_egreso, movimiento)
+                try:
+                    store.guardar()
+                except almacen.ConflictoConcurrenciaError as error:
+                    print(f"\n⚠️  {error}. El egreso no se registró")
+                    return
                 
+                # Se relee: al guardar pudo sumarse lo que otras sesiones descontaron
+                producto = store.obtener(producto.get("codigo", ""), producto.get("lote", "")) or producto
                 print(f"\nEgreso registrado. Nuevo stock: {producto['cantidad']} {producto['unidad']}")
             else:
                 print("Cantidad insuficiente en inventario")
         else:
-            print("Selección inválida")
+            print("No se seleccionó ningún producto")
     except ValueError:
         print("Entrada inválida")
\ No newline at end of file
@@ -0,0 +1,116 @@
+"""
+Módulo de seguridad
+Hash de contraseñas con sal y sesiones firmadas con vencimiento
+"""
+
+import base64
+import hashlib
+import hmac
+import secrets
+import time
+
+# Función de derivación para las contraseñas nuevas. scrypt depende de que
+# OpenSSL lo incluya; sin él se usa PBKDF2-SHA256
+ALGORITMO_HASH = "scrypt" if hasattr(hashlib, "scrypt") else "pbkdf2_sha256"
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+PBKDF2_ITERACIONES = 600_000
+BYTES_SAL = 16
+
+# Duración de una sesión iniciada (segundos)
+DURACION_SESION = 8 * 60 * 60
+
+# Clave con que se firman las sesiones: nueva en cada proceso, así una
+# sesión no sobrevive al programa que la emitió
+_clave_sesiones = secrets.token_bytes(32)
+
+# Sesiones vigentes: token -> (usuario_id, vencimiento) y tokens por usuario
+_sesiones = {}
+_sesiones_por_usuario = {}
+
+def _b64(datos):
+    return base64.b64encode(datos).decode('ascii')
+
+def _derivar(algoritmo, parametros, contrasena, sal):
+    """Hash de `contrasena` con el algoritmo y los parámetros indicados"""
+    if algoritmo == "scrypt":
+        n, r, p = parametros
+        return hashlib.scrypt(contrasena.encode('utf-8'), salt=sal, n=n, r=r, p=p, dklen=32)
+    if algoritmo == "pbkdf2_sha256":
+        iteraciones, = parametros
+        return hashlib.pbkdf2_hmac("sha256", contrasena.encode('utf-8'), sal, iteraciones)
+    raise ValueError(f"Algoritmo de hash desconocido: {algoritmo}")
+
+def _parametros_vigentes():
+    return (SCRYPT_N, SCRYPT_R, SCRYPT_P) if ALGORITMO_HASH == "scrypt" else (PBKDF2_ITERACIONES,)
+
+def hashear_contrasena(contrasena):
+    """Hash con sal de una contraseña: "algoritmo$parámetros...$sal$hash" (base64)"""
+    sal = secrets.token_bytes(BYTES_SAL)
+    parametros = _parametros_vigentes()
+    derivada = _derivar(ALGORITMO_HASH, parametros, contrasena, sal)
+    return "$".join([ALGORITMO_HASH, *map(str, parametros), _b64(sal), _b64(derivada)])
+
+def _descomponer(almacenada):
+    """(algoritmo, parámetros, sal, hash) de un hash guardado, o None si es texto plano"""
+    partes = str(almacenada).split("$")
+    if len(partes) < 4 or partes[0] not in ("scrypt", "pbkdf2_sha256"):
+        return None
+    try:
+        return (partes[0], tuple(int(p) for p in partes[1:-2]),
+                base64.b64decode(partes[-2]), base64.b64decode(partes[-1]))
+    except ValueError:
+        return None
+
+def verificar_contrasena(contrasena, almacenada):
+    """True si `contrasena` corresponde a la guardada (hash o, en datos antiguos, texto plano)"""
+    descompuesta = _descomponer(almacenada)
+    if descompuesta is None:
+        # Usuarios anteriores al hash: se comparan en texto plano hasta su próximo inicio de sesión
+        return hmac.compare_digest(str(almacenada).encode('utf-8'), contrasena.encode('utf-8'))
+    algoritmo, parametros, sal, derivada = descompuesta
+    return hmac.compare_digest(_derivar(algoritmo, parametros, contrasena, sal), derivada)
+
+def requiere_rehash(almacenada):
+    """True si la contraseña guardada está en texto plano o con otro algoritmo/parámetros"""
+    descompuesta = _descomponer(almacenada)
+    return descompuesta is None or descompuesta[:2] != (ALGORITMO_HASH, _parametros_vigentes())
+
+def _firmar(usuario_id, vencimiento, aleatorio):
+    mensaje = f"{usuario_id}:{vencimiento}:{aleatorio}".encode('utf-8')
+    return hmac.new(_clave_sesiones, mensaje, hashlib.sha256).hexdigest()
+
+def crear_sesion(usuario_id, duracion=None):
+    """Emite un token de sesión firmado para un usuario ya verificado"""
+    vencimiento = int(time.time() + (DURACION_SESION if duracion is None else duracion))
+    aleatorio = secrets.token_hex(8)
+    token = f"{usuario_id}:{vencimiento}:{aleatorio}:{_firmar(usuario_id, vencimiento, aleatorio)}"
+    _sesiones[token] = (usuario_id, vencimiento)
+    _sesiones_por_usuario.setdefault(usuario_id, set()).add(token)
+    return token
+
+def verificar_sesion(token):
+    """ID del usuario de una sesión vigente, o None si el token no es válido, venció o se cerró"""
+    sesion = _sesiones.get(token)
+    if sesion is None:
+        return None
+    usuario_id, vencimiento = sesion
+    if time.time() >= vencimiento:
+        cerrar_sesion(token)
+        return None
+    _, _, aleatorio, firma = token.rsplit(":", 3)
+    if not hmac.compare_digest(firma, _firmar(usuario_id, vencimiento, aleatorio)):
+        return None
+    return usuario_id
+
+def cerrar_sesion(token):
+    """Invalida una sesión"""
+    sesion = _sesiones.pop(token, None)
+    if sesion is not None:
+        _sesiones_por_usuario.get(sesion[0], set()).discard(token)
+
+def cerrar_sesiones_de(usuario_id):
+    """Invalida todas las sesiones de un usuario (cambio de contraseña, desactivación)"""
+    for token in _sesiones_por_usuario.pop(usuario_id, set()):
+        _sesiones.pop(token, None)
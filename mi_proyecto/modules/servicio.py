@@ -0,0 +1,246 @@
+"""
+Módulo del servicio de inventario
+Mantiene productos y usuarios en memoria y atiende a varias sesiones por un socket Unix
+Uso: python modules/servicio.py [ruta_socket]
+"""
+
+import os
+import sys
+if __name__ == "__main__":
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import inspect
+import json
+import socket
+from datetime import date
+
+from modules import almacen
+from modules import usuarios
+from modules import indices
+from modules import modelo
+from modules import cliente
+from modules.bloqueos import ConflictoConcurrenciaError
+
+# Segundos de espera antes de escribir para juntar más confirmaciones. Con 0
+# se escriben juntas las que llegaron mientras se escribía la anterior
+VENTANA_ESCRITURA = 0
+
+# Tamaño máximo de una petición (una importación grande viaja en una sola línea)
+MAX_BYTES_PETICION = 64 * 1024 * 1024
+
+class ServicioInventario:
+    """Inventario y usuarios cargados una vez, atendiendo peticiones de StoreRemoto.
+
+    Todas las peticiones corren en un solo hilo (asyncio), así que cada
+    confirmación se valida y se aplica en memoria sin intercalarse con
+    otra. Las confirmaciones acumuladas se escriben juntas con un solo
+    guardar() (ver VENTANA_ESCRITURA) y cada cliente recibe su
+    respuesta cuando su cambio ya está en disco (las lecturas de otros
+    clientes lo ven desde que se aplica en memoria).
+    """
+
+    def __init__(self, store=None):
+        self.store = store or almacen.obtener_store()
+        self.store.cargar()
+        self.directorio = usuarios.DirectorioUsuarios()
+        self._esperando = []
+        self._escritura = None
+        self.operaciones = {
+            "pagina": self.pagina,
+            "obtener": self.store.obtener,
+            "lotes_de": self.store.lotes_de,
+            "existe_alguno": self.existe_alguno,
+            "confirmar": self.confirmar,
+            "contar": self.store.contar,
+            "buscar": self.store.buscar,
+            "buscar_aproximado": self.store.buscar_aproximado,
+            "filtrar_por_ubicacion": self.store.filtrar_por_ubicacion,
+            "stock_critico": self.store.stock_critico,
+            "contar_criticos": self.store.contar_criticos,
+            "agregados": self.store.agregados,
+            "columnar": self.columnar,
+            "contar_por_vencer": lambda fecha: self.store.contar_por_vencer(date.fromisoformat(fecha)),
+            "por_vencer": self.por_vencer,
+            "por_ubicacion": self.store.por_ubicacion,
+            "cargar_usuarios": self.directorio.cargar,
+            "firma_usuarios": usuarios.firma_usuarios,
+            "guardar_usuarios": self.guardar_usuarios,
+        }
+
+    async def atender(self, lector, escritor):
+        """Atiende una conexión: una petición por línea, respondidas en orden"""
+        try:
+            while True:
+                linea = await lector.readline()
+                if not linea:
+                    break
+                escritor.write(await self.responder(linea))
+                await escritor.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            escritor.close()
+
+    async def responder(self, linea):
+        """Respuesta (una línea JSON) para una petición {"op", "args"}"""
+        try:
+            peticion = json.loads(linea)
+            operacion = self.operaciones.get(peticion.get("op"))
+            if operacion is None:
+                raise ValueError(f"Operación desconocida: {peticion.get('op')}")
+            resultado = operacion(*peticion.get("args", ()))
+            if inspect.isawaitable(resultado):
+                resultado = await resultado
+            respuesta = json.dumps({"ok": True, "resultado": resultado}, ensure_ascii=False,
+                                   default=modelo.serializar)
+        except Exception as error:
+            respuesta = json.dumps({"ok": False, "error": type(error).__name__, "mensaje": str(error)},
+                                   ensure_ascii=False)
+        return (respuesta + "\n").encode('utf-8')
+
+    def pagina(self, inicio, cantidad):
+        """Productos en el orden del inventario, para recorrerlo por bloques"""
+        return self.store.cargar()[inicio:inicio + cantidad]
+
+    def existe_alguno(self, claves):
+        """True si alguna de las claves (codigo, lote) ya está en el inventario"""
+        return any(self.store.obtener(codigo, lote) is not None for codigo, lote in claves)
+
+    def columnar(self, metodo, *argumentos):
+        """Resultado de un método de análisis de la instantánea columnar"""
+        if metodo not in ("totales_por", "totales_por_prefijo", "contar_criticos", "histograma_vencimientos"):
+            raise ValueError(f"Análisis desconocido: {metodo}")
+        return getattr(self.store.instantanea_columnar(), metodo)(*argumentos)
+
+    def por_vencer(self, fecha, inicio=0, cantidad=None):
+        return [(vencimiento.isoformat(), producto) for vencimiento, producto
+                in self.store.por_vencer(date.fromisoformat(fecha), inicio, cantidad)]
+
+    def confirmar(self, operaciones):
+        """Valida y aplica en memoria los cambios de un cliente; retorna la espera de su escritura"""
+        self._validar(operaciones)
+        for operacion in operaciones:
+            if operacion["op"] == "alta":
+                self.store.agregar([modelo.Producto(operacion["producto"])])
+                continue
+            producto = self.store.obtener(*operacion["clave"])
+            if operacion["op"] == "campos":
+                self.store.actualizar(producto, operacion["campos"])
+            else:
+                self.store.registrar_movimiento(producto, operacion["delta"], operacion.get("movimiento", {}))
+
+        escrito = asyncio.get_running_loop().create_future()
+        self._esperando.append(escrito)
+        if self._escritura is None:
+            self._escritura = asyncio.create_task(self._escribir())
+        return escrito
+
+    def _validar(self, operaciones):
+        """Verifica, sin aplicar nada, que los cambios de un cliente se puedan aplicar completos.
+
+        Mismas reglas que ProductStore.guardar: un cambio de campos exige
+        que el producto siga en la versión que leyó el cliente, una
+        variación de cantidad no puede dejar el stock negativo y un alta no
+        puede repetir una clave.
+        """
+        versiones = {}
+        cantidades = {}
+
+        def vigente(clave):
+            if clave not in versiones:
+                producto = self.store.obtener(*clave)
+                if producto is None:
+                    raise ConflictoConcurrenciaError(f"Otra sesión modificó el producto {clave[0]} con lote {clave[1]}")
+                versiones[clave] = producto.get("version", 0)
+                cantidades[clave] = producto.get("cantidad", 0)
+
+        for operacion in operaciones:
+            if operacion["op"] == "alta":
+                clave = indices.clave(operacion["producto"])
+                if clave in versiones or self.store.obtener(*clave) is not None:
+                    raise ConflictoConcurrenciaError(f"Otra sesión ya ingresó el producto {clave[0]} con lote {clave[1]}")
+                versiones[clave] = 0
+                cantidades[clave] = operacion["producto"].get("cantidad", 0)
+                continue
+
+            clave = tuple(operacion["clave"])
+            vigente(clave)
+            if operacion["op"] == "campos":
+                if versiones[clave] != operacion["version"]:
+                    raise ConflictoConcurrenciaError(f"Otra sesión modificó el producto {clave[0]} con lote {clave[1]}")
+                cantidades[clave] = operacion["campos"].get("cantidad", cantidades[clave])
+                nueva = indices.clave(dict(zip(("codigo", "lote"), clave), **operacion["campos"]))
+                if nueva != clave:
+                    if nueva in versiones or self.store.obtener(*nueva) is not None:
+                        raise indices.ClaveDuplicadaError(f"Ya existe el producto {nueva[0]} con lote {nueva[1]}")
+                    versiones[nueva] = versiones.pop(clave)
+                    cantidades[nueva] = cantidades.pop(clave)
+                    clave = nueva
+            else:
+                cantidades[clave] += operacion["delta"]
+                if operacion["delta"] < 0 and cantidades[clave] < 0:
+                    raise ConflictoConcurrenciaError(
+                        f"Stock insuficiente de {clave[0]} lote {clave[1]}: otra sesión lo descontó antes")
+            versiones[clave] += 1
+
+    async def _escribir(self):
+        """Escribe juntas las confirmaciones acumuladas y responde a cada cliente"""
+        await asyncio.sleep(VENTANA_ESCRITURA)
+        esperando, self._esperando = self._esperando, []
+        self._escritura = None
+        try:
+            self.store.guardar()
+        except Exception as error:
+            # Solo posible si otra sesión escribe data/ sin pasar por el servicio
+            for escrito in esperando:
+                escrito.set_exception(error)
+        else:
+            for escrito in esperando:
+                escrito.set_result(None)
+
+    def guardar_usuarios(self, usuarios_dict):
+        """Guarda los usuarios de un cliente; retorna {id: versión} de los recibidos"""
+        self.directorio.guardar(usuarios_dict)
+        return {user_id: user_data.get("version", 0) for user_id, user_data in usuarios_dict.items()}
+
+def _en_uso(ruta):
+    """True si ya hay un servicio escuchando en el socket `ruta`"""
+    prueba = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        prueba.connect(ruta)
+        return True
+    except OSError:
+        return False
+    finally:
+        prueba.close()
+
+async def servir(ruta=cliente.RUTA_SOCKET, listo=None):
+    """Carga el inventario y atiende conexiones en el socket `ruta` hasta que se detenga.
+
+    `listo` (opcional) se llama cuando el servicio ya acepta conexiones.
+    """
+    if os.path.exists(ruta):
+        if _en_uso(ruta):
+            raise RuntimeError(f"Ya hay un servicio de inventario en {ruta}")
+        # Socket que quedó de una ejecución anterior
+        os.unlink(ruta)
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+
+    servicio = ServicioInventario()
+    servidor = await asyncio.start_unix_server(servicio.atender, path=ruta, limit=MAX_BYTES_PETICION)
+    if listo:
+        listo()
+    try:
+        async with servidor:
+            await servidor.serve_forever()
+    finally:
+        if os.path.exists(ruta):
+            os.unlink(ruta)
+
+if __name__ == "__main__":
+    ruta = sys.argv[1] if len(sys.argv) > 1 else cliente.RUTA_SOCKET
+    try:
+        asyncio.run(servir(ruta, lambda: print(f"Servicio de inventario escuchando en {ruta} (Ctrl+C para detener)")))
+    except KeyboardInterrupt:
+        print("\nServicio detenido")
@@ -8,8 +8,22 @@ import re
 import os
 from datetime import datetime
 
+from modules import bloqueos
+from modules import cliente
+from modules import seguridad
+from modules.bloqueos import ConflictoConcurrenciaError
+
 ARCHIVO_USUARIOS = "data/usuarios.json"
 
+# IDs que genera registrar_usuario (user_001, user_002, ...)
+PATRON_ID_USUARIO = re.compile(r'^user_(\d+)$')
+
+class UsuarioDuplicadoError(ValueError):
+    """Se intentó registrar un email o RUN que ya usa otro usuario"""
+
+# El servicio retorna este error por nombre (cliente no puede importar este módulo)
+cliente.ERRORES["UsuarioDuplicadoError"] = UsuarioDuplicadoError
+
 def validar_run(run):
     """Valida el RUN chileno con algoritmo de dígito verificador"""
     run = run.replace(".", "").replace("-", "").upper()
@@ -56,8 +70,20 @@ def capitalizar_nombre(nombre):
     """Convierte a mayúsculas según requerimiento"""
     return nombre.upper()
 
-def cargar_usuarios():
-    """Carga usuarios desde archivo JSON"""
+def normalizar_email(email):
+    """Email en la forma usada por el índice (sin espacios y en minúsculas)"""
+    return str(email or "").strip().lower()
+
+def normalizar_run(run):
+    """RUN en la forma usada por el índice (sin puntos ni guion, K mayúscula)"""
+    return str(run or "").replace(".", "").replace("-", "").strip().upper()
+
+def _bloqueo_usuarios():
+    """Bloqueo entre sesiones de usuarios.json"""
+    return bloqueos.Bloqueo(bloqueos.ruta_bloqueo(ARCHIVO_USUARIOS))
+
+def _leer_usuarios():
+    """Usuarios tal como están en disco ({} si no hay archivo o está dañado)"""
     if not os.path.exists(ARCHIVO_USUARIOS):
         return {}
     
@@ -67,16 +93,222 @@ def cargar_usuarios():
     except:
         return {}
 
+def firma_usuarios():
+    """(mtime, tamaño) de usuarios.json, o None si no existe; cambia con cada escritura"""
+    try:
+        info = os.stat(ARCHIVO_USUARIOS)
+    except FileNotFoundError:
+        return None
+    return [info.st_mtime_ns, info.st_size]
+
+def cargar_usuarios():
+    """Carga usuarios desde archivo JSON.
+
+    Cada usuario trae su "version" (0 si nunca se modificó), que
+    guardar_usuarios usa para detectar cambios de otras sesiones.
+    """
+    if cliente.conectado():
+        usuarios_dict = cliente.llamar("cargar_usuarios")
+    else:
+        with _bloqueo_usuarios().compartido():
+            usuarios_dict = _leer_usuarios()
+    for user_data in usuarios_dict.values():
+        user_data.setdefault("version", 0)
+    return usuarios_dict
+
 def guardar_usuarios(usuarios_dict):
-    """Guarda usuarios en archivo JSON"""
-    os.makedirs(os.path.dirname(ARCHIVO_USUARIOS), exist_ok=True)
-    with open(ARCHIVO_USUARIOS, 'w', encoding='utf-8') as f:
-        json.dump(usuarios_dict, f, indent=2, ensure_ascii=False)
+    """Guarda en usuarios.json los usuarios nuevos o modificados de `usuarios_dict`.
+
+    Bajo el bloqueo exclusivo se relee el archivo y solo se reescriben los
+    usuarios que cambiaron, así dos sesiones que modifican usuarios
+    distintos no se pisan. Si otra sesión modificó antes alguno de esos
+    usuarios (su versión en disco ya no es la leída), o creó uno con el
+    mismo ID, lanza ConflictoConcurrenciaError y no guarda ninguno. Si un
+    usuario nuevo o modificado toma el email o RUN de otro, lanza
+    UsuarioDuplicadoError.
+    """
+    if cliente.conectado():
+        for user_id, version in cliente.llamar("guardar_usuarios", usuarios_dict).items():
+            usuarios_dict[user_id]["version"] = version
+        return
+    _escribir_usuarios(usuarios_dict)
+
+def _escribir_usuarios(usuarios_dict):
+    """guardar_usuarios local; retorna (firma antes, firma después) de usuarios.json"""
+    with _bloqueo_usuarios().exclusivo():
+        firma_previa = firma_usuarios()
+        en_disco = _leer_usuarios()
+        cambiados = {}
+        for user_id, user_data in usuarios_dict.items():
+            actual = en_disco.get(user_id)
+            if actual is not None:
+                actual.setdefault("version", 0)
+            if actual == user_data:
+                continue
+            # Un usuario nuevo no trae versión: no debe existir en disco
+            if actual is None and "version" in user_data or \
+                    actual is not None and actual["version"] != user_data.get("version"):
+                raise ConflictoConcurrenciaError(f"Otra sesión modificó el usuario {user_id}")
+            cambiados[user_id] = dict(user_data, version=user_data.get("version", 0) + 1)
+        if not cambiados:
+            return firma_previa, firma_previa
+        _verificar_unicos(en_disco, cambiados)
+        
+        en_disco.update(cambiados)
+        os.makedirs(os.path.dirname(ARCHIVO_USUARIOS), exist_ok=True)
+        temporal = ARCHIVO_USUARIOS + ".tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(en_disco, f, indent=2, ensure_ascii=False)
+        os.replace(temporal, ARCHIVO_USUARIOS)
+        firma_nueva = firma_usuarios()
+    # El llamador queda con las versiones recién guardadas
+    for user_id, user_data in cambiados.items():
+        usuarios_dict[user_id]["version"] = user_data["version"]
+    return firma_previa, firma_nueva
+
+def _verificar_unicos(en_disco, cambiados):
+    """Lanza UsuarioDuplicadoError si un usuario nuevo o modificado toma el email o RUN de otro"""
+    for campo, etiqueta, normalizar in (("email", "email", normalizar_email), ("run", "RUN", normalizar_run)):
+        nuevos = {}
+        for user_id, user_data in cambiados.items():
+            valor = normalizar(user_data.get(campo))
+            actual = en_disco.get(user_id)
+            # Solo se verifican los valores que cambian (los datos antiguos pueden repetirse)
+            if not valor or actual is not None and normalizar(actual.get(campo)) == valor:
+                continue
+            if valor in nuevos:
+                raise UsuarioDuplicadoError(f"El {etiqueta} {valor} está repetido entre los usuarios a guardar")
+            nuevos[valor] = user_id
+        if not nuevos:
+            continue
+        for user_id, user_data in en_disco.items():
+            otro = nuevos.get(normalizar(user_data.get(campo)))
+            if otro is not None and otro != user_id:
+                raise UsuarioDuplicadoError(f"El {etiqueta} {user_data.get(campo)} ya está registrado (usuario {user_id})")
+
+class DirectorioUsuarios:
+    """Usuarios cargados una vez por proceso, con índices por ID, email y RUN.
+
+    `usuarios` (por ID) es el índice primario; los índices por email y RUN
+    son únicos y permiten encontrar a un usuario o detectar un duplicado en
+    O(1). usuarios.json se vuelve a leer solo si otra sesión lo modificó
+    (cambió su firma). Los cambios se hacen con guardar() o actualizar(),
+    que mantienen los índices; `usuarios` no se debe modificar directamente.
+    """
+
+    def __init__(self):
+        self.usuarios = {}
+        self._por_email = {}
+        self._por_run = {}
+        self._ultimo_numero = 0
+        self._firma = None
+        self._cargado = False
+
+    def cargar(self):
+        """Usuarios por ID; se releen solo si usuarios.json cambió desde la última carga"""
+        firma = cliente.llamar("firma_usuarios") if cliente.conectado() else firma_usuarios()
+        if not self._cargado or firma != self._firma:
+            # Firma antes de leer: si el archivo cambia durante la lectura se relee la próxima vez
+            usuarios_dict = cargar_usuarios()
+            self.usuarios = {}
+            self._por_email = {}
+            self._por_run = {}
+            self._ultimo_numero = 0
+            for user_id, user_data in usuarios_dict.items():
+                self._indexar(user_id, user_data)
+            self._firma = firma
+            self._cargado = True
+        return self.usuarios
+
+    def _indexar(self, user_id, user_data):
+        self.usuarios[user_id] = user_data
+        email = normalizar_email(user_data.get("email"))
+        if email:
+            self._por_email.setdefault(email, user_id)
+        run = normalizar_run(user_data.get("run"))
+        if run:
+            self._por_run.setdefault(run, user_id)
+        coincidencia = PATRON_ID_USUARIO.match(user_id)
+        if coincidencia:
+            self._ultimo_numero = max(self._ultimo_numero, int(coincidencia.group(1)))
+
+    def _desindexar(self, user_id, user_data):
+        for indice, valor in ((self._por_email, normalizar_email(user_data.get("email"))),
+                              (self._por_run, normalizar_run(user_data.get("run")))):
+            if indice.get(valor) == user_id:
+                del indice[valor]
+
+    def resolver(self, identificador):
+        """ID del usuario con ese ID o email, o None"""
+        if identificador in self.usuarios:
+            return identificador
+        return self._por_email.get(normalizar_email(identificador))
+
+    def id_por_email(self, email):
+        """ID del usuario con ese email, o None"""
+        return self._por_email.get(normalizar_email(email))
+
+    def id_por_run(self, run):
+        """ID del usuario con ese RUN, o None"""
+        return self._por_run.get(normalizar_run(run))
+
+    def nuevo_id(self):
+        """Siguiente ID user_NNN: siempre mayor que todos los ya asignados"""
+        return f"user_{self._ultimo_numero + 1:03d}"
+
+    def registrar(self, user_data):
+        """Registra un usuario nuevo con el siguiente ID; retorna el ID.
+
+        Lanza UsuarioDuplicadoError si el email o el RUN ya están
+        registrados, y ConflictoConcurrenciaError si otra sesión tomó el
+        mismo ID al mismo tiempo.
+        """
+        self.cargar()
+        for campo, etiqueta, existente in (("email", "email", self.id_por_email),
+                                           ("run", "RUN", self.id_por_run)):
+            otro = existente(user_data.get(campo)) if user_data.get(campo) else None
+            if otro is not None:
+                raise UsuarioDuplicadoError(f"El {etiqueta} {user_data[campo]} ya está registrado (usuario {otro})")
+        usuario_id = self.nuevo_id()
+        self.guardar({usuario_id: dict(user_data, id=usuario_id)})
+        return usuario_id
+
+    def actualizar(self, user_id, cambios):
+        """Modifica campos de un usuario y los guarda"""
+        self.guardar({user_id: dict(self.usuarios[user_id], **cambios)})
+
+    def guardar(self, usuarios_dict):
+        """Guarda usuarios nuevos o modificados (ver guardar_usuarios) y actualiza los índices"""
+        if cliente.conectado():
+            guardar_usuarios(usuarios_dict)
+            firmas = None
+        else:
+            firmas = _escribir_usuarios(usuarios_dict)
+        for user_id, user_data in usuarios_dict.items():
+            anterior = self.usuarios.get(user_id)
+            if anterior is not None:
+                self._desindexar(user_id, anterior)
+            self._indexar(user_id, user_data)
+        # Si nadie más escribió desde la última carga, lo que hay en memoria sigue al día
+        if firmas is not None and self._cargado and firmas[0] == self._firma:
+            self._firma = firmas[1]
+
+_directorio = None
+
+def obtener_directorio():
+    """Retorna el directorio de usuarios compartido por todos los módulos"""
+    global _directorio
+    if _directorio is None:
+        _directorio = DirectorioUsuarios()
+    return _directorio
 
 def registrar_usuario():
     """Registra un nuevo usuario con validaciones"""
     print("\n--- REGISTRO DE NUEVO USUARIO ---")
     
+    directorio = obtener_directorio()
+    directorio.cargar()
+    
     # Validación de datos
     nombre = input("Nombre: ").strip()
     while not nombre:
@@ -94,13 +326,13 @@ def registrar_usuario():
     apellido_materno = capitalizar_nombre(apellido_materno)
     
     run = input("RUN (sin dígito verificador): ").strip()
-    while not validar_run(run + "0"):  # Validar con dígito temporal
-        print("RUN inválido")
+    while not validar_run(run + "0") or directorio.id_por_run(run):  # Validar con dígito temporal
+        print("RUN ya registrado" if validar_run(run + "0") else "RUN inválido")
         run = input("RUN (sin dígito verificador): ").strip()
     
     email = input("Email: ").strip()
-    while not validar_email(email):
-        print("Email inválido")
+    while not validar_email(email) or directorio.id_por_email(email):
+        print("Email ya registrado" if validar_email(email) else "Email inválido")
         email = input("Email: ").strip()
     
     telefono = input("Teléfono (con código de país): ").strip()
@@ -121,11 +353,7 @@ def registrar_usuario():
     contrasena_default = "Password123"
     
     # Crear usuario
-    usuarios_dict = cargar_usuarios()
-    usuario_id = f"user_{len(usuarios_dict) + 1:03d}"
-    
-    usuarios_dict[usuario_id] = {
-        "id": usuario_id,
+    nuevo_usuario = {
         "nombre": nombre,
         "apellido_paterno": apellido_paterno,
         "apellido_materno": apellido_materno,
@@ -133,12 +361,20 @@ def registrar_usuario():
         "email": email,
         "telefono": telefono,
         "rol": rol,
-        "contrasena": contrasena_default,  # En producción, usar hash
+        "contrasena": seguridad.hashear_contrasena(contrasena_default),
         "fecha_registro": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "activo": True
     }
     
-    guardar_usuarios(usuarios_dict)
+    try:
+        usuario_id = directorio.registrar(nuevo_usuario)
+    except ConflictoConcurrenciaError:
+        print(f"\nOtra sesión registró el ID {directorio.nuevo_id()} al mismo tiempo. Intente nuevamente")
+        return
+    except UsuarioDuplicadoError as error:
+        # Otra sesión registró el mismo email o RUN mientras se ingresaban los datos
+        print(f"\n{error}")
+        return
     print(f"\nUsuario registrado exitosamente!")
     print(f"ID de usuario: {usuario_id}")
     print(f"Contraseña temporal: {contrasena_default}")
@@ -148,56 +384,95 @@ def registrar_usuario():
     print(f"[SIMULACIÓN] Correo de verificación enviado a {email}")
     print(f"[SIMULACIÓN] SMS con código enviado a {telefono}")
 
+def autenticar(identificador, contrasena):
+    """ID del usuario activo con ese ID o email y esa contraseña, o None.
+
+    Una contraseña guardada en texto plano (datos anteriores al hash) o
+    con parámetros antiguos se vuelve a guardar con el hash vigente.
+    """
+    directorio = obtener_directorio()
+    usuarios_dict = directorio.cargar()
+    usuario_id = directorio.resolver(identificador)
+    user_data = usuarios_dict.get(usuario_id)
+    if user_data is None or not user_data.get("activo", True) or \
+       not seguridad.verificar_contrasena(contrasena, user_data["contrasena"]):
+        return None
+    
+    if seguridad.requiere_rehash(user_data["contrasena"]):
+        try:
+            directorio.actualizar(usuario_id, {"contrasena": seguridad.hashear_contrasena(contrasena)})
+        except ConflictoConcurrenciaError:
+            # Otra sesión modificó el usuario: se migrará en el próximo inicio de sesión
+            pass
+    return usuario_id
+
+def validar_sesion(token):
+    """Datos del usuario de una sesión vigente, o None si venció, se cerró o el usuario fue desactivado.
+
+    No vuelve a calcular el hash de la contraseña: basta con el token
+    firmado y una búsqueda en el directorio.
+    """
+    usuario_id = seguridad.verificar_sesion(token)
+    if usuario_id is None:
+        return None
+    user_data = obtener_directorio().cargar().get(usuario_id)
+    if user_data is None or not user_data.get("activo", True):
+        return None
+    return user_data
+
 def iniciar_sesion():
-    """Inicia sesión de usuario"""
+    """Inicia sesión de usuario; retorna (usuario_id, rol, token de sesión) o (None, None, None)"""
     print("\n--- INICIO DE SESIÓN ---")
     
-    usuarios_dict = cargar_usuarios()
+    directorio = obtener_directorio()
     
     intentos = 0
     max_intentos = 3
     
     while intentos < max_intentos:
-        usuario_id = input("ID de usuario: ").strip()
+        identificador = input("ID de usuario: ").strip()
         contrasena = input("Contraseña: ").strip()
         
-        # Buscar usuario
-        for user_id, user_data in usuarios_dict.items():
-            if (user_id == usuario_id or user_data.get("email") == usuario_id) and \
-               user_data["contrasena"] == contrasena and \
-               user_data.get("activo", True):
-                
-                print(f"\n¡Bienvenido(a) {user_data['nombre']} {user_data['apellido_paterno']}!")
-                print(f"Rol: {user_data['rol']}")
-                
-                # Cambiar contraseña si es la primera vez
-                if contrasena == "Password123":
-                    cambiar_contrasena(usuario_id)
-                
-                return usuario_id, user_data["rol"]
+        usuario_id = autenticar(identificador, contrasena)
+        if usuario_id is not None:
+            user_data = directorio.usuarios[usuario_id]
+            print(f"\n¡Bienvenido(a) {user_data['nombre']} {user_data['apellido_paterno']}!")
+            print(f"Rol: {user_data['rol']}")
+            
+            # Cambiar contraseña si es la primera vez
+            if contrasena == "Password123":
+                cambiar_contrasena(usuario_id)
+            
+            return usuario_id, user_data["rol"], seguridad.crear_sesion(usuario_id)
         
         intentos += 1
         print(f"Credenciales incorrectas. Intentos restantes: {max_intentos - intentos}")
     
     print("Demasiados intentos fallidos. Contacte al administrador.")
-    return None, None
+    return None, None, None
 
 def cambiar_contrasena(usuario_id):
     """Permite al usuario cambiar su contraseña"""
     print("\n--- CAMBIO DE CONTRASEÑA OBLIGATORIO ---")
     print("Debe cambiar su contraseña por defecto")
     
-    usuarios_dict = cargar_usuarios()
+    # El directorio ya está cargado desde el inicio de sesión
+    directorio = obtener_directorio()
     
-    if usuario_id not in usuarios_dict:
+    if usuario_id not in directorio.usuarios:
         return
     
     nueva_contrasena = input("Nueva contraseña: ").strip()
     confirmar = input("Confirmar contraseña: ").strip()
     
     if nueva_contrasena == confirmar and len(nueva_contrasena) >= 6:
-        usuarios_dict[usuario_id]["contrasena"] = nueva_contrasena
-        guardar_usuarios(usuarios_dict)
+        try:
+            directorio.actualizar(usuario_id, {"contrasena": seguridad.hashear_contrasena(nueva_contrasena)})
+        except ConflictoConcurrenciaError as error:
+            print(f"{error}. La contraseña no se cambió")
+            return
+        # Las sesiones abiertas con la contraseña anterior dejan de valer
+        seguridad.cerrar_sesiones_de(usuario_id)
         print("Contraseña cambiada exitosamente")
     else:
         print("Las contraseñas no coinciden o son demasiado cortas")
@@ -205,7 +480,8 @@ def cambiar_contrasena(usuario_id):
 def gestionar_usuarios():
     """Gestión de usuarios (solo administrador)"""
     print("\n--- GESTIÓN DE USUARIOS ---")
-    usuarios_dict = cargar_usuarios()
+    directorio = obtener_directorio()
+    usuarios_dict = directorio.cargar()
     
     print(f"\nTotal de usuarios: {len(usuarios_dict)}")
     print("\nLista de usuarios:")
@@ -227,9 +503,15 @@ def gestionar_usuarios():
     if opcion == "1":
         user_id = input("ID del usuario: ").strip()
         if user_id in usuarios_dict:
-            usuarios_dict[user_id]["activo"] = not usuarios_dict[user_id].get("activo", True)
-            guardar_usuarios(usuarios_dict)
-            estado = "activado" if usuarios_dict[user_id]["activo"] else "desactivado"
+            activo = not usuarios_dict[user_id].get("activo", True)
+            try:
+                directorio.actualizar(user_id, {"activo": activo})
+            except ConflictoConcurrenciaError as error:
+                print(f"{error}. No se guardó el cambio; intente nuevamente")
+                return
+            if not activo:
+                seguridad.cerrar_sesiones_de(user_id)
+            estado = "activado" if activo else "desactivado"
             print(f"Usuario {user_id} {estado}")
     
     elif opcion == "2":
@@ -238,15 +520,19 @@ def gestionar_usuarios():
             print("Roles disponibles: Administrador, Supervisor, Digitador, Bodeguero, Usuario")
             nuevo_rol = input("Nuevo rol: ").strip()
             if nuevo_rol in ["Administrador", "Supervisor", "Digitador", "Bodeguero", "Usuario"]:
-                usuarios_dict[user_id]["rol"] = nuevo_rol
-                guardar_usuarios(usuarios_dict)
+                try:
+                    directorio.actualizar(user_id, {"rol": nuevo_rol})
+                except ConflictoConcurrenciaError as error:
+                    print(f"{error}. No se guardó el cambio; intente nuevamente")
+                    return
                 print(f"Rol cambiado a {nuevo_rol}")
             else:
                 print("Rol no válido")
 
 def crear_usuarios_prueba():
     """Crea usuarios de prueba para validación del sistema"""
-    usuarios_dict = cargar_usuarios()
+    directorio = obtener_directorio()
+    usuarios_dict = directorio.cargar()
     
     # Solo crear si no existen
     if usuarios_dict:
@@ -262,7 +548,7 @@ def crear_usuarios_prueba():
             "email": "admin@empresa.cl",
             "telefono": "+56912345678",
             "rol": "Administrador",
-            "contrasena": "Admin123",
+            "contrasena": seguridad.hashear_contrasena("Admin123"),
             "fecha_registro": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "activo": True
         },
@@ -275,7 +561,7 @@ def crear_usuarios_prueba():
             "email": "supervisor@empresa.cl",
             "telefono": "+56987654321",
             "rol": "Supervisor",
-            "contrasena": "Super123",
+            "contrasena": seguridad.hashear_contrasena("Super123"),
             "fecha_registro": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "activo": True
         },
@@ -288,7 +574,7 @@ def crear_usuarios_prueba():
             "email": "digitador@empresa.cl",
             "telefono": "+56911222333",
             "rol": "Digitador",
-            "contrasena": "Digit123",
+            "contrasena": seguridad.hashear_contrasena("Digit123"),
             "fecha_registro": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "activo": True
         },
@@ -301,7 +587,7 @@ def crear_usuarios_prueba():
             "email": "bodeguero@empresa.cl",
             "telefono": "+56944555666",
             "rol": "Bodeguero",
-            "contrasena": "Bode123",
+            "contrasena": seguridad.hashear_contrasena("Bode123"),
             "fecha_registro": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "activo": True
         },
@@ -314,11 +600,15 @@ def crear_usuarios_prueba():
             "email": "usuario@empresa.cl",
             "telefono": "+56977888999",
             "rol": "Usuario",
-            "contrasena": "User123",
+            "contrasena": seguridad.hashear_contrasena("User123"),
             "fecha_registro": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "activo": True
         }
     }
     
-    guardar_usuarios(usuarios_prueba)
+    try:
+        directorio.guardar(usuarios_prueba)
+    except (ConflictoConcurrenciaError, UsuarioDuplicadoError):
+        # Otra sesión los creó al mismo tiempo
+        return
     print("Usuarios de prueba creados exitosamente")
\ No newline at end of file
@@ -3,8 +3,13 @@ Módulo de utilidades generales
 Funciones auxiliares para el sistema
 """
 
+import csv
+import json
 import os
 import sys
+from datetime import date, datetime
+
+from modules import fechas
 
 def crear_estructura_carpetas():
     """Crea la estructura de carpetas del proyecto"""
@@ -52,7 +57,8 @@ def validar_numero(texto, tipo="entero"):
 
 def validar_fecha(fecha_str, formato="%Y-%m-%d"):
     """Valida que la fecha tenga el formato correcto"""
-    from datetime import datetime
+    if formato == "%Y-%m-%d":
+        return fechas.ordinal_iso(fecha_str) is not None
     try:
         datetime.strptime(fecha_str, formato)
         return True
@@ -61,13 +67,79 @@ def validar_fecha(fecha_str, formato="%Y-%m-%d"):
 
 def formatear_fecha(fecha_str, formato_original="%Y-%m-%d", formato_salida="%d/%m/%Y"):
     """Formatea una fecha string a formato legible"""
-    from datetime import datetime
+    if formato_original == "%Y-%m-%d":
+        ordinal = fechas.ordinal_iso(fecha_str)
+        return date.fromordinal(ordinal).strftime(formato_salida) if ordinal is not None else fecha_str
     try:
         fecha = datetime.strptime(fecha_str, formato_original)
         return fecha.strftime(formato_salida)
-    except:
+    except (ValueError, TypeError):
         return fecha_str
 
+def reparar_linea_incompleta(ruta):
+    """Trunca una última línea cortada (escritura interrumpida) y retorna los bytes descartados"""
+    if not os.path.exists(ruta):
+        return 0
+    
+    with open(ruta, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        tamano = f.tell()
+        if tamano == 0:
+            return 0
+        
+        f.seek(tamano - 1)
+        if f.read(1) == b'\n':
+            return 0
+        
+        # Buscar hacia atrás el último salto de línea, leyendo solo la cola del archivo
+        posicion = tamano
+        bloque = 4096
+        while posicion > 0:
+            inicio = max(0, posicion - bloque)
+            f.seek(inicio)
+            datos = f.read(posicion - inicio)
+            indice = datos.rfind(b'\n')
+            if indice != -1:
+                corte = inicio + indice + 1
+                break
+            posicion = inicio
+        else:
+            corte = 0
+        
+        f.truncate(corte)
+        return tamano - corte
+
+def leer_lineas(ruta):
+    """Genera (número de línea, datos) por cada línea de un archivo CSV o JSONL.
+
+    El CSV lleva una fila de encabezado con los nombres de las columnas (se
+    acepta ',' o ';' como separador). En JSONL cada línea es un objeto; si
+    una línea no es un objeto JSON válido se genera (número, None).
+    """
+    with open(ruta, 'r', encoding='utf-8-sig', newline='') as f:
+        if os.path.splitext(ruta)[1].lower() == ".jsonl":
+            for numero, linea in enumerate(f, 1):
+                if not linea.strip():
+                    continue
+                try:
+                    datos = json.loads(linea)
+                except ValueError:
+                    datos = None
+                yield numero, datos if isinstance(datos, dict) else None
+            return
+
+        muestra = f.read(4096)
+        f.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=",;")
+        except csv.Error:
+            dialecto = csv.excel
+        lector = csv.DictReader(f, dialect=dialecto)
+        for datos in lector:
+            # Las columnas se comparan sin espacios ni mayúsculas
+            yield lector.line_num, {str(campo).strip().lower(): (valor or "").strip()
+                                    for campo, valor in datos.items() if campo is not None}
+
 def pausa(mensaje="\nPresione Enter para continuar..."):
     """Pausa la ejecución hasta que el usuario presione Enter"""
     input(mensaje)
@@ -94,4 +166,7 @@ def salir_sistema():
     print("Saliendo del sistema...")
     print("¡Gracias por usar el Sistema de Gestión de Productos!")
     print("="*50)
+    # Import diferido: auditoria importa utils
+    from modules import auditoria
+    auditoria.detener_escritor()
     sys.exit(0)
\ No newline at end of file
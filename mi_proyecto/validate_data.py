@@ -49,32 +49,39 @@ def validate_productos():
         print("  File not found (OK - will be created).")
         return []
 
-    try:
-        with open(PRODUCTOS_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-    except json.JSONDecodeError:
-        print("  [ERROR] Invalid JSON format.")
-        return ["Invalid JSON in productos.json"]
+    # Products are streamed one at a time so large inventories fit in memory
+    from modules import almacen
 
     errors = []
-    if not isinstance(data, list):
-         errors.append("Root must be a list")
-         return errors
+    seen_keys = {}
+    try:
+        for i, prod in enumerate(almacen.leer_productos(PRODUCTOS_FILE)):
+            if not isinstance(prod, dict):
+                errors.append(f"Item {i} is not a dict")
+                continue
 
-    for i, prod in enumerate(data):
-        if not isinstance(prod, dict):
-            errors.append(f"Item {i} is not a dict")
-            continue
-            
-        required_fields = ["codigo", "descripcion", "cantidad", "unidad"]
-        for field in required_fields:
-            if field not in prod:
-                errors.append(f"Product {i} missing field {field}")
-        
-        # Validate quantity is number
-        qty = prod.get("cantidad")
-        if not isinstance(qty, (int, float)):
-            errors.append(f"Product {i} ({prod.get('descripcion')}) quantity is not number: {type(qty)}")
+            # (codigo, lote) is the product's primary key
+            key = (str(prod.get("codigo", "")), str(prod.get("lote", "")))
+            if key in seen_keys:
+                errors.append(f"Product {i} duplicates codigo/lote {key} of product {seen_keys[key]}")
+            else:
+                seen_keys[key] = i
+
+            required_fields = ["codigo", "descripcion", "cantidad", "unidad"]
+            for field in required_fields:
+                if field not in prod:
+                    errors.append(f"Product {i} missing field {field}")
+
+            # Validate quantity is number
+            qty = prod.get("cantidad")
+            if not isinstance(qty, (int, float)):
+                errors.append(f"Product {i} ({prod.get('descripcion')}) quantity is not number: {type(qty)}")
+    except json.JSONDecodeError:
+        print("  [ERROR] Invalid JSON format.")
+        return errors + ["Invalid JSON in productos.json"]
+    except ValueError:
+        errors.append("Root must be a list")
+        return errors
 
     if not errors:
         print("  Productos valid.")
@@ -84,10 +91,26 @@ def validate_productos():
 
     return errors
 
+def validate_agregados():
+    """Rebuilds the report aggregates from scratch and diffs them against the maintained view"""
+    print("Validating report aggregates...")
+    from modules import almacen
+
+    errors = [f"Aggregate mismatch: {d}" for d in almacen.obtener_store().verificar_agregados()]
+    if not errors:
+        print("  Aggregates consistent.")
+    else:
+        for e in errors:
+            print(f"  [ERROR] {e}")
+    return errors
+
 def main():
     all_errors = []
     all_errors.extend(validate_usuarios())
     all_errors.extend(validate_productos())
+    if not all_errors:
+        # Loading the store needs a readable productos.json
+        all_errors.extend(validate_agregados())
     
     if all_errors:
         print("\nDATA CORRUPTION FOUND:")